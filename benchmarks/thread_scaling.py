@@ -0,0 +1,126 @@
+"""Measures how Milky scales across threads.
+
+Calls are answered by a local replay client rather than Remember The Milk, so
+this measures the work done by Milky itself: reading cached content, and
+building, signing and parsing requests. On a free-threaded build of Python
+(3.13t or later), throughput should grow with the number of threads - on a
+standard build, the GIL keeps it roughly flat.
+
+Run with:
+
+    python benchmarks/thread_scaling.py [--threads 8] [--seconds 2]
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import os
+import sys
+import sysconfig
+import time
+
+from typing import TYPE_CHECKING
+
+from milky import Milky, Transport
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+LISTS = 50
+
+RESPONSES = {
+    'rtm.lists.getList': '<lists>{}</lists>'.format(
+        ''.join(f'<list id="{i}" name="List {i}"/>' for i in range(LISTS))
+    ),
+    'rtm.settings.getList': '<settings><timezone>Europe/London</timezone></settings>',
+}
+
+
+class ReplayResponse:
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.headers: dict[str, str] = {}
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+class ReplayClient:
+    """Stands in for a HTTP client, replaying canned responses."""
+
+    def __init__(self) -> None:
+        self.headers = {'User-Agent': 'benchmark'}
+
+    def get(
+        self, url: str, params: dict[str, str], headers: dict[str, str]  # noqa: ARG002
+    ) -> ReplayResponse:
+        return ReplayResponse(f'<rsp stat="ok">{RESPONSES[params["method"]]}</rsp>')
+
+
+def make_milky() -> Milky:
+    return Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=ReplayClient()))
+
+
+def cached_reads(milky: Milky) -> Callable[[], None]:
+    _ = milky.lists
+
+    def run() -> None:
+        for ls in milky.lists:
+            _ = ls.name
+
+    return run
+
+
+def invocations(milky: Milky) -> Callable[[], None]:
+    def run() -> None:
+        milky.invoke('rtm.settings.getList')
+
+    return run
+
+
+def measure(op: Callable[[], None], threads: int, seconds: float) -> float:
+    """Return the number of operations per second over all threads."""
+    deadline = time.perf_counter() + seconds
+
+    def worker() -> int:
+        count = 0
+        while time.perf_counter() < deadline:
+            op()
+            count += 1
+        return count
+
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        futures = [executor.submit(worker) for _ in range(threads)]
+        total = sum(f.result() for f in futures)
+    return total / seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    free_threaded = bool(sysconfig.get_config_var('Py_GIL_DISABLED'))
+    version = sys.version.split()[0]
+    sys.stdout.write(f'Python {version}, free-threaded: {free_threaded}\n')
+
+    benchmarks = {'cached reads': cached_reads, 'invocations': invocations}
+    for name, factory in benchmarks.items():
+        op = factory(make_milky())
+        sys.stdout.write(f'\n{name}\n')
+        baseline = None
+        threads = 1
+        while threads <= args.threads:
+            rate = measure(op, threads, args.seconds)
+            baseline = baseline or rate
+            sys.stdout.write(
+                f'  {threads:3} threads: {rate:12,.0f} ops/s ({rate / baseline:.2f}x)\n'
+            )
+            threads *= 2
+
+
+if __name__ == '__main__':
+    main()
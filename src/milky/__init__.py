@@ -2,7 +2,24 @@
 
 __version__ = '0.2.0'
 
+from milky.breaker import CircuitBreaker, CircuitOpenError
+from milky.limiter import RateLimiter
+from milky.polling import Poller
+from milky.pool import Pool
+from milky.quota import Quota, QuotaExceededError
 from milky.root import Milky
 from milky.transport import Identity, ResponseError, Transport
 
-__all__ = ['Identity', 'Milky', 'ResponseError', 'Transport']
+__all__ = [
+    'CircuitBreaker',
+    'CircuitOpenError',
+    'Identity',
+    'Milky',
+    'Poller',
+    'Pool',
+    'Quota',
+    'QuotaExceededError',
+    'RateLimiter',
+    'ResponseError',
+    'Transport',
+]
@@ -0,0 +1,78 @@
+"""Command line interface.
+
+Usage:
+    python -m milky export OUTPUT [--format jsonl|csv] [--resume] [--workers N]
+
+Credentials are taken from the MILKY_API_KEY, MILKY_SECRET and MILKY_TOKEN
+environment variables, unless given as options.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+from typing import TYPE_CHECKING
+
+from milky import export
+from milky.limiter import RateLimiter
+from milky.root import Milky
+from milky.transport import Transport
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+
+def _report(progress: export.Progress) -> None:
+    sys.stderr.write(
+        f'\rlists {progress.lists}/{progress.total}, {progress.records} records,'
+        f' {progress.rate:.1f} records/s'
+    )
+
+
+def _export(args: argparse.Namespace) -> int:
+    transport = Transport(args.api_key, args.secret, args.token, limiter=RateLimiter())
+    checkpoint = args.output + '.checkpoint'
+    if not args.resume and os.path.exists(checkpoint):  # noqa: PTH110
+        os.remove(checkpoint)  # noqa: PTH107
+
+    export.export(
+        Milky(transport),
+        args.output,
+        fmt=args.format,
+        checkpoint=checkpoint,
+        max_workers=args.workers,
+        progress=_report,
+    )
+    sys.stderr.write('\n')
+    return 0
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m milky')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    cmd = commands.add_parser('export', help='export lists and tasks to a file')
+    cmd.add_argument('output', help='file to write to')
+    cmd.add_argument(
+        '--format', choices=export.FORMATS, help='taken from OUTPUT if not given'
+    )
+    cmd.add_argument(
+        '--resume', action='store_true', help='resume an interrupted export'
+    )
+    cmd.add_argument(
+        '--workers', type=int, default=4, help='number of lists to fetch at once'
+    )
+    cmd.add_argument('--api-key', default=os.environ.get('MILKY_API_KEY'))
+    cmd.add_argument('--secret', default=os.environ.get('MILKY_SECRET'))
+    cmd.add_argument('--token', default=os.environ.get('MILKY_TOKEN'))
+
+    args = parser.parse_args(argv)
+    if not (args.api_key and args.secret and args.token):
+        parser.error('an API key, secret and token are required')
+    return _export(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
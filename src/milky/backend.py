@@ -0,0 +1,306 @@
+"""Cache backends, which let content cached by Milky objects be shared between
+processes (and hosts) using the same token.
+
+A backend is given to a Milky object through `Milky.backend`. Cached
+attributes which have a codec are then looked up in the backend before
+calling Remember The Milk, and written to it once loaded. Keys include a
+format version and a fingerprint of the token, so content is never shared
+between tokens, or between incompatible versions of this library.
+
+`MemoryBackend` shares content within a process. `SocketBackend` talks to a
+server created with `make_server`, which can run in any process.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+from typing import Generic, Protocol, TYPE_CHECKING, TypeVar
+
+from xml.etree import ElementTree as ET  # noqa: RUF100, DUO107, S405
+
+from milky import forking
+
+if TYPE_CHECKING:
+    import io
+
+    from collections.abc import Callable, Sequence
+
+    from milky.datatypes import Crate
+    from milky.root import Milky
+
+#: Version of the format of keys and values - bumped when either changes.
+FORMAT = 1
+
+T = TypeVar('T')
+C = TypeVar('C', bound='Crate')
+
+Address = tuple[str, int] | str
+
+
+class CacheBackend(Protocol):
+    """Storage for cached content, keyed by strings."""
+
+    def get(self, key: str) -> bytes | None:
+        ...
+
+    def get_many(self, keys: Sequence[str]) -> dict[str, bytes]:
+        ...
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        ...
+
+    def delete(self, key: str) -> None:
+        ...
+
+
+class Codec(Protocol[T]):
+    """Converts cached values to and from bytes."""
+
+    def encode(self, value: T) -> bytes | None:
+        """Return the value as bytes, or None if it cannot be stored yet."""
+        ...
+
+    def decode(self, milky: Milky, data: bytes) -> T:
+        ...
+
+
+class TextCodec:
+    def encode(self, value: str) -> bytes:
+        return value.encode('utf-8')
+
+    def decode(self, milky: Milky, data: bytes) -> str:  # noqa: ARG002
+        return data.decode('utf-8')
+
+
+TEXT = TextCodec()
+
+
+class CrateCodec(Generic[C]):
+    """Stores crates as the XML of their content."""
+
+    def __init__(self, factory: Callable[[Milky], C]) -> None:
+        self.factory = factory
+
+    def encode(self, value: C) -> bytes | None:
+        if (element := value._dump()) is None:  # noqa: SLF001
+            return None
+        return ET.tostring(element, encoding='utf-8')
+
+    def decode(self, milky: Milky, data: bytes) -> C:
+        crate = self.factory(milky)
+        crate.bottle = ET.fromstring(data)  # noqa: S314
+        return crate
+
+
+def fingerprint(token: str | None) -> bytes:
+    """Return a short digest of the token, which doesn't reveal it."""
+    return hashlib.sha1((token or '').encode('utf-8')).digest()[:8]  # noqa: S324
+
+
+def make_key(token: str | None, name: str) -> str:
+    """Return the key for content cached for the token under the name."""
+    return f'milky/{FORMAT}/{fingerprint(token).hex()}/{name}'
+
+
+class MemoryBackend:
+    """Backend which holds content in memory, shared by Milky objects in
+    the same process."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._items: dict[str, tuple[bytes, float | None]] = {}
+
+    def get(self, key: str) -> bytes | None:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Sequence[str]) -> dict[str, bytes]:
+        now = self.clock()
+        result = {}
+        with self._lock:
+            for key in keys:
+                if (item := self._items.get(key)) is None:
+                    continue
+                value, expires = item
+                if expires is not None and expires <= now:
+                    del self._items[key]
+                else:
+                    result[key] = value
+        return result
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        expires = None if ttl is None else self.clock() + ttl
+        with self._lock:
+            self._items[key] = (value, expires)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+
+# Messages in both directions are a count of items, followed by each item
+# prefixed with its length.
+_COUNT = struct.Struct('>I')
+
+
+def _write_message(f: io.BufferedIOBase, items: Sequence[bytes]) -> None:
+    parts = [_COUNT.pack(len(items))]
+    for item in items:
+        parts += [_COUNT.pack(len(item)), item]
+    f.write(b''.join(parts))
+    f.flush()
+
+
+def _read_exactly(f: io.BufferedIOBase, size: int) -> bytes:
+    if len(data := f.read(size)) < size:
+        raise EOFError('connection closed')
+    return data
+
+
+def _read_message(f: io.BufferedIOBase) -> list[bytes]:
+    (count,) = _COUNT.unpack(_read_exactly(f, _COUNT.size))
+    items = []
+    for _ in range(count):
+        (size,) = _COUNT.unpack(_read_exactly(f, _COUNT.size))
+        items.append(_read_exactly(f, size))
+    return items
+
+
+class SocketBackend:
+    """Backend which talks to a server created by `make_server`, over TCP or
+    a Unix domain socket."""
+
+    def __init__(self, address: Address, timeout: float | None = 5.0) -> None:
+        """Create a SocketBackend object.
+
+        Args:
+          address: The (host, port) of a TCP server, or the path of a Unix
+                   domain socket.
+          timeout: The number of seconds to wait for the server.
+        """
+        self.address = address
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock: socket.socket | None = None
+        self._file: io.BufferedIOBase | None = None
+
+        forking.track(self)
+
+    def _after_fork(self) -> None:
+        # The connection belongs to the parent - requests from both processes
+        # would be mixed up on it - so we connect again when next used.
+        self._lock = threading.Lock()
+        self._sock = self._file = None
+
+    def _connect(self) -> io.BufferedIOBase:
+        if isinstance(self.address, str):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.address)
+        else:
+            sock = socket.create_connection(self.address, self.timeout)
+        self._sock = sock
+        self._file = sock.makefile('rwb')
+        return self._file
+
+    def _request(self, *items: bytes) -> list[bytes]:
+        with self._lock:
+            # Reconnect once, in case the server dropped an idle connection.
+            for attempt in range(2):
+                f = self._file or self._connect()
+                try:
+                    _write_message(f, items)
+                    return _read_message(f)
+                except (EOFError, OSError):
+                    self.close()
+                    if attempt:
+                        raise
+        raise AssertionError  # unreachable
+
+    def get(self, key: str) -> bytes | None:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Sequence[str]) -> dict[str, bytes]:
+        values = self._request(b'get', *(k.encode('utf-8') for k in keys))
+        return {k: v[1:] for (k, v) in zip(keys, values, strict=True) if v[:1] == b'+'}
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        ttl_bytes = b'' if ttl is None else str(ttl).encode('ascii')
+        self._request(b'set', key.encode('utf-8'), value, ttl_bytes)
+
+    def delete(self, key: str) -> None:
+        self._request(b'delete', key.encode('utf-8'))
+
+    def close(self) -> None:
+        """Close the connection to the server - it will be reopened if the
+        backend is used again."""
+        if self._file:
+            self._file.close()
+        if self._sock:
+            self._sock.close()
+        self._file = self._sock = None
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: _TCPServer | _UnixServer
+
+    def handle(self) -> None:
+        backend = self.server.backend
+        while True:
+            try:
+                op, *args = _read_message(self.rfile)
+            except EOFError:
+                return
+            if op == b'get':
+                keys = [k.decode('utf-8') for k in args]
+                found = backend.get_many(keys)
+                reply = [b'+' + found[k] if k in found else b'-' for k in keys]
+            elif op == b'set':
+                key, value, ttl = args
+                backend.set(key.decode('utf-8'), value, float(ttl) if ttl else None)
+                reply = []
+            elif op == b'delete':
+                backend.delete(args[0].decode('utf-8'))
+                reply = []
+            else:
+                return
+            _write_message(self.wfile, reply)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    backend: CacheBackend
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    backend: CacheBackend
+
+
+def make_server(
+    address: Address, backend: CacheBackend | None = None
+) -> socketserver.BaseServer:
+    """Create a server which `SocketBackend` objects can connect to.
+
+    Call `serve_forever` on the result to handle requests.
+
+    Args:
+      address: The (host, port) to listen on for TCP connections (port 0 picks
+               a free port), or the path of a Unix domain socket to create.
+      backend: The backend which holds the content, otherwise a new
+               MemoryBackend.
+    """
+    server: _TCPServer | _UnixServer
+    if isinstance(address, str):
+        server = _UnixServer(address, _Handler)
+    else:
+        server = _TCPServer(address, _Handler)
+    server.backend = backend or MemoryBackend()
+    return server
@@ -0,0 +1,153 @@
+"""Circuit breaking for calls made to Remember The Milk."""
+
+from __future__ import annotations
+
+import contextlib
+import enum
+import threading
+import time
+
+from typing import Any, TYPE_CHECKING
+
+from milky import forking
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of making a call while a circuit breaker is open."""
+
+
+class State(enum.Enum):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker:
+    """Stops calls being made to Remember The Milk while it is failing.
+
+    The breaker opens after a number of calls in a row have failed (with an
+    HTTP or connection error - errors reported by RTM in a response show that
+    it is working). While open, calls fail straight away with CircuitOpenError,
+    rather than each waiting for its own timeout. Once the reset time has
+    passed, a limited number of probe calls are let through: if one succeeds
+    the breaker closes again, and if one fails it stays open for another
+    reset period.
+
+    A single breaker can be shared by any number of Transport objects which
+    use the same API key.
+    """
+
+    def __init__(
+        self,
+        threshold: int = 5,
+        reset_after: float = 30.0,
+        probes: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create a CircuitBreaker object.
+
+        Args:
+          threshold: The number of failures in a row which open the breaker.
+          reset_after: The number of seconds to stay open before probing.
+          probes: The number of probe calls allowed in progress at once.
+          clock: Function which returns the current time in seconds.
+        """
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.probes = probes
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._state = State.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = 0
+
+        forking.track(self)
+
+    def _after_fork(self) -> None:
+        # Probes in progress in other threads weren't copied.
+        self._lock = threading.Lock()
+        self._probing = 0
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {
+            'threshold': self.threshold,
+            'reset_after': self.reset_after,
+            'probes': self.probes,
+            'clock': self.clock,
+        }
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(**state)  # type: ignore[misc]
+
+    @property
+    def state(self) -> State:
+        with self._lock:
+            if self._state is State.OPEN and self._reset_due():
+                return State.HALF_OPEN
+            return self._state
+
+    def _reset_due(self) -> bool:
+        return self.clock() >= self._opened_at + self.reset_after
+
+    def allows(self) -> bool:
+        """Indicates if a call would be attempted now."""
+        with self._lock:
+            if self._state is State.OPEN:
+                return self._reset_due()
+            if self._state is State.HALF_OPEN:
+                return self._probing < self.probes
+            return True
+
+    def _enter(self) -> bool:
+        # Returns whether the call is a probe.
+        with self._lock:
+            if self._state is State.OPEN and self._reset_due():
+                self._state = State.HALF_OPEN
+            if self._state is State.OPEN or (
+                self._state is State.HALF_OPEN and self._probing >= self.probes
+            ):
+                raise CircuitOpenError('Remember The Milk is unavailable')
+            if self._state is State.HALF_OPEN:
+                self._probing += 1
+                return True
+            return False
+
+    def _exit(self, probe: bool, ok: bool | None) -> None:
+        # A call which was interrupted (ok is None) is neither a success nor
+        # a failure, but still gives up its probe.
+        with self._lock:
+            if probe:
+                self._probing -= 1
+            if ok is None:
+                return
+            if ok:
+                self._state = State.CLOSED
+                self._failures = 0
+                return
+            self._failures += 1
+            if probe or self._failures >= self.threshold:
+                self._state = State.OPEN
+                self._opened_at = self.clock()
+
+    @contextlib.contextmanager
+    def guard(self) -> Iterator[None]:
+        """Context in which a call is made, recording if it succeeded.
+
+        Raises:
+          CircuitOpenError: if the breaker is open.
+        """
+        probe = self._enter()
+        ok = None
+        try:
+            yield
+            ok = True
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self._exit(probe, ok)
@@ -1,58 +1,163 @@
 from __future__ import annotations
 
+import threading
+import weakref
+
 from typing import Any, Generic, overload, TYPE_CHECKING, TypeVar
 
+from milky.datatypes import DynamicCrate
+
 if TYPE_CHECKING:
-    from collections.abc import Callable
+    from collections.abc import Callable, Iterator
+
+    from milky.backend import CacheBackend, Codec
 
 T = TypeVar('T')
 
 
+class _Node:
+    __slots__ = ['children', 'value', 'wildcard']
+
+    def __init__(self, value: bool | None = None):
+        # None means the value is inherited from the parent node.
+        self.value = value
+        self.children: dict[str, _Node] = {}
+
+        # Default for per-object entries (e.g. "tasks.<list_id>"), if this
+        # node allows them.
+        self.wildcard: _Node | None = None
+
+
 class Cache:
-    DEFAULTS = (
+    """Settings which control what is cached, arranged as a tree of dotted
+    keys (e.g. "aa.bb").
+
+    A key declared with a trailing ".*" (e.g. "tasks.*") allows per-object
+    entries beneath it (e.g. "tasks.123"), which inherit their setting from
+    their parent until they are given one of their own.
+    """
+
+    DEFAULTS: tuple[tuple[str, bool | None], ...] = (
         ('lists', True),
         ('settings', True),
+        ('tasks', True),
+        ('tasks.*', None),
         ('timeline', True),
     )
 
-    __slots__ = ['_settings']
+    __slots__ = ['_root']
+
+    def __init__(self, settings: dict[str, bool | None] | None = None):
+        self._root = _Node(True)
+        for key, value in (settings or dict(self.DEFAULTS)).items():
+            self._declare(key, value)
+
+    def _declare(self, key: str, value: bool | None) -> None:
+        node = self._root
+        *parents, last = key.split('.')
+        for part in parents:
+            node = node.children.setdefault(part, _Node())
+        if last == '*':
+            node.wildcard = _Node(value)
+        else:
+            node = node.children.setdefault(last, _Node())
+            node.value = value
+
+    def _resolve(self, key: str, create: bool = False) -> list[_Node]:
+        # Returns the nodes to take the setting from, most general first.
+        node = self._root
+        path = [node]
+        for part in key.split('.'):
+            child = node.children.get(part)
+            if node.wildcard is not None:
+                # Per-object entries inherit from the wildcard's setting, and
+                # only exist once they have been given a setting of their own.
+                path.append(node.wildcard)
+                if child is None:
+                    if not create:
+                        node = node.wildcard
+                        continue
+                    child = node.children[part] = _Node()
+            elif child is None:
+                raise KeyError(key)
+            node = child
+            path.append(node)
+        return path
+
+    def __getitem__(self, key: str) -> bool:
+        for node in reversed(self._resolve(key)):
+            if node.value is not None:
+                return node.value
+        raise AssertionError  # The root node always has a value.
 
-    def __init__(self):
-        self._settings = dict(self.DEFAULTS)
+    def __setitem__(self, key: str, value: bool):
+        self._resolve(key, create=True)[-1].value = value
 
-    def __getitem__(self, key: str):
-        return self._settings[key]
+    def reset(self, prefix: str) -> None:
+        """Remove the per-object entries at or beneath the key, so that they
+        inherit their settings again."""
+        path = self._resolve(prefix)
 
-    def __setitem__(self, key: str, value: bool):
-        if key not in self._settings:
-            raise KeyError(key)
-        self._settings[key] = value
+        def clear(node: _Node) -> None:
+            if node.wildcard is not None:
+                node.children.clear()
+            for child in node.children.values():
+                clear(child)
+
+        clear(path[-1])
+
+        # The key itself may be a per-object entry.
+        parent_key, _, part = prefix.rpartition('.')
+        if parent_key and (parent := self._resolve(parent_key)[-1]).wildcard:
+            parent.children.pop(part, None)
+
+    def _items(self) -> list[tuple[str, bool | None]]:
+        items: list[tuple[str, bool | None]] = []
+
+        def walk(node: _Node, key: str) -> None:
+            if node is not self._root:
+                items.append((key, node.value))
+            if node.wildcard is not None:
+                items.append((f'{key}.*'.lstrip('.'), node.wildcard.value))
+            for part, child in node.children.items():
+                walk(child, f'{key}.{part}'.lstrip('.'))
+
+        walk(self._root, '')
+        return items
 
     def __getattr__(self, attr: str):
-        if attr in self._settings or any(
-            a for a in self._settings if a.startswith(attr + '.')
-        ):
-            return CacheView(self, attr)
+        # Private names are never settings (and are looked up by pickle).
+        if not attr.startswith('_') and (node := self._root.children.get(attr)):
+            return CacheView(self, attr, node)
         raise AttributeError(attr)
 
     def __str__(self):
-        attrs = ((k, v and 'on' or 'off') for (k, v) in sorted(self._settings.items()))
+        items = sorted(self._items())
+        attrs = ((k, v and 'on' or 'off') for (k, v) in items if v is not None)
         attrstr = ', '.join((k + '=' + v) for (k, v) in attrs)
         return f"Cache({attrstr})"
 
     def __repr__(self):
-        return f"Cache({self._settings!r})"
+        return f"Cache({dict(self._items())!r})"
 
 
 class CacheView:
-    __slots__ = ['cache', 'key']
+    __slots__ = ['cache', 'key', 'node']
 
-    def __init__(self, cache: Cache, key: str):
+    def __init__(self, cache: Cache, key: str, node: _Node):
         self.cache = cache
         self.key = key
+        self.node = node
 
     def __getattr__(self, attr: str):
-        return getattr(self.cache, self.key + '.' + attr)
+        if not attr.startswith('_') and (node := self.node.children.get(attr)):
+            return CacheView(self.cache, self.key + '.' + attr, node)
+        raise AttributeError(attr)
+
+    def __getitem__(self, part: str | int) -> CacheView:
+        """Return the view of a per-object entry (e.g. `cache.tasks[123]`)."""
+        key = f'{self.key}.{part}'
+        return CacheView(self.cache, key, self.cache._resolve(key)[-1])  # noqa: SLF001
 
     @property
     def on(self) -> bool:
@@ -62,17 +167,37 @@ class CacheView:
     def on(self, value: bool) -> None:
         self.cache[self.key] = value
 
+    def reset(self) -> None:
+        self.cache.reset(self.key)
+
     def __str__(self):
         return f"CacheView({self.key!r})"
 
 
+_MISSING = object()
+
+
 class CacheableProperty(Generic[T]):
 
     name: str
 
-    def __init__(self, location: str | None, inner: Callable[..., T]):
+    def __init__(
+        self,
+        location: str | None,
+        inner: Callable[..., T],
+        codec: Codec[T] | None = None,
+        ttl: float | None = None,
+    ):
         self.location = location
         self.inner = inner
+        self.codec = codec
+        self.ttl = ttl
+
+        # Locks which stop the value being loaded by several threads at once.
+        self._guard = threading.Lock()
+        self._locks: weakref.WeakKeyDictionary[Any, threading.Lock] = (
+            weakref.WeakKeyDictionary()
+        )
 
     def __set_name__(self, owner: type, name: str):
         self.name = name
@@ -102,16 +227,96 @@ class CacheableProperty(Generic[T]):
             return self
 
         # Use cache if it exists.
+        if (found := self._lookup(instance)) is not _MISSING:
+            self._hit(instance)
+            return found
+
+        if not self.can_cache_on(instance):
+            return self.inner(instance)
+
+        # Only one thread loads the value, and the others wait for it.
+        with self._lock_for(instance):
+            if (found := self._lookup(instance)) is not _MISSING:
+                self._hit(instance)
+                return found
+            return self._load(instance)
+
+    def _lookup(self, instance: Any) -> Any:
+        if self.name not in instance.__dict__:
+            return _MISSING
+        value = instance.__dict__[self.name]
+
+        # Stale values are reloaded once RTM may be back.
+        stale = isinstance(value, DynamicCrate) and value.stale
+        if stale and self._may_recover(instance):
+            return _MISSING
+        return value
+
+    def _hit(self, instance: Any) -> None:
+        # Let the quota know a call was avoided - values without a location
+        # are derived from content already loaded, so don't count.
+        if self.location is None:
+            return
+        milky = getattr(instance, 'milky', instance)
+        transport = getattr(milky, 'transport', None)
+        if quota := getattr(transport, 'quota', None):
+            quota.hit(self.name)
+
+    def _lock_for(self, instance: Any) -> threading.Lock | threading.RLock:
+        # Crates load their values holding the lock for their content, so the
+        # two locks can't be taken in opposite orders by different threads.
+        if isinstance(instance, DynamicCrate):
+            return instance._lock  # noqa: SLF001
+        with self._guard:
+            if (lock := self._locks.get(instance)) is None:
+                lock = self._locks[instance] = threading.Lock()
+            return lock
+
+    def _load(self, instance: Any) -> T:
         if self.name in instance.__dict__:
-            return instance.__dict__[self.name]
+            self.expire(instance)
+
+        # See if another process has already loaded it.
+        if shared := self._shared(instance):
+            backend, key = shared
+            if (data := backend.get(key)) is not None:
+                assert self.codec is not None
+                milky: Any = getattr(instance, 'milky', instance)
+                result = instance.__dict__[self.name] = self.codec.decode(milky, data)
+                self._hit(instance)
+                return result
+
+        result = instance.__dict__[self.name] = self.inner(instance)
+        if isinstance(result, DynamicCrate):
+            result.fallback = instance.__dict__.pop(self._stale_name, None)
+        if shared:
+            self._publish(*shared, result)
+        return result
 
-        # See if we need to store it on the cache.
-        result = self.inner(instance)
+    @property
+    def _stale_name(self) -> str:
+        return self.name + ':stale'
 
-        if self.can_cache_on(instance):
-            instance.__dict__[self.name] = result
+    @staticmethod
+    def _may_recover(instance: Any) -> bool:
+        milky = getattr(instance, 'milky', instance)
+        breaker = milky.transport.breaker
+        return breaker is None or breaker.allows()
 
-        return result
+    def _shared(self, instance: Any) -> tuple[CacheBackend, str] | None:
+        # The backend and key used to share the value with other processes.
+        milky = getattr(instance, 'milky', instance)
+        if self.codec is None or (backend := milky.backend) is None:
+            return None
+        return backend, milky.backend_key(self.name)
+
+    def _publish(self, backend: CacheBackend, key: str, value: T) -> None:
+        assert self.codec is not None
+        if (data := self.codec.encode(value)) is not None:
+            backend.set(key, data, self.ttl)
+        elif isinstance(value, DynamicCrate):
+            # Share it once its content has been loaded.
+            value.on_load = lambda _: self._publish(backend, key, value)
 
     def __set__(self, instance: Any, value: T):
         if self.can_cache_on(instance):
@@ -120,15 +325,85 @@ class CacheableProperty(Generic[T]):
     def __delete__(self, instance: Any):
         if self.name in instance.__dict__:
             del instance.__dict__[self.name]
+        instance.__dict__.pop(self._stale_name, None)
+
+    def expire(self, instance: Any) -> None:
+        """Drop the cached value, as it is out of date.
+
+        If the Milky object serves stale content, crates are kept to fall back
+        on in case the new content can't be loaded while the circuit breaker
+        is open.
+        """
+        value = instance.__dict__.pop(self.name, None)
+        milky = getattr(instance, 'milky', instance)
+        if getattr(milky, 'serve_stale', False) and isinstance(value, DynamicCrate):
+            instance.__dict__[self._stale_name] = value
+
+    def unshare(self, instance: Any) -> None:
+        """Remove the value from the cache backend, if there is one."""
+        if shared := self._shared(instance):
+            backend, key = shared
+            backend.delete(key)
+
+
+def _covers(prefix: str | None, location: str | None) -> bool:
+    if prefix is None or location is None:
+        return prefix is location
+    return location == prefix or location.startswith(prefix + '.')
+
+
+def _properties(
+    instance: Any, locations: tuple[str | None, ...]
+) -> Iterator[CacheableProperty[Any]]:
+    for klass in type(instance).__mro__:
+        for attr in vars(klass).values():
+            if isinstance(attr, CacheableProperty) and any(
+                _covers(loc, attr.location) for loc in locations
+            ):
+                yield attr
+
+
+def invalidate(instance: Any, *locations: str | None) -> None:
+    """Drop values cached on the object in any of the given cache locations,
+    or in locations beneath them.
+
+    Values are also removed from the cache backend, so that other processes
+    don't use them either.
+    """
+    for attr in _properties(instance, locations):
+        attr.expire(instance)
+        attr.unshare(instance)
+
+
+def unshare(instance: Any, *locations: str | None) -> None:
+    """Remove values cached on the object in any of the given cache locations,
+    or in locations beneath them, from the cache backend only.
+
+    This is for values which have been changed in place - the object keeps
+    them, but other processes load them again.
+    """
+    for attr in _properties(instance, locations):
+        attr.unshare(instance)
 
 
 def cache_controlled(
     key: str | None,
+    codec: Codec[Any] | None = None,
+    ttl: float | None = None,
 ) -> Callable[[Callable[..., T]], CacheableProperty[T]]:
+    """Make a method into a property whose value is cached.
+
+    Args:
+      key: The cache location which controls if the value is cached, or None
+           if it is always cached.
+      codec: Converts the value to and from bytes, so that it can be shared
+             through a cache backend set on the Milky object.
+      ttl: The number of seconds the value is kept in the cache backend.
+    """
     # We don't use functools.partial, because we want to
     # be more specific with the type signature of the parameters
     # being passed to us.
     def cache_decorator(f: Callable[..., T]) -> CacheableProperty[T]:
-        return CacheableProperty(key, f)
+        return CacheableProperty(key, f, codec, ttl)
 
     return cache_decorator
@@ -2,19 +2,35 @@
 from __future__ import annotations
 
 import abc
+import asyncio
+import collections.abc
 
 import enum
-from dataclasses import dataclass
-from typing import Generic, overload, TYPE_CHECKING, TypeVar
+import threading
+from dataclasses import dataclass, field
+from typing import Any, cast, ClassVar, Generic, overload, TYPE_CHECKING, TypeVar
 
 from xml.etree import ElementTree as ET
 
+from milky.breaker import CircuitOpenError
+from milky.limiter import priority, Priority
+
 if TYPE_CHECKING:
-    from collections.abc import Callable, Sequence
+    from collections.abc import AsyncIterator, Callable, Hashable, Iterable, Sequence
 
     from milky.root import Milky
     from milky.transport import ParamType
 
+T = TypeVar('T')
+
+
+def _copy_element(element: ET.Element) -> ET.Element:
+    # Shallow copy of an element - copy.copy would share the attributes.
+    result = ET.Element(element.tag, dict(element.attrib))
+    result.text, result.tail = element.text, element.tail
+    result.extend(element)
+    return result
+
 
 @dataclass
 class Bottle:
@@ -37,6 +53,11 @@ class Bottle:
 
     element: ET.Element
 
+    # Values decoded from the content, see `memo`.
+    _memo: dict[Hashable, Any] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
     def __post_init__(self):
         if not isinstance(self.element, ET.Element):
             raise TypeError(type(self.element))
@@ -65,11 +86,26 @@ class Bottle:
         raise KeyError(name)
 
     def __getattr__(self, name: str) -> str:
+        # Dunder names are looked up by pickle and copy before the element
+        # has been set.
+        if name.startswith('__'):
+            raise AttributeError(name)
         try:
             return self[name]
         except KeyError:
             raise AttributeError(name) from None
 
+    def memo(self, key: Hashable, compute: Callable[[], T]) -> T:
+        """Return the value computed for the key, only computing it the first
+        time it is asked for.
+
+        Values are kept with the bottle, so they are dropped along with the
+        content they were decoded from.
+        """
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
     def one(self, name: str) -> Bottle:
         """Return the only descendant element that matches the path given.
 
@@ -102,10 +138,88 @@ class Bottle:
         """The text of the element itself."""
         return self.element.text or ''
 
+    def replace(self, name: str, value: str) -> Bottle:
+        """Return a copy of the bottle with a value replaced.
+
+        The name is given in the same form as when looking up a value. Only
+        the elements which need to be changed are copied.
+        """
+        subpath, _, attr = name.rpartition('/')
+        element = target = _copy_element(self.element)
+
+        for part in filter(None, subpath.split('/')):
+            if (child := target.find(part)) is None:
+                raise KeyError(name)
+            target[list(target).index(child)] = new_child = _copy_element(child)
+            target = new_child
+
+        if not attr:
+            target.text = value
+        elif attr not in target.attrib and (child := target.find(attr)) is not None:
+            target[list(target).index(child)] = new_child = _copy_element(child)
+            new_child.text = value
+        else:
+            target.set(attr, value)
+
+        return type(self)(element)
+
     def __str__(self) -> str:
         return ET.tostring(self.element, encoding='unicode')
 
 
+class Collection(collections.abc.Sequence[T]):
+    """Sequence of values decoded from the descendant elements of a bottle
+    which match a path.
+
+    Elements are only looked up once the collection is first used, and each
+    value is only decoded when it is first asked for - so objects which have
+    large collections are cheap to create when the collection isn't needed.
+    """
+
+    def __init__(self, bottle: Bottle, path: str, factory: Callable[[ET.Element], T]):
+        self.bottle = bottle
+        self.path = path
+        self.factory = factory
+        self._elements: list[ET.Element] | None = None
+        self._values: dict[int, T] = {}
+
+    @property
+    def elements(self) -> list[ET.Element]:
+        if self._elements is None:
+            self._elements = self.bottle.element.findall(self.path)
+        return self._elements
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    @overload
+    def __getitem__(self, index: int) -> T:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[T]:
+        ...
+
+    def __getitem__(self, index: int | slice) -> T | list[T]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        element = self.elements[index]
+        index %= len(self.elements)
+        if (value := self._values.get(index)) is None:
+            value = self._values[index] = self.factory(element)
+        return value
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, collections.abc.Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({list(self)!r})'
+
+
 class Action(enum.Enum):
     """Indicates what type of action we want to perform with RTM - a
     read-only operation (READ), a write operation (WRITE), or a write
@@ -122,6 +236,10 @@ class Crate:
 
     bottle_class: type[Bottle] = Bottle
 
+    #: Names of cached attributes which are derived from the content, and
+    #: so are dropped when the content changes.
+    derived: ClassVar[tuple[str, ...]] = ()
+
     def __init__(self, milky: Milky):
         """
         Construct a Crate object.
@@ -132,11 +250,19 @@ class Crate:
         self.milky = milky
         self._bottle: Bottle | None = None
 
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        # Callbacks refer to objects in this process.
+        state.pop('on_load', None)
+        return state
+
     def _get_bottle(self) -> Bottle:
         assert self._bottle is not None
         return self._bottle
 
-    def _set_bottle(self, bottle: ET.Element | Bottle) -> None:
+    def _wrap(self, bottle: ET.Element | Bottle) -> Bottle:
+        """Convert XML content for this object into a bottle, without
+        changing the object."""
         if isinstance(bottle, ET.Element):
             bottle = self.bottle_class(bottle)
         elif type(bottle) is self.bottle_class:
@@ -145,11 +271,22 @@ class Crate:
             bottle = self.bottle_class(bottle.element)
         else:
             raise ValueError(type(bottle))
-        self._bottle = bottle
+        return bottle
+
+    def _set_bottle(self, bottle: ET.Element | Bottle) -> None:
+        self._bottle = self._wrap(bottle)
+        for name in self.derived:
+            self.__dict__.pop(name, None)
+        self.milky._changed(self)  # noqa: SLF001
 
     # https://github.com/python/mypy/issues/14684
     bottle = property(_get_bottle, _set_bottle)
 
+    def _dump(self) -> ET.Element | None:
+        """Return the XML content that describes the current state of the
+        object, or None if it hasn't been loaded."""
+        return self._bottle.element if self._bottle is not None else None
+
     def __call__(
         self, method: str, action: Action = Action.READ, /, **params: ParamType
     ) -> Bottle:
@@ -168,8 +305,14 @@ class Crate:
         """
         params.update(self.identity)
 
+        # Updates are reflected on this object itself, so there's no need to
+        # throw away anything else that has been cached.
         result = self.milky.invoke(
-            method, action is not Action.READ, unwrap=True, **params
+            method,
+            action is not Action.READ,
+            unwrap=True,
+            invalidate=action is Action.WRITE,
+            **params,
         )
 
         if action is Action.UPDATE:
@@ -190,7 +333,18 @@ class Crate:
         return {}
 
 
+SC = TypeVar('SC', bound='SimpleCrate')
+
+
 class SimpleCrate(Crate):
+
+    #: Path to the value in the XML element which uniquely identifies the
+    #: object - if set, objects are reused when the same content is reloaded.
+    identity_attr: str | None = None
+
+    # Guards the identity maps of Milky objects.
+    _identity_lock = threading.Lock()
+
     def __init__(self, milky: Milky, bottle: ET.Element | Bottle):
         """
         Construct a Crate object with XML data.
@@ -202,6 +356,49 @@ class SimpleCrate(Crate):
         super().__init__(milky)
         Crate.bottle.fset(self, bottle)
 
+    @classmethod
+    def load(  # noqa: PYI019
+        cls: type[SC], milky: Milky, bottle: ET.Element | Bottle
+    ) -> SC:
+        """
+        Return a Crate object for the XML data.
+
+        If an object for the same RTM object is still in use, then that object
+        is updated with the new data and returned, rather than creating a new
+        one.
+
+        Args:
+            milky: Milky object that the object should be attached to.
+            bottle: The XML element which describes the object.
+        """
+        if cls.identity_attr is None:
+            return cls(milky, bottle)
+
+        element = bottle.element if isinstance(bottle, Bottle) else bottle
+        key = (cls, Bottle(element)[cls.identity_attr])
+
+        with SimpleCrate._identity_lock:
+            if (crate := milky.crates.get(key)) is not None:
+                crate._set_bottle(bottle)  # noqa: SLF001
+                return cast('SC', crate)
+
+            milky.crates[key] = crate = cls(milky, bottle)
+            return crate
+
+    @classmethod
+    def discard(  # noqa: PYI019
+        cls: type[SC], milky: Milky, identity: str
+    ) -> SC | None:
+        """
+        Stop reusing the object with the given identity, such as once it has
+        been deleted.
+
+        Returns:
+            The object, if one was in use.
+        """
+        with SimpleCrate._identity_lock:
+            return cast('SC | None', milky.crates.pop((cls, identity), None))
+
 
 class DynamicCrate(Crate, abc.ABC):
 
@@ -210,20 +407,104 @@ class DynamicCrate(Crate, abc.ABC):
     when required.
     """
 
+    #: Called with the object once its content has been loaded.
+    on_load: Callable[[DynamicCrate], None] | None = None
+
+    #: Object with the last known content, used if the content can't be
+    #: loaded because the circuit breaker is open.
+    fallback: DynamicCrate | None = None
+
+    #: Indicates the content was taken from the fallback.
+    stale = False
+
+    def __init__(self, milky: Milky):
+        super().__init__(milky)
+        # Held while loading content, or changing anything derived from it.
+        self._lock = threading.RLock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = super().__getstate__()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
     @Crate.bottle.getter
     def bottle(self) -> Bottle:
         if self._bottle is not None:
             return self._bottle
 
-        self.bottle = bottle = self._load_content()
-        return bottle
+        with self._lock:
+            # Another thread may have loaded it while we waited.
+            if self._bottle is not None:
+                return self._bottle
+
+            try:
+                bottle = self._load_content()
+            except CircuitOpenError:
+                fallback = (
+                    self.fallback._bottle if self.fallback else None  # noqa: SLF001
+                )
+                if fallback is None:
+                    raise
+                bottle, self.stale = fallback, True
+            self.fallback = None
+
+            self.bottle = bottle
+            if self.on_load and not self.stale:
+                self.on_load(self)
+            return bottle
 
     @abc.abstractmethod
     def _load_content(self) -> Bottle:
         ...
 
+    async def aload(self) -> Bottle:
+        """Asynchronous version of `bottle`, which loads the content in a
+        worker thread so the event loop isn't blocked."""
+        if self._bottle is not None:
+            return self._bottle
+        return await asyncio.to_thread(lambda: self.bottle)
 
-T = TypeVar('T')
+
+#: Number of objects produced by asynchronous iteration before letting other
+#: tasks run.
+ASYNC_BATCH = 100
+
+C = TypeVar('C', bound=Crate)
+
+
+async def aiterate(
+    crate: DynamicCrate, name: str, build: Callable[[], Iterable[C]]
+) -> AsyncIterator[C]:
+    """Iterate asynchronously over the objects of a collection.
+
+    The content is loaded without blocking the event loop, and the objects are
+    created as they are iterated over, with other tasks given the chance to
+    run between batches of them. Once every object has been created, they are
+    cached under the name given, as if it had been iterated over normally.
+
+    Args:
+      crate: The collection.
+      name: The name of the cached attribute which holds the objects.
+      build: Function which creates the objects from the content.
+    """
+    await crate.aload()
+    cached = name in crate.__dict__
+    items = list(getattr(crate, name)) if cached else build()
+
+    built = []
+    for count, item in enumerate(items, 1):
+        if not cached:
+            built.append(item)
+        yield item
+        if not count % ASYNC_BATCH:
+            await asyncio.sleep(0)
+
+    if not cached and name not in crate.__dict__:
+        setattr(crate, name, built)
 
 
 class BottleDescriptor(Generic[T]):
@@ -276,4 +557,8 @@ class BottleDescriptor(Generic[T]):
             raise ValueError('read-only attribute')
         assert self.attr is not None
         assert isinstance(value, (int, str))
-        instance(self.setmethod, Action.UPDATE, **{self.attr: value})
+        with priority(Priority.INTERACTIVE):
+            if (writer := instance.milky.writer) is not None:
+                writer.update(instance, self.setmethod, **{self.attr: value})
+            else:
+                instance(self.setmethod, Action.UPDATE, **{self.attr: value})
@@ -0,0 +1,140 @@
+"""Index of tasks by when they are due, for finding tasks which fall due soon."""
+
+from __future__ import annotations
+
+import bisect
+import datetime
+import itertools
+import threading
+
+from typing import TYPE_CHECKING
+
+from milky.models import Task
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from milky.datatypes import Crate
+    from milky.root import Milky
+
+
+def _utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _due_at(task: Task) -> float | None:
+    # When the task falls due, or None if it shouldn't be in the index.
+    element = task.bottle.element.find('task')
+    if element is None or not element.get('due'):
+        return None
+    if element.get('completed') or element.get('deleted'):
+        return None
+    due = Task.due.astimezone(task, datetime.timezone.utc)
+    return due.timestamp() if due else None
+
+
+class DueIndex:
+    """Index of incomplete tasks with a due date, ordered by when they fall due,
+    across any number of accounts.
+
+    Tasks are added as they are loaded by the Milky objects being watched, and
+    are moved or removed as they change - whether through changes made to them
+    or through content reloaded from Remember The Milk (such as by a Poller) -
+    so the index never has to be rebuilt.
+
+    Times given to queries must be timezone-aware. Tasks are compared by the
+    moment they fall due, and give their due date in the timezone of their
+    own account.
+    """
+
+    def __init__(self, now: Callable[[], datetime.datetime] = _utc_now) -> None:
+        """Create a DueIndex object.
+
+        Args:
+          now: Function which returns the current time.
+        """
+        self.now = now
+        self._lock = threading.Lock()
+
+        # Sorted entries of due time, insertion order and task.
+        self._entries: list[tuple[float, int, Task]] = []
+        self._keys: dict[Task, tuple[float, int]] = {}
+        self._seq = itertools.count()
+        self._unsubscribers: dict[int, Callable[[], None]] = {}
+
+    def watch(self, milky: Milky) -> None:
+        """Index the tasks of an account - both the ones already loaded, and
+        any loaded or changed from now on."""
+        with self._lock:
+            if id(milky) in self._unsubscribers:
+                return
+            self._unsubscribers[id(milky)] = milky.subscribe(self._changed)
+        for crate in list(milky.crates.values()):
+            self._changed(crate)
+
+    def unwatch(self, milky: Milky) -> None:
+        """Stop indexing the tasks of an account, and remove them."""
+        with self._lock:
+            if (unsubscribe := self._unsubscribers.pop(id(milky), None)) is None:
+                return
+            unsubscribe()
+            for task in [t for t in self._keys if t.milky is milky]:
+                self._remove(task)
+
+    def _changed(self, crate: Crate) -> None:
+        if isinstance(crate, Task):
+            self.update(crate)
+
+    def update(self, task: Task) -> None:
+        """Add, move or remove a task according to its current content."""
+        due = _due_at(task)
+        with self._lock:
+            if (key := self._keys.get(task)) is not None:
+                if key[0] == due:
+                    return
+                self._remove(task)
+            if due is not None:
+                key = self._keys[task] = (due, next(self._seq))
+                bisect.insort(self._entries, (*key, task))
+
+    def _remove(self, task: Task) -> None:
+        key = self._keys.pop(task)
+        del self._entries[bisect.bisect_left(self._entries, key)]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, task: object) -> bool:
+        return task in self._keys
+
+    def between(
+        self, start: datetime.datetime | None, end: datetime.datetime | None
+    ) -> list[Task]:
+        """Return the tasks due from the start (inclusive) to the end (exclusive),
+        in the order they fall due.
+
+        A start or end of None leaves that end of the range open.
+        """
+        with self._lock:
+            lo = 0 if start is None else self._position(start)
+            hi = len(self._entries) if end is None else self._position(end)
+            return [task for (_, _, task) in self._entries[lo:hi]]
+
+    def _position(self, when: datetime.datetime) -> int:
+        return bisect.bisect_left(self._entries, (when.timestamp(),))
+
+    def within(self, period: datetime.timedelta) -> list[Task]:
+        """Return the tasks which fall due within the period from now."""
+        now = self.now()
+        return self.between(now, now + period)
+
+    def next_due(self, k: int, after: datetime.datetime | None = None) -> list[Task]:
+        """Return the next tasks to fall due.
+
+        Args:
+          k: The maximum number of tasks to return.
+          after: The time to look from (inclusive), otherwise now.
+        """
+        with self._lock:
+            lo = self._position(after or self.now())
+            return [task for (_, _, task) in self._entries[lo : lo + k]]
@@ -0,0 +1,279 @@
+"""Streaming export of the lists and tasks of an account.
+
+Records are written as they are fetched, without creating Milky objects for
+them: first a record for each list, then the tasks of each list, which are
+fetched in parallel (subject to any limiter on the transport). At most a few
+responses are held in memory at once, however large the account is. If the
+transport has a PoolParser, large responses are decoded into records in its
+process pool.
+
+If a checkpoint file is given, progress is recorded in it after each list,
+and an interrupted export resumes from where it stopped - the output is cut
+back to the end of the last list completed, so nothing is written twice.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import contextvars
+import csv
+import json
+import os
+import time
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, TYPE_CHECKING
+
+from milky.limiter import priority, Priority
+from milky.models import Tasks
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+    from typing import TextIO
+
+    from xml.etree import ElementTree as ET
+
+    from milky.root import Milky
+
+FORMATS = ('jsonl', 'csv')
+
+#: Columns written in CSV format - list and task records share them.
+FIELDS = (
+    'kind',
+    'id',
+    'series_id',
+    'list_id',
+    'name',
+    'priority',
+    'due',
+    'added',
+    'completed',
+    'deleted',
+    'archived',
+    'smart',
+    'filter',
+    'tags',
+)
+
+Record = dict[str, Any]
+
+
+@dataclass
+class Progress:
+    """Describes how far an export has got."""
+
+    #: Number of lists whose tasks have been exported by this run, out of
+    #: the number left to export when it started.
+    lists: int
+    total: int
+
+    #: Number of records written by this run, and the time it has taken.
+    records: int
+    elapsed: float
+
+    @property
+    def rate(self) -> float:
+        """Number of records written per second."""
+        return self.records / self.elapsed if self.elapsed else 0.0
+
+
+def _list_record(element: ET.Element) -> Record:
+    attrs = element.attrib
+    return {
+        'kind': 'list',
+        'id': int(attrs['id']),
+        'name': attrs.get('name', ''),
+        'deleted': attrs.get('deleted') == '1',
+        'archived': attrs.get('archived') == '1',
+        'smart': attrs.get('smart') == '1',
+        'filter': element.findtext('filter'),
+    }
+
+
+def _priority(value: str) -> int | None:
+    return None if value == 'N' else int(value)
+
+
+def _task_records(element: ET.Element) -> Iterator[Record]:
+    for series in Tasks.split(element):
+        task = series.find('task')
+        assert task is not None
+        attrs = task.attrib
+        yield {
+            'kind': 'task',
+            'id': int(attrs['id']),
+            'series_id': int(series.attrib['id']),
+            'list_id': int(series.attrib['list_id']),
+            'name': series.attrib.get('name', ''),
+            'priority': _priority(attrs.get('priority', 'N')),
+            'due': attrs.get('due') or None,
+            'added': attrs.get('added') or None,
+            'completed': attrs.get('completed') or None,
+            'deleted': attrs.get('deleted') or None,
+            'tags': [tag.text or '' for tag in series.iterfind('tags/tag')],
+        }
+
+
+def _decode_tasks(element: ET.Element) -> list[Record]:
+    return list(_task_records(element))
+
+
+class _Output:
+    # Writes records to a file in one of the formats.
+
+    def __init__(self, f: TextIO, fmt: str, header: bool) -> None:
+        self.f = f
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(f, FIELDS, extrasaction='ignore')
+            if header:
+                self.writer.writeheader()
+
+    def write(self, record: Record) -> None:
+        if self.fmt == 'jsonl':
+            self.f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        else:
+            self.writer.writerow({**record, 'tags': ','.join(record.get('tags', ()))})
+
+
+@dataclass
+class _Checkpoint:
+    path: Path | None
+
+    # Length of the output once the last list was completed.
+    offset: int = 0
+
+    # IDs of the lists whose tasks are still to be exported, or None if the
+    # lists haven't been exported yet.
+    pending: list[int] | None = None
+
+    def load(self) -> bool:
+        if self.path is None or not self.path.exists():
+            return False
+        state = json.loads(self.path.read_text('utf-8'))
+        self.offset, self.pending = state['offset'], state['pending']
+        return True
+
+    def save(self, f: TextIO) -> None:
+        f.flush()
+        self.offset = f.tell()
+        if self.path is None:
+            return
+        state = {'offset': self.offset, 'pending': self.pending}
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        tmp.write_text(json.dumps(state), 'utf-8')
+        tmp.replace(self.path)
+
+    def remove(self) -> None:
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+
+
+def export(  # noqa: PLR0913
+    milky: Milky,
+    path: str | os.PathLike[str],
+    fmt: str | None = None,
+    checkpoint: str | os.PathLike[str] | None = None,
+    max_workers: int = 4,
+    progress: Callable[[Progress], None] | None = None,
+) -> Progress:
+    """Export the lists and tasks of an account to a file.
+
+    Calls are made with background priority.
+
+    Args:
+      milky: The Milky object for the account.
+      path: The file to write to.
+      fmt: "jsonl" or "csv", otherwise taken from the file extension
+           ("jsonl" if it isn't ".csv").
+      checkpoint: A file to record progress in. If it exists, the export
+                  resumes from it, and it is removed once the export is
+                  complete.
+      max_workers: The maximum number of lists to fetch at once.
+      progress: Function called with the progress after each list.
+
+    Returns:
+      The progress at the end of the export.
+    """
+    path = Path(path)
+    fmt = fmt or ('csv' if path.suffix == '.csv' else 'jsonl')
+    if fmt not in FORMATS:
+        raise ValueError(f'unknown format: {fmt}')
+
+    state = _Checkpoint(Path(checkpoint) if checkpoint else None)
+    if resuming := state.load():
+        os.truncate(path, state.offset)
+
+    started = time.monotonic()
+    status = Progress(0, 0, 0, 0.0)
+
+    def report(done: int, count: int) -> None:
+        status.lists, status.records = done, status.records + count
+        status.elapsed = time.monotonic() - started
+        if progress:
+            progress(status)
+
+    newline = '' if fmt == 'csv' else None
+    with path.open('a' if resuming else 'w', encoding='utf-8', newline=newline) as f:
+        out = _Output(f, fmt, header=not resuming)
+        with priority(Priority.BACKGROUND):
+            if state.pending is None:
+                response = milky.invoke('rtm.lists.getList')
+                lists = [_list_record(el) for el in response.element.iter('list')]
+                for record in lists:
+                    out.write(record)
+                state.pending = [r['id'] for r in lists if not r['smart']]
+                state.save(f)
+                status.records = len(lists)
+
+            status.total = len(state.pending)
+            report(0, 0)
+            _export_tasks(milky, out, state, max_workers, report)
+
+    state.remove()
+    return status
+
+
+def _export_tasks(
+    milky: Milky,
+    out: _Output,
+    state: _Checkpoint,
+    max_workers: int,
+    report: Callable[[int, int], None],
+) -> None:
+    assert state.pending is not None
+
+    def fetch(list_id: int) -> list[Record]:
+        # Records are decoded in the transport's process pool, if it has one.
+        return milky.transport.invoke_records(
+            'rtm.tasks.getList', _decode_tasks, list_id=list_id
+        )
+
+    todo = list(state.pending)
+    done = 0
+    in_flight: dict[concurrent.futures.Future[list[Record]], int] = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
+        try:
+            while todo or in_flight:
+                # Only fetch a few lists ahead of what has been written.
+                while todo and len(in_flight) < max_workers:
+                    list_id = todo.pop(0)
+                    context = contextvars.copy_context()
+                    in_flight[pool.submit(context.run, fetch, list_id)] = list_id
+
+                finished, _ = concurrent.futures.wait(
+                    in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in finished:
+                    list_id = in_flight.pop(future)
+                    records = future.result()
+                    for record in records:
+                        out.write(record)
+                    state.pending.remove(list_id)
+                    state.save(out.f)
+                    done += 1
+                    report(done, len(records))
+        finally:
+            for future in in_flight:
+                future.cancel()
@@ -0,0 +1,37 @@
+"""Resetting of objects in a child process after a fork.
+
+Objects such as HTTP clients and locks can't be safely used by both the
+parent and the child of a fork - connections would be shared, and a lock held
+by another thread at the time of the fork would never be released in the
+child. Objects which hold them register themselves here, and are reset in
+the child straight after a fork.
+"""
+
+from __future__ import annotations
+
+import os
+import weakref
+
+from typing import Protocol
+
+
+class ForkAware(Protocol):
+    def _after_fork(self) -> None:
+        ...
+
+
+_tracked: weakref.WeakSet[ForkAware] = weakref.WeakSet()
+
+
+def track(obj: ForkAware) -> None:
+    """Reset the object in the child process whenever the process forks."""
+    _tracked.add(obj)
+
+
+def _after_fork_in_child() -> None:
+    for obj in list(_tracked):
+        obj._after_fork()  # noqa: SLF001
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
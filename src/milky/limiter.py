@@ -0,0 +1,230 @@
+"""Rate limiting for calls made to Remember The Milk."""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import contextvars
+import enum
+import threading
+import time
+
+from typing import Any, ClassVar, TYPE_CHECKING
+
+from milky import forking
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Hashable, Iterator, Mapping
+
+
+class Priority(enum.IntEnum):
+    """Classes of calls, in the order that they are served by a limiter."""
+
+    INTERACTIVE = 0
+    NORMAL = 1
+    BACKGROUND = 2
+
+
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar(
+    'milky_priority', default=Priority.NORMAL
+)
+
+
+def current_priority() -> Priority:
+    """Return the priority that calls are currently made with."""
+    return _priority.get()
+
+
+@contextlib.contextmanager
+def priority(level: Priority) -> Iterator[None]:
+    """Context in which calls are made with the given priority."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _Ticket:
+    __slots__ = ['started']
+
+    def __init__(self, started: float) -> None:
+        self.started = started
+
+
+class RateLimiter:
+    """Token bucket which limits how often calls can be made.
+
+    Remember The Milk allows an average of one call per second for each API key,
+    with small bursts allowed. A single limiter can be shared by any number of
+    Transport objects which use the same API key.
+
+    Callers waiting for a call to be permitted are grouped by key (typically the
+    token of the account making the call), and each key is served in turn - so
+    one busy account can't starve the others of the shared rate budget.
+
+    Each call also has a priority (see `priority`), and calls with a higher
+    priority are served first. Each priority has a latency target though - once
+    a waiting call has exceeded its target, it is served ahead of calls which
+    are still within theirs, so background work is delayed but not starved.
+    """
+
+    #: Default number of seconds that calls of each priority should wait for.
+    TARGETS: ClassVar[Mapping[Priority, float]] = {
+        Priority.INTERACTIVE: 1.0,
+        Priority.NORMAL: 10.0,
+        Priority.BACKGROUND: 60.0,
+    }
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+        targets: Mapping[Priority, float] | None = None,
+    ) -> None:
+        """Create a RateLimiter object.
+
+        Args:
+          rate: The number of calls permitted per second on average.
+          burst: The number of calls which can be made in quick succession.
+          clock: Function which returns the current time in seconds.
+          targets: Latency targets to use instead of the defaults, keyed by
+                   priority.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.targets = {**self.TARGETS, **(targets or {})}
+
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._cond = threading.Condition()
+
+        # Queue of waiting callers for each priority and key, with the keys
+        # in the order they should be served.
+        self._waiting: dict[
+            Priority,
+            collections.OrderedDict[Hashable, collections.deque[_Ticket]],
+        ] = {}
+
+        forking.track(self)
+
+    def _after_fork(self) -> None:
+        # Waiting threads (and anyone holding the lock) weren't copied.
+        self._cond = threading.Condition()
+        self._waiting = {}
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Only the configuration is kept - waiting callers belong to this
+        # process.
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'clock': self.clock,
+            'targets': self.targets,
+        }
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(**state)  # type: ignore[misc]
+
+    def _refill(self) -> None:
+        now = self.clock()
+        elapsed, self._updated = now - self._updated, now
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+
+    def _heads(self) -> Iterator[tuple[Priority, _Ticket]]:
+        # The caller to be served next in each priority.
+        for level, queues in self._waiting.items():
+            yield level, next(iter(queues.values()))[0]
+
+    def _next(self, now: float) -> _Ticket:
+        # Whoever is furthest past their latency target goes first, otherwise
+        # the first caller of the highest priority.
+        overdue = max(
+            (now - ticket.started - self.targets[level], -level, ticket)
+            for (level, ticket) in self._heads()
+        )
+        if overdue[0] > 0:
+            return overdue[2]
+        return next(iter(self._waiting[min(self._waiting)].values()))[0]
+
+    def _next_change(self, now: float) -> float | None:
+        # Time until a waiting caller goes past its latency target.
+        delays = [
+            ticket.started + self.targets[level] - now
+            for (level, ticket) in self._heads()
+        ]
+        return min((d for d in delays if d > 0), default=None)
+
+    def _dequeue(
+        self, level: Priority, key: Hashable, ticket: _Ticket, served: bool
+    ) -> None:
+        queues = self._waiting[level]
+        queue = queues[key]
+        queue.remove(ticket)
+        if queue and served:
+            # Let other keys go before this one is served again.
+            queues.move_to_end(key)
+        elif not queue:
+            del queues[key]
+            if not queues:
+                del self._waiting[level]
+
+    def acquire(
+        self,
+        key: Hashable = None,
+        timeout: float | None = None,
+        priority: Priority | None = None,
+    ) -> float:
+        """Wait until a call is permitted.
+
+        Args:
+          key: Identifies who is making the call, for fair scheduling.
+          timeout: Maximum number of seconds to wait.
+          priority: The priority of the call, otherwise the priority of the
+                    current context.
+
+        Returns:
+          The number of seconds spent waiting.
+
+        Raises:
+          TimeoutError: if the call could not be permitted within the timeout.
+        """
+        started = self.clock()
+        level = current_priority() if priority is None else priority
+        ticket = _Ticket(started)
+
+        with self._cond:
+            queues = self._waiting.setdefault(level, collections.OrderedDict())
+            queues.setdefault(key, collections.deque()).append(ticket)
+            try:
+                while True:
+                    self._refill()
+                    now = self.clock()
+                    if self._tokens >= 1 and self._next(now) is ticket:
+                        break
+
+                    # Wait until a call can be made, or until the order that
+                    # callers are served in may have changed.
+                    delay = self._next_change(now)
+                    if self._tokens < 1:
+                        refill = (1 - self._tokens) / self.rate
+                        delay = refill if delay is None else min(delay, refill)
+                    if timeout is not None:
+                        remaining = started + timeout - self.clock()
+                        if remaining <= 0:
+                            msg = 'rate limit wait timed out'
+                            raise TimeoutError(msg)  # noqa: TRY301
+                        delay = remaining if delay is None else min(delay, remaining)
+                    self._cond.wait(delay)
+            except BaseException:
+                self._dequeue(level, key, ticket, served=False)
+                self._cond.notify_all()
+                raise
+
+            self._tokens -= 1
+            self._dequeue(level, key, ticket, served=True)
+            self._cond.notify_all()
+
+        return self.clock() - started
@@ -1,14 +1,30 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import functools
+import weakref
 
-from milky import rtmtypes
+from typing import Any, TYPE_CHECKING
+
+from xml.etree import ElementTree as ET  # noqa: RUF100, DUO107, S405
+
+from milky import rtmtypes, search
 from milky.cache import cache_controlled
-from milky.datatypes import Action, Bottle, DynamicCrate, SimpleCrate
+from milky.datatypes import (
+    Action,
+    aiterate,
+    Bottle,
+    Collection,
+    DynamicCrate,
+    SimpleCrate,
+)
+from milky.limiter import priority, Priority
+from milky.table import Column, Table
 
 if TYPE_CHECKING:
-    from collections.abc import Iterator
+    from collections.abc import AsyncIterator, Iterator
 
+    from milky.datatypes import Crate
+    from milky.root import Milky
     from milky.transport import ParamType
 
 
@@ -26,6 +42,8 @@ class Settings(DynamicCrate):
 
 
 class List(SimpleCrate):
+    identity_attr = 'id'
+
     name = rtmtypes.Str().setter('rtm.lists.setName')
     id = rtmtypes.Int()
     deleted = rtmtypes.Bool()
@@ -42,18 +60,44 @@ class List(SimpleCrate):
     def identity(self) -> dict[str, ParamType]:
         return {'list_id': self.id}
 
+    @property
+    def tasks(self) -> list[Task]:
+        """The tasks in this list.
+
+        For smart lists, the filter is evaluated locally against the tasks
+        in `Milky.tasks`, rather than asking RTM for the contents.
+        """
+        return self.milky.tasks.in_list(self)
+
+
+LIST_COLUMNS = (
+    Column.of('id', List.id, 'int64'),
+    Column.of('name', List.name, object),
+    Column.of('position', List.position, 'int64'),
+    Column.of('deleted', List.deleted, 'bool'),
+    Column.of('locked', List.locked, 'bool'),
+    Column.of('archived', List.archived, 'bool'),
+    Column.of('smart', List.smart, 'bool'),
+)
+
 
 class Lists(DynamicCrate):
     def _load_content(self) -> Bottle:
         return self('rtm.lists.getList')
 
     def create(self, name: str, query: str | None = None) -> List:
-        kwargs = {'name': name}
+        kwargs: dict[str, Any] = {'name': name}
         if query:
             kwargs['filter'] = query
-        bottle = self('rtm.lists.add', Action.WRITE, **kwargs)
-        result = List(self.milky, bottle)
-        self._lists.append(result)
+        # The new list is added to the lists we have, rather than making
+        # them stale.
+        with priority(Priority.INTERACTIVE):
+            bottle = self.milky.invoke(
+                'rtm.lists.add', timeline=True, invalidate=False, **kwargs
+            )
+        result = List.load(self.milky, bottle)
+        with self._lock:
+            self._lists.append(result)
         return result
 
     def get(self, name: str) -> List | None:
@@ -67,9 +111,257 @@ class Lists(DynamicCrate):
             raise KeyError(name)
         return rlist
 
+    def _build(self) -> Iterator[List]:
+        elements = self.bottle.element.iterfind('list')
+        return (List.load(self.milky, ls) for ls in elements)
+
     @cache_controlled(None)
     def _lists(self) -> list[List]:
-        return [List(self.milky, ls) for ls in self.bottle.all('list')]
+        return list(self._build())
+
+    def _dump(self) -> ET.Element | None:
+        if self._bottle is None or '_lists' not in self.__dict__:
+            return super()._dump()
+
+        # Include lists which have been created or updated since loading.
+        element = ET.Element(self._bottle.tag, self._bottle.element.attrib)
+        element.extend(ls.bottle.element for ls in self._lists)
+        return element
 
     def __iter__(self) -> Iterator[List]:
-        return iter(self._lists)
+        # Iterate over a copy, as lists may be created while iterating.
+        with self._lock:
+            return iter(list(self._lists))
+
+    def __aiter__(self) -> AsyncIterator[List]:
+        return aiterate(self, '_lists', self._build)
+
+    def table(self) -> Table:
+        """Return a columnar table of the lists (requires numpy)."""
+        return Table.build(self._lists, LIST_COLUMNS)
+
+
+def _split_tasks(element: ET.Element) -> Iterator[ET.Element]:
+    # RTM groups tasks by list and then by task series - we create an element
+    # for each task, which is the task series with only that task in it and
+    # the list ID added as an attribute.
+    for lst in element.iter('list'):
+        for series in lst.findall('taskseries'):
+            attrs = {**series.attrib, 'list_id': lst.attrib['id']}
+            kids = [kid for kid in series if kid.tag != 'task']
+            for task in series.findall('task'):
+                result = ET.Element('taskseries', attrs)
+                result.extend(kids)
+                result.append(task)
+                yield result
+
+
+def _deleted_tasks(element: ET.Element) -> Iterator[ET.Element]:
+    # Tasks deleted since the "last_sync" time are listed separately, with
+    # only their IDs and when they were deleted.
+    return element.iterfind('.//list/deleted/taskseries/task')
+
+
+class Note(SimpleCrate):
+    id = rtmtypes.Int()
+    title = rtmtypes.Str()
+    created = rtmtypes.DateTime()
+    modified = rtmtypes.DateTime()
+
+    @property
+    def body(self) -> str:
+        return self.bottle.text
+
+
+class Participant(SimpleCrate):
+    id = rtmtypes.Int()
+    fullname = rtmtypes.Str()
+    username = rtmtypes.Str()
+
+
+def _text(element: ET.Element) -> str:
+    return element.text or ''
+
+
+class Task(SimpleCrate):
+    identity_attr = 'task/id'
+    derived = ('notes', 'participants', 'tags')
+
+    id = rtmtypes.Int('task/id')
+    series_id = rtmtypes.Int('id')
+    list_id = rtmtypes.Int()
+    name = rtmtypes.Str().setter('rtm.tasks.setName')
+    url = rtmtypes.OptionalStr().getter(default=None)
+    priority = rtmtypes.Priority('task/priority')
+    due = rtmtypes.OptionalDateTime('task/due')
+    has_due_time = rtmtypes.Bool('task/has_due_time')
+    added = rtmtypes.DateTime('task/added')
+    completed = rtmtypes.OptionalDateTime('task/completed')
+    deleted = rtmtypes.OptionalDateTime('task/deleted')
+    postponed = rtmtypes.Int('task/postponed')
+    estimate = rtmtypes.OptionalStr('task/estimate')
+
+    def _wrap(self, bottle: ET.Element | Bottle) -> Bottle:
+        # Updates return the list that the task is in, so we need to find
+        # the task inside it.
+        element = bottle.element if isinstance(bottle, Bottle) else bottle
+        if element.tag == 'list':
+            task_id = str(self.id)
+            for result in _split_tasks(element):
+                if result.find('task').get('id') == task_id:  # type: ignore[union-attr]
+                    element = result
+                    break
+            else:
+                raise ValueError(f'task {task_id} not in response')
+        return super()._wrap(element)
+
+    @cache_controlled(None)
+    def tags(self) -> Collection[str]:
+        return Collection(self.bottle, 'tags/tag', _text)
+
+    @cache_controlled(None)
+    def notes(self) -> Collection[Note]:
+        return Collection(
+            self.bottle,
+            'notes/note',
+            functools.partial(Note, self.milky),
+        )
+
+    @cache_controlled(None)
+    def participants(self) -> Collection[Participant]:
+        return Collection(
+            self.bottle,
+            'participants/contact',
+            functools.partial(Participant, self.milky),
+        )
+
+    @property
+    def identity(self) -> dict[str, ParamType]:
+        return {
+            'list_id': self.list_id,
+            'taskseries_id': self.series_id,
+            'task_id': self.id,
+        }
+
+
+TASK_COLUMNS = (
+    Column.of('id', Task.id, 'int64'),
+    Column.of('series_id', Task.series_id, 'int64'),
+    Column.of('list_id', Task.list_id, 'int64'),
+    Column.of('name', Task.name, object),
+    # Tasks without a priority sort after those with one.
+    Column.of('priority', Task.priority, 'int8', missing=4),
+    Column.timestamp('due', Task.due),
+    Column.timestamp('added', Task.added),
+    Column.timestamp('completed', Task.completed),
+)
+
+
+class Tasks(DynamicCrate):
+    def __init__(self, milky: Milky, **params: ParamType) -> None:
+        """
+        Construct a Tasks object.
+
+        Args:
+            milky: Milky object that the object should be attached to.
+            **params: Parameters to pass to "rtm.tasks.getList", to restrict
+                      which tasks are loaded (e.g. "list_id" or "filter").
+        """
+        super().__init__(milky)
+        self.params = params
+
+    def _load_content(self) -> Bottle:
+        return self('rtm.tasks.getList', **self.params)
+
+    @staticmethod
+    def split(element: ET.Element) -> Iterator[ET.Element]:
+        """Return an element for each task in the content of "rtm.tasks.getList".
+
+        Each is the task series with only that task in it, and the ID of its
+        list added as the "list_id" attribute.
+        """
+        return _split_tasks(element)
+
+    def _build(self) -> Iterator[Task]:
+        return (Task.load(self.milky, el) for el in _split_tasks(self.bottle.element))
+
+    @cache_controlled(None)
+    def _tasks(self) -> list[Task]:
+        return list(self._build())
+
+    def __iter__(self) -> Iterator[Task]:
+        return iter(self._tasks)
+
+    def __aiter__(self) -> AsyncIterator[Task]:
+        return aiterate(self, '_tasks', self._build)
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    @property
+    def deleted(self) -> list[int]:
+        """IDs of the tasks deleted since the "last_sync" time, if one was
+        given."""
+        return [int(el.attrib['id']) for el in self.deleted_elements()]
+
+    def deleted_elements(self) -> Iterator[ET.Element]:
+        """Return the elements of the tasks deleted since the "last_sync"
+        time, which only give their IDs and when they were deleted."""
+        return _deleted_tasks(self.bottle.element)
+
+    def table(self) -> Table:
+        """Return a columnar table of the tasks (requires numpy)."""
+        return Table.build(self._tasks, TASK_COLUMNS)
+
+    @cache_controlled(None)
+    def _by_list(self) -> dict[int, list[Task]]:
+        return {}
+
+    def in_list(self, rlist: List) -> list[Task]:
+        """Return the tasks in a list.
+
+        Results are kept for each list, if the "tasks.<list ID>" cache location
+        is switched on.
+        """
+        if (result := self._by_list.get(rlist.id)) is None:
+            if rlist.smart:
+                result = self.search(rlist.query or '')
+            else:
+                result = [task for task in self if task.list_id == rlist.id]
+            if self.milky.cache[f'tasks.{rlist.id}']:
+                self._by_list[rlist.id] = result
+        return list(result)
+
+    @cache_controlled(None)
+    def index(self) -> search.TaskIndex:
+        names = {ls.id: ls.name for ls in self.milky.lists}
+        index = search.TaskIndex(self._tasks, names, self.milky.tzinfo)
+        self._watch()
+        return index
+
+    def _watch(self) -> None:
+        # Keeps the index and the results of `in_list` up to date as tasks
+        # change - such as through their setters - for as long as this
+        # object is in use.
+        ref = weakref.ref(self)
+
+        def changed(crate: Crate) -> None:
+            if (tasks := ref()) is None:
+                unsubscribe()
+            elif isinstance(crate, Task):
+                tasks._task_changed(crate)  # noqa: SLF001
+
+        unsubscribe = self.milky.subscribe(changed)
+
+    def _task_changed(self, task: Task) -> None:
+        if (index := self.__dict__.get('index')) is not None:
+            index.update(task)
+        if (by_list := self.__dict__.get('_by_list')) is not None:
+            by_list.clear()
+
+    def search(self, query: str) -> list[Task]:
+        """Return the tasks which match a search filter, without calling RTM.
+
+        See `milky.search` for the filters which are supported.
+        """
+        return self.index.search(query)
@@ -0,0 +1,119 @@
+"""Decoding of large responses from Remember The Milk in other processes."""
+
+from __future__ import annotations
+
+import concurrent.futures
+import threading
+
+from typing import Any, TYPE_CHECKING, TypeVar
+
+from xml.etree import ElementTree as ET  # noqa: RUF100, DUO107, S405
+
+from milky import forking
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+T = TypeVar('T')
+
+
+def decode(
+    content: bytes, decoder: Callable[[ET.Element], T]
+) -> tuple[T | None, ET.Element | None]:
+    """Parse the content of a response, and decode it into records with the
+    function given.
+
+    Returns:
+      The records, and None - or if RTM reported an error, None and the
+      response, which is small enough to send back as it is.
+    """
+    root = ET.fromstring(content)  # noqa: S314
+    if root.get('stat') == 'fail':
+        return None, root
+    return decoder(root), None
+
+
+class PoolParser:
+    """Decodes responses from Remember The Milk, using a process pool for
+    large ones.
+
+    Parsing a large response (such as every task in an account) is CPU bound,
+    and holds the GIL while doing so. Handing the raw response to another
+    process lets several large responses - such as those fetched by `export`
+    - be parsed in parallel on different cores, while other threads carry on.
+
+    Workers don't send back XML elements, as unpickling those takes several
+    times longer than parsing the response would. Instead, they decode the
+    response into compact records (such as a tuple or dictionary of the
+    values of each task), which are cheap to send back. Responses smaller
+    than the threshold are decoded in-process, as the cost of transferring
+    them would outweigh the benefit.
+
+    A PoolParser can be given to a Transport object, which uses it for
+    `Transport.invoke_records`, and can be shared between Transport objects.
+    """
+
+    def __init__(
+        self,
+        threshold: int = 1 << 20,
+        executor: concurrent.futures.Executor | None = None,
+        max_workers: int | None = None,
+    ) -> None:
+        """Create a PoolParser object.
+
+        Args:
+          threshold: The size of response (in bytes) at which responses will
+                     be decoded in another process.
+          executor: The executor to decode responses with, otherwise a
+                    process pool will be created when it is first needed.
+          max_workers: The number of processes to create in the pool, if one
+                       is created.
+        """
+        self.threshold = threshold
+        self.max_workers = max_workers
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._lock = threading.Lock()
+
+        forking.track(self)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        if self._owns_executor:
+            # The pool's processes belong to the parent.
+            self._executor = None
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Executors can't be sent to another process.
+        return {'threshold': self.threshold, 'max_workers': self.max_workers}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(**state)  # type: ignore[misc]
+
+    @property
+    def executor(self) -> concurrent.futures.Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    self.max_workers
+                )
+            return self._executor
+
+    def __call__(
+        self, content: bytes, decoder: Callable[[ET.Element], T]
+    ) -> tuple[T | None, ET.Element | None]:
+        """Parse and decode the content of a response, as `decode` does.
+
+        The decoder must be defined at the top level of a module, so it can
+        be sent to another process.
+        """
+        if len(content) < self.threshold:
+            return decode(content, decoder)
+        return self.executor.submit(decode, content, decoder).result()
+
+    def shutdown(self) -> None:
+        """Shut down the process pool, if one was created by this object."""
+        with self._lock:
+            if self._owns_executor and self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
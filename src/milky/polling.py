@@ -0,0 +1,263 @@
+"""Polling of accounts for changes, at a rate adapted to each account."""
+
+from __future__ import annotations
+
+import datetime
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from milky.cache import invalidate
+from milky.limiter import priority, Priority
+from milky.models import Task, Tasks
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from milky.root import Milky
+
+_log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Change:
+    """Describes changes found when polling an account."""
+
+    milky: Milky
+
+    #: The tasks which have changed since the previous poll.
+    tasks: Tasks
+
+    #: The time the changes were looked for from.
+    since: str
+
+    #: IDs of the tasks which have been deleted since the previous poll.
+    deleted: tuple[int, ...] = ()
+
+
+@dataclass
+class _Account:
+    milky: Milky
+    interval: float
+    last_sync: str | None = None
+
+
+@dataclass(order=True)
+class _Entry:
+    due: float
+    seq: int
+    account: _Account = field(compare=False)
+
+
+def _now_iso() -> str:
+    now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    return now.isoformat().replace('+00:00', 'Z')
+
+
+class Poller:
+    """Polls accounts for changed tasks, and tells subscribers about them.
+
+    Each account is polled with the "last_sync" parameter, so Remember The Milk
+    only returns tasks which have changed since the previous poll. The interval
+    between polls is halved for an account each time changes are found, and
+    grows by half each time they aren't, within the given bounds - so idle
+    accounts use little of the rate budget, and busy ones are noticed quickly.
+    Every interval is jittered, so accounts added together drift apart.
+
+    Polls are made through each account's Transport with background priority,
+    so they wait for any limiter it has; accounts which fall due together are
+    spread out by the limiter rather than sent in a burst, and interactive
+    calls go ahead of them.
+
+    Tasks which have been deleted are marked as deleted if they are in use,
+    so anything watching them (such as a DueIndex) drops them, and are no
+    longer reused when tasks are loaded.
+
+    An error polling one account, or raised by a subscriber, doesn't stop the
+    other accounts from being polled - it is passed to the error callback if
+    one was given, and logged otherwise.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        min_interval: float = 30.0,
+        max_interval: float = 900.0,
+        jitter: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+        rand: Callable[[], float] = random.random,
+        now: Callable[[], str] = _now_iso,
+        on_error: Callable[[Milky, Exception], None] | None = None,
+    ) -> None:
+        """Create a Poller object.
+
+        Args:
+          min_interval: The shortest time between polls of an account.
+          max_interval: The longest time between polls of an account.
+          jitter: The fraction by which each interval is randomly varied.
+          clock: Function which returns the current time in seconds.
+          rand: Function which returns a random number from 0 to 1.
+          now: Function which returns the current time in ISO 8601 format,
+               for use as "last_sync".
+          on_error: Function called with the account and the exception raised
+                    when a poll or a subscriber fails.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.clock = clock
+        self.rand = rand
+        self.now = now
+        self.on_error = on_error
+
+        self._lock = threading.Lock()
+        self._accounts: dict[int, _Account] = {}
+        self._queue: list[_Entry] = []
+        self._seq = itertools.count()
+        self._subscribers: list[Callable[[Change], None]] = []
+
+    def _jittered(self, interval: float) -> float:
+        return interval * (1 + self.jitter * (2 * self.rand() - 1))
+
+    def _schedule(self, account: _Account) -> None:
+        due = self.clock() + self._jittered(account.interval)
+        heapq.heappush(self._queue, _Entry(due, next(self._seq), account))
+
+    def add(self, milky: Milky) -> None:
+        """Start polling an account - the first poll is made straight away."""
+        with self._lock:
+            if id(milky) in self._accounts:
+                return
+            account = self._accounts[id(milky)] = _Account(milky, self.min_interval)
+            heapq.heappush(self._queue, _Entry(self.clock(), next(self._seq), account))
+
+    def remove(self, milky: Milky) -> None:
+        """Stop polling an account."""
+        with self._lock:
+            self._accounts.pop(id(milky), None)
+
+    def interval(self, milky: Milky) -> float:
+        """Return the current interval between polls of an account."""
+        return self._accounts[id(milky)].interval
+
+    def subscribe(self, callback: Callable[[Change], None]) -> Callable[[], None]:
+        """Call the function with each change found.
+
+        Returns:
+          A function which unsubscribes the callback.
+        """
+        self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback)
+
+    def poll(self, milky: Milky) -> Change | None:
+        """Poll an account now, outside of its schedule.
+
+        The first poll of an account only records the time of the poll.
+
+        Returns:
+          The changes found, if any.
+
+        Raises:
+          Exception: the error raised polling the account - errors raised by
+                     subscribers are reported instead.
+        """
+        with self._lock:
+            account = self._accounts[id(milky)]
+        return self._poll(account)
+
+    def _poll(self, account: _Account) -> Change | None:
+        since, synced = account.last_sync, self.now()
+        change = None
+        if since is not None:
+            tasks = Tasks(account.milky, last_sync=since)
+            with priority(Priority.BACKGROUND):
+                changed = bool(len(tasks))
+            deleted = tuple(self._forget_deleted(account.milky, tasks, synced))
+            if changed or deleted:
+                account.interval = max(self.min_interval, account.interval / 2)
+                # Anything already loaded is now out of date.
+                invalidate(account.milky, 'tasks')
+                change = Change(account.milky, tasks, since, deleted)
+            else:
+                account.interval = min(self.max_interval, account.interval * 1.5)
+
+        # Only move on once the poll has succeeded, so no changes are missed.
+        account.last_sync = synced
+        if change:
+            for callback in list(self._subscribers):
+                try:
+                    callback(change)
+                except Exception as e:  # noqa: BLE001, PERF203
+                    self._report(account.milky, e)
+        return change
+
+    @staticmethod
+    def _forget_deleted(milky: Milky, tasks: Tasks, synced: str) -> list[int]:
+        deleted = []
+        for element in tasks.deleted_elements():
+            deleted.append(int(element.attrib['id']))
+            if (task := Task.discard(milky, element.attrib['id'])) is not None:
+                when = element.get('deleted') or synced
+                task.bottle = task.bottle.replace('task/deleted', when)
+        return deleted
+
+    def _report(self, milky: Milky, exc: Exception) -> None:
+        if self.on_error:
+            self.on_error(milky, exc)
+        else:
+            _log.error('error polling account', exc_info=exc)
+
+    def next_due(self) -> float | None:
+        """Return the time that the next poll is due, if any."""
+        with self._lock:
+            self._discard_removed()
+            return self._queue[0].due if self._queue else None
+
+    def _discard_removed(self) -> None:
+        # Drop entries for accounts which are no longer being polled.
+        while self._queue:
+            account = self._queue[0].account
+            if self._accounts.get(id(account.milky)) is account:
+                break
+            heapq.heappop(self._queue)
+
+    def run_pending(self) -> list[Change]:
+        """Poll every account which is due.
+
+        Errors raised polling an account are reported, and the account is
+        polled again from the same point when it is next due.
+
+        Returns:
+          The changes found.
+        """
+        changes = []
+        while True:
+            with self._lock:
+                self._discard_removed()
+                if not self._queue or self._queue[0].due > self.clock():
+                    break
+                account = heapq.heappop(self._queue).account
+            try:
+                if change := self._poll(account):
+                    changes.append(change)
+            except Exception as e:  # noqa: BLE001
+                self._report(account.milky, e)
+            finally:
+                with self._lock:
+                    if self._accounts.get(id(account.milky)) is account:
+                        self._schedule(account)
+        return changes
+
+    def run(self, stop: threading.Event) -> None:
+        """Poll accounts as they become due, until the event is set."""
+        while not stop.is_set():
+            self.run_pending()
+            due = self.next_due()
+            wait = self.max_interval if due is None else max(0, due - self.clock())
+            # Check at least every second, to pick up newly added accounts.
+            stop.wait(min(wait, 1.0))
@@ -0,0 +1,176 @@
+"""Management of Milky objects for many users of the same API key."""
+
+from __future__ import annotations
+
+import collections
+import threading
+import time
+
+from typing import TYPE_CHECKING
+
+from milky import forking
+from milky.breaker import CircuitBreaker
+from milky.limiter import RateLimiter
+from milky.root import Milky
+from milky.transport import _default_client, Transport
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+    from milky.quota import Quota
+    from milky.transport import Client
+
+
+class Pool:
+    """Creates and holds a Milky object for each token of a single API key.
+
+    All Milky objects created by the pool share a single HTTP client, a single
+    CircuitBreaker and a single RateLimiter, so that the combined rate of calls
+    stays within what Remember The Milk permits for the API key. The limiter
+    serves each token in turn, so one busy account can't starve the others.
+
+    To bound memory use, the pool will only keep cached content (such as
+    `Milky.lists` and `Milky.settings`) for a limited number of recently used
+    accounts - the caches of the least recently used accounts are dropped
+    when that limit is exceeded. The limit is only enforced when an account is
+    fetched with `get`, so content loaded by Milky objects after that can take
+    the pool over the limit until the next `get` (or `evict_idle`).
+    """
+
+    #: Cached attributes on Milky objects which are dropped on eviction.
+    EVICTABLE = ('lists', 'settings')
+
+    def __init__(  # noqa: PLR0913
+        self,
+        api_key: str,
+        secret: str,
+        client: Client | None = None,
+        limiter: RateLimiter | None = None,
+        breaker: CircuitBreaker | None = None,
+        quota: Quota | None = None,
+        max_warm: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create a Pool object.
+
+        Args:
+          api_key: A string containing the API key.
+          secret: A string containing the shared secret.
+          client: A httpx.Client or [requests.Session][] object to share,
+                  otherwise one will be automatically created.
+          limiter: A RateLimiter object to share, otherwise one will be
+                   created with the default limits.
+          breaker: A CircuitBreaker object to share, otherwise one will be
+                   created with the default settings.
+          quota: A Quota object to share, if calls should be accounted for.
+          max_warm: The maximum number of accounts which can keep cached
+                    content (enforced by each call to `get`), or None for no
+                    limit.
+          clock: Function which returns the current time in seconds.
+        """
+        self.api_key = api_key
+        self.secret = secret
+        self.client = client or _default_client()
+        self._owns_client = client is None
+        self.limiter = limiter or RateLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.quota = quota
+        self.max_warm = max_warm
+        self.clock = clock
+
+        self._lock = threading.Lock()
+
+        # Ordered from least to most recently used.
+        self._milkies: collections.OrderedDict[str, Milky] = collections.OrderedDict()
+        self._last_used: dict[str, float] = {}
+
+        forking.track(self)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        if self._owns_client:
+            # The parent still owns the connections, so the accounts in this
+            # process share a new client instead.
+            self.client = _default_client()
+            for milky in self._milkies.values():
+                milky.transport.client = self.client
+
+    def get(self, token: str) -> Milky:
+        """Return the Milky object for the token, creating it if needed.
+
+        This marks the account as being recently used.
+        """
+        with self._lock:
+            if (milky := self._milkies.get(token)) is None:
+                transport = Transport(
+                    self.api_key,
+                    self.secret,
+                    token,
+                    client=self.client,
+                    limiter=self.limiter,
+                    breaker=self.breaker,
+                    quota=self.quota,
+                )
+                milky = self._milkies[token] = Milky(transport)
+            else:
+                self._milkies.move_to_end(token)
+            self._last_used[token] = self.clock()
+            self._trim()
+        return milky
+
+    __getitem__ = get
+
+    def discard(self, token: str) -> None:
+        """Remove the Milky object for the token from the pool, if present."""
+        with self._lock:
+            self._milkies.pop(token, None)
+            self._last_used.pop(token, None)
+
+    def __contains__(self, token: object) -> bool:
+        return token in self._milkies
+
+    def __len__(self) -> int:
+        return len(self._milkies)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._milkies))
+
+    @classmethod
+    def is_warm(cls, milky: Milky) -> bool:
+        """Indicates if the Milky object holds any evictable cached content."""
+        return any(name in milky.__dict__ for name in cls.EVICTABLE)
+
+    @classmethod
+    def evict(cls, milky: Milky) -> None:
+        """Drop the evictable cached content held by a Milky object."""
+        for name in cls.EVICTABLE:
+            delattr(milky, name)
+
+    def evict_idle(self, idle_for: float) -> int:
+        """Drop cached content of accounts not used for the given time.
+
+        Returns:
+          The number of accounts which had content dropped.
+        """
+        cutoff = self.clock() - idle_for
+        count = 0
+        with self._lock:
+            for token, milky in self._milkies.items():
+                if self._last_used[token] <= cutoff and self.is_warm(milky):
+                    self.evict(milky)
+                    count += 1
+        return count
+
+    def _trim(self) -> None:
+        if self.max_warm is None:
+            return
+
+        # Walk from the most recently used account backwards - that one
+        # always gets a slot, since it's about to be used.
+        warm = 0
+        for idx, milky in enumerate(reversed(self._milkies.values())):
+            if idx and not self.is_warm(milky):
+                continue
+            warm += 1
+            if warm > self.max_warm:
+                self.evict(milky)
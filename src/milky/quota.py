@@ -0,0 +1,297 @@
+"""Accounting of calls made to Remember The Milk, and budgets for them."""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import contextvars
+import enum
+import threading
+import time
+
+from dataclasses import dataclass
+from typing import Any, TYPE_CHECKING
+
+from milky import forking
+from milky.backend import fingerprint
+from milky.limiter import current_priority, Priority
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator, Sequence
+
+
+class QuotaExceededError(RuntimeError):
+    """Raised instead of making a call which would exceed a hard budget."""
+
+
+class Window(enum.Enum):
+    """Periods over which calls are counted, with their length in seconds."""
+
+    SECOND = 1
+    MINUTE = 60
+    DAY = 86400
+
+
+# Each window is split into this many buckets, so counts roll over in steps
+# of a sixtieth of the window.
+_BUCKETS = 60
+
+# Calls are counted by RTM method name, token fingerprint and tag.
+_Key = tuple[str, str, str | None]
+
+_tag: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    'milky_tag', default=None
+)
+
+
+def current_tag() -> str | None:
+    """Return the tag that calls are currently accounted under."""
+    return _tag.get()
+
+
+@contextlib.contextmanager
+def tag(name: str) -> Iterator[None]:
+    """Context in which calls are accounted under the given tag."""
+    token = _tag.set(name)
+    try:
+        yield
+    finally:
+        _tag.reset(token)
+
+
+@dataclass(frozen=True)
+class Budget:
+    """Limit on the number of calls made within a window.
+
+    Budgets only apply to calls made with the given priority or lower, so
+    there is always room left for more important calls.
+    """
+
+    window: Window
+
+    #: Number of calls after which further calls are delayed until the
+    #: count has dropped below it again.
+    soft: int | None = None
+
+    #: Number of calls after which further calls are rejected.
+    hard: int | None = None
+
+    #: Whether the budget applies to each token separately, rather than to
+    #: all calls together.
+    per_token: bool = False
+
+    priority: Priority = Priority.BACKGROUND
+
+
+class _Counts:
+    # Rolling counts of calls within a window.
+
+    def __init__(self, window: Window) -> None:
+        self.resolution = window.value / _BUCKETS
+        self.buckets: collections.deque[tuple[int, collections.Counter[_Key]]] = (
+            collections.deque()
+        )
+
+    def _trim(self, now: float) -> None:
+        oldest = int(now // self.resolution) - _BUCKETS + 1
+        while self.buckets and self.buckets[0][0] < oldest:
+            self.buckets.popleft()
+
+    def add(self, now: float, key: _Key) -> None:
+        self._trim(now)
+        index = int(now // self.resolution)
+        if not self.buckets or self.buckets[-1][0] != index:
+            self.buckets.append((index, collections.Counter()))
+        self.buckets[-1][1][key] += 1
+
+    def total(self, now: float) -> collections.Counter[_Key]:
+        self._trim(now)
+        result: collections.Counter[_Key] = collections.Counter()
+        for _, counts in self.buckets:
+            result.update(counts)
+        return result
+
+    def remove(self, when: float, key: _Key) -> None:
+        # Takes back a call counted at the given time, if it is still counted.
+        index = int(when // self.resolution)
+        for bucket, counts in self.buckets:
+            if bucket == index and counts[key] > 0:
+                counts[key] -= 1
+                return
+
+    def count(self, now: float, token: str, per_token: bool) -> int:
+        return sum(
+            n
+            for key, n in self.total(now).items()
+            if not per_token or key[1] == token
+        )
+
+    def expiry(self, now: float) -> float:
+        # Seconds until the oldest calls drop out of the window.
+        if not self.buckets:
+            return 0.0
+        return max(0.0, (self.buckets[0][0] + _BUCKETS) * self.resolution - now)
+
+
+@dataclass(frozen=True)
+class Reservation:
+    """A call which has been admitted and counted by a Quota."""
+
+    key: _Key
+    when: float
+
+    #: Number of seconds spent waiting for the call to be admitted.
+    waited: float
+
+
+class Quota:
+    """Counts the calls made to Remember The Milk, and enforces budgets on them.
+
+    Calls are counted over rolling windows of a second, a minute and a day,
+    broken down by RTM method name, token and tag (see `tag`). Tokens are
+    only kept as a fingerprint (see `milky.backend.fingerprint`). Budgets can be
+    set to keep background work away from the limits enforced by Remember The
+    Milk: once a soft budget is used up, calls it applies to wait until the
+    count has dropped below it again, and once a hard budget is used up, they
+    fail with QuotaExceededError.
+
+    Values which Milky objects reuse from their caches, instead of calling
+    Remember The Milk, are also counted (see `hits`).
+
+    A single quota can be shared by any number of Transport objects which use
+    the same API key.
+    """
+
+    def __init__(
+        self,
+        budgets: Sequence[Budget] = (),
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        """Create a Quota object.
+
+        Args:
+          budgets: Budgets to enforce on calls.
+          clock: Function which returns the current time in seconds.
+          sleep: Function which waits for the given number of seconds.
+        """
+        self.budgets = list(budgets)
+        self.clock = clock
+        self.sleep = sleep
+
+        self._lock = threading.Lock()
+        self._counts = {window: _Counts(window) for window in Window}
+        self._hits: collections.Counter[str] = collections.Counter()
+
+        forking.track(self)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Only the configuration is kept - the counts belong to this process.
+        return {'budgets': self.budgets, 'clock': self.clock, 'sleep': self.sleep}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(**state)  # type: ignore[misc]
+
+    def admit(
+        self, method: str, token: str | None, priority: Priority | None = None
+    ) -> Reservation:
+        """Wait until a call is within every budget which applies to it, and
+        count it.
+
+        The call is counted as it is admitted, so that calls made at the same
+        time can't all be admitted into the last of a budget. If the call then
+        isn't made, it should be taken back with `release`.
+
+        Args:
+          method: The name of the RTM method to be invoked.
+          token: The token the call is to be made with.
+          priority: The priority of the call, otherwise the priority of the
+                    current context.
+
+        Returns:
+          The reservation of the call.
+
+        Raises:
+          QuotaExceededError: if the call would exceed a hard budget.
+        """
+        level = current_priority() if priority is None else priority
+        budgets = [b for b in self.budgets if level >= b.priority]
+        key = (method, fingerprint(token).hex(), current_tag())
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self.clock()
+                if not (delay := self._delay(key, budgets, now)):
+                    for counts in self._counts.values():
+                        counts.add(now, key)
+                    return Reservation(key, now, waited)
+            self.sleep(delay)
+            waited += delay
+
+    def _delay(self, key: _Key, budgets: list[Budget], now: float) -> float:
+        delay = 0.0
+        for budget in budgets:
+            counts = self._counts[budget.window]
+            used = counts.count(now, key[1], budget.per_token)
+            if budget.hard is not None and used >= budget.hard:
+                msg = f'{key[0]} would exceed the budget of {budget.hard} calls'
+                msg += f' per {budget.window.name.lower()}'
+                raise QuotaExceededError(msg)
+            if budget.soft is not None and used >= budget.soft:
+                # Wait for at least one bucket to drop out, then check again.
+                delay = max(delay, counts.expiry(now) or counts.resolution)
+        return delay
+
+    def release(self, reservation: Reservation) -> None:
+        """Stop counting a call which was admitted, but wasn't made."""
+        with self._lock:
+            for counts in self._counts.values():
+                counts.remove(reservation.when, reservation.key)
+
+    def hit(self, name: str) -> None:
+        """Count a cached value being used instead of calling RTM."""
+        with self._lock:
+            self._hits[name] += 1
+
+    @property
+    def hits(self) -> dict[str, int]:
+        """Number of times cached values were reused, by attribute name."""
+        with self._lock:
+            return dict(self._hits)
+
+    def usage(self, window: Window, by: str = 'method') -> dict[str | None, int]:
+        """Return the number of calls made within the window.
+
+        Args:
+          window: The window to count calls over.
+          by: What to break the counts down by - "method", "token" (given by
+              the hex digits of its fingerprint) or "tag".
+        """
+        index = ('method', 'token', 'tag').index(by)
+        with self._lock:
+            total = self._counts[window].total(self.clock())
+        result: collections.Counter[str | None] = collections.Counter()
+        for key, n in total.items():
+            result[key[index]] += n
+        return dict(result)
+
+    def count(
+        self,
+        window: Window,
+        method: str | None = None,
+        token: str | None = None,
+        tag: str | None = None,
+    ) -> int:
+        """Return the number of calls made within the window, only counting
+        calls which match each of the method, token and tag given."""
+        with self._lock:
+            total = self._counts[window].total(self.clock())
+        wanted = (method, token and fingerprint(token).hex(), tag)
+        return sum(
+            n
+            for key, n in total.items()
+            if all(w is None or k == w for (k, w) in zip(key, wanted, strict=True))
+        )
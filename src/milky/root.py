@@ -1,36 +1,301 @@
 from __future__ import annotations
 
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import time
 import typing
+import weakref
 
-from . import models
+from . import backend, models, rtmtypes, snapshot, writes
 
-from .cache import Cache, cache_controlled
-from .datatypes import Bottle
+from .cache import Cache, cache_controlled, invalidate, unshare
+from .datatypes import Bottle, DynamicCrate
 
 if typing.TYPE_CHECKING:
+    import datetime
+    import threading
+
+    import os
+
+    from collections.abc import Iterable, Iterator, Mapping
     from xml.etree import ElementTree as ET
 
-    from .transport import Transport
+    from .backend import CacheBackend
+    from .datatypes import Crate
+    from .transport import ParamType, Transport
+    from .writes import Writer
 
 
 class Milky:
+
+    #: Cache locations which may be made stale by methods which write to RTM,
+    #: keyed by the prefix of the method name.
+    INVALIDATES: typing.ClassVar[dict[str, tuple[str, ...]]] = {
+        'rtm.lists.': ('lists',),
+        'rtm.settings.': ('settings',),
+        'rtm.tasks.': ('tasks',),
+    }
+
     def __init__(self, transport: Transport):
         self.transport = transport
         self.cache = Cache()
 
+        # Crate objects in use, so that reloaded content can reuse them.
+        self.crates: weakref.WeakValueDictionary[
+            tuple[type, str], Crate
+        ] = weakref.WeakValueDictionary()
+
+        # If set, changes to objects are made through this.
+        self.writer: Writer | None = None
+
+        # If set, cached content is shared with other processes through this.
+        self.backend: CacheBackend | None = None
+
+        # If set, content which has been invalidated is still used (and marked
+        # as stale) if new content can't be loaded while the circuit breaker
+        # is open.
+        self.serve_stale = False
+
+        # Names of cached attributes which were restored from a snapshot.
+        self._restored: set[str] = set()
+
+        # Functions called with each object whose content changes.
+        self._subscribers: list[typing.Callable[[Crate], None]] = []
+
+        # The timezone of the account, once it has been looked up.
+        self._tzinfo: datetime.tzinfo | None = None
+
+    def __getstate__(self) -> dict[str, typing.Any]:
+        # The writer and backend hold threads and connections which belong
+        # to this process.
+        state = self.__dict__.copy()
+        del state['crates']
+        state['writer'] = state['backend'] = None
+        state['_subscribers'] = []
+        return state
+
+    def __setstate__(self, state: dict[str, typing.Any]) -> None:
+        self.__dict__.update(state)
+        self.crates = weakref.WeakValueDictionary()
+
     def invoke(
         self,
         method: str,
         /,
         timeline: bool | str = False,
         unwrap: bool = True,
+        invalidate: bool | None = None,
         **kwargs: str | int | bool,
     ) -> Bottle:
         if timeline:
             kwargs['timeline'] = self.timeline if timeline is True else timeline
         res = self.transport.invoke(method, **kwargs)
+        # Unless told otherwise, calls made with a timeline are writes.
+        if invalidate or (invalidate is None and timeline):
+            self.invalidate(method)
+        elif timeline:
+            # Content changed in place is still out of date in other processes.
+            self.unshare(method)
         return Bottle(self._unwrap_response(res) if unwrap else res)
 
+    def subscribe(
+        self, callback: typing.Callable[[Crate], None]
+    ) -> typing.Callable[[], None]:
+        """Call the function with each object whose content changes - when it
+        is created, updated, or reloaded.
+
+        Returns:
+          A function which unsubscribes the callback.
+        """
+        self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback)
+
+    def _changed(self, crate: Crate) -> None:
+        # The timezone is looked up again once the settings are reloaded.
+        if isinstance(crate, models.Settings):
+            self._tzinfo = None
+        # Callbacks may unsubscribe themselves.
+        for callback in list(self._subscribers):
+            callback(crate)
+
+    def backend_key(self, name: str) -> str:
+        """Return the key for a cached attribute in the cache backend."""
+        return backend.make_key(self.transport._token, name)  # noqa: SLF001
+
+    def invalidate(self, method: str) -> None:
+        """Drop cached content which may be made stale by invoking the method."""
+        prefix = method.rpartition('.')[0] + '.'
+        invalidate(self, *self.INVALIDATES.get(prefix, ()))
+
+    def unshare(self, method: str) -> None:
+        """Remove cached content which may be made stale by invoking the
+        method from the cache backend, but keep using it here."""
+        prefix = method.rpartition('.')[0] + '.'
+        unshare(self, *self.INVALIDATES.get(prefix, ()))
+
+    def map(
+        self,
+        method: str,
+        param_sets: Iterable[Mapping[str, ParamType]],
+        /,
+        max_workers: int = 4,
+        timeout: float | None = None,
+        cancel: threading.Event | None = None,
+        **kwargs: str | int | bool,
+    ) -> list[Bottle | BaseException]:
+        """Invoke the same method concurrently with each set of parameters.
+
+        Calls are still subject to any limiter set on the transport.
+
+        Args:
+          method: The name of the RTM method to invoke (e.g "rtm.test.echo").
+          param_sets: Parameters to send for each call.
+          max_workers: The maximum number of calls to have in progress at once.
+          timeout: The number of seconds to wait for all calls to complete.
+          cancel: Event which prevents any further calls being started when set.
+          **kwargs: Parameters passed to `invoke` for every call.
+
+        Returns:
+          The result of each call in the same order as the parameters given,
+          or the exception it raised. Calls which weren't made because of the
+          timeout or cancellation are given as TimeoutError or CancelledError.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def call(params: Mapping[str, ParamType]) -> Bottle:
+            if cancel and cancel.is_set():
+                raise concurrent.futures.CancelledError
+            call_kwargs: dict[str, typing.Any] = {**kwargs, **params}
+            return self.invoke(method, **call_kwargs)
+
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers)
+        try:
+            # Calls are made with the priority of the caller's context.
+            futures = [
+                pool.submit(contextvars.copy_context().run, call, params)
+                for params in param_sets
+            ]
+            done, _ = concurrent.futures.wait(
+                futures,
+                None if deadline is None else max(0, deadline - time.monotonic()),
+            )
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        results: list[Bottle | BaseException] = []
+        for future in futures:
+            if future not in done:
+                results.append(TimeoutError(method))
+            elif future.cancelled():
+                results.append(concurrent.futures.CancelledError())
+            elif (exc := future.exception()) is not None:
+                results.append(exc)
+            else:
+                results.append(future.result())
+        return results
+
+    async def amap(
+        self,
+        method: str,
+        param_sets: Iterable[Mapping[str, ParamType]],
+        /,
+        max_workers: int = 4,
+        timeout: float | None = None,
+        **kwargs: str | int | bool,
+    ) -> list[Bottle | BaseException]:
+        """Asynchronous version of `map`.
+
+        Cancelling the awaiting task will cancel all calls not yet completed.
+        """
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def call(params: Mapping[str, ParamType]) -> Bottle:
+            call_kwargs: dict[str, typing.Any] = {**kwargs, **params}
+            async with semaphore:
+                return await asyncio.to_thread(self.invoke, method, **call_kwargs)
+
+        tasks = [asyncio.ensure_future(call(params)) for params in param_sets]
+        if not tasks:
+            return []
+
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        results: list[Bottle | BaseException] = []
+        for task in tasks:
+            if task in pending:
+                results.append(TimeoutError(method))
+            elif (exc := task.exception()) is not None:
+                results.append(exc)
+            else:
+                results.append(task.result())
+        return results
+
+    @contextlib.contextmanager
+    def coalescing(self, window: float = 0.3) -> Iterator[writes.CoalescingWriter]:
+        """Context in which changes to objects are coalesced and sent together.
+
+        Any buffered changes are sent when the context exits.
+
+        Args:
+          window: The number of seconds to wait for further changes to an
+                  object before sending them.
+        """
+        previous = self.writer
+        self.writer = writer = writes.CoalescingWriter(window)
+        try:
+            with writer:
+                yield writer
+        finally:
+            self.writer = previous
+
+    def snapshot(self, path: str | os.PathLike[str]) -> list[str]:
+        """Save the loaded content cached by this object to a file.
+
+        Returns:
+          The names of the cached attributes which were saved.
+        """
+        return snapshot.dump(self, path)
+
+    def restore(self, path: str | os.PathLike[str]) -> list[str]:
+        """Restore content saved by `snapshot`, without calling RTM.
+
+        The restored content can be checked against RTM later by calling
+        `revalidate`.
+
+        Returns:
+          The names of the cached attributes which were restored.
+        """
+        names = snapshot.load(self, path)
+        self._restored.update(names)
+        return names
+
+    def revalidate(self) -> list[str]:
+        """Reload content restored from a snapshot, and update it if it has
+        changed since the snapshot was taken.
+
+        Returns:
+          The names of the cached attributes which had changed.
+        """
+        changed = []
+        for name in sorted(self._restored):
+            crate = self.__dict__.get(name)
+            if not isinstance(crate, DynamicCrate):
+                continue
+            old = crate.bottle
+            new = crate._load_content()  # noqa: SLF001
+            if str(new) != str(old):
+                crate.bottle = new
+                invalidate(crate, None)
+                changed.append(name)
+        self._restored.clear()
+        return changed
+
     @staticmethod
     def _unwrap_response(res: ET.Element) -> ET.Element:
         # If they want content, we'll have to extract it.
@@ -46,18 +311,33 @@ class Milky:
             raise RuntimeError(msg)
         return kids[0]
 
-    @cache_controlled('timeline')
+    @cache_controlled('timeline', backend.TEXT)
     def timeline(self) -> str:
         return self.invoke('rtm.timelines.create').text
 
-    @cache_controlled('settings')
+    @cache_controlled('settings', backend.CrateCodec(models.Settings), ttl=3600)
     def settings(self) -> models.Settings:
         return models.Settings(self)
 
-    @cache_controlled('lists')
+    @cache_controlled('lists', backend.CrateCodec(models.Lists), ttl=300)
     def lists(self) -> models.Lists:
         return models.Lists(self)
 
+    @cache_controlled('tasks', backend.CrateCodec(models.Tasks), ttl=300)
+    def tasks(self) -> models.Tasks:
+        return models.Tasks(self)
+
     @property
     def timezone(self) -> str | None:
         return self.settings.timezone
+
+    @property
+    def tzinfo(self) -> datetime.tzinfo:
+        """The timezone of the account, or UTC if it isn't known.
+
+        It is only looked up once, rather than each time timestamps are read,
+        until the settings are loaded again.
+        """
+        if (tz := self._tzinfo) is None:
+            tz = self._tzinfo = rtmtypes.zone(self.timezone)
+        return tz
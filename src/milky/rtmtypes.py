@@ -1,7 +1,11 @@
+import datetime
+import functools
+import zoneinfo
+
 from collections.abc import Callable
-from typing import Protocol, TypeVar
+from typing import overload, Protocol, TypeVar
 
-from milky.datatypes import BottleDescriptor
+from milky.datatypes import BottleDescriptor, Crate
 
 T = TypeVar('T')
 
@@ -31,13 +35,100 @@ def _str_to_bool(val: str) -> bool:
     return bool(int(val))
 
 
-__all__ = ['Str', 'Int', 'Bool', 'OptionalStr', 'OptionalInt', 'OptionalBool']
+def _str_to_priority(val: str) -> int | None:
+    return None if val == 'N' else int(val)
+
+
+def _str_to_datetime(val: str) -> datetime.datetime:
+    # RTM gives timestamps in UTC with a "Z" suffix, which fromisoformat
+    # only accepts from Python 3.11.
+    if val.endswith('Z'):
+        return datetime.datetime.fromisoformat(val[:-1]).replace(
+            tzinfo=datetime.timezone.utc
+        )
+    return datetime.datetime.fromisoformat(val)
+
+
+@functools.cache
+def zone(name: str | None) -> datetime.tzinfo:
+    """Return the timezone with the given name, or UTC if there is no name."""
+    return zoneinfo.ZoneInfo(name) if name else datetime.timezone.utc
+
+
+class DateTimeDescriptor(BottleDescriptor[T]):
+    """Descriptor for timestamps, which are given in the timezone of the
+    account the object belongs to.
+
+    Values are only decoded once for each bottle, so sorting or filtering
+    objects by them doesn't parse the same strings over and over.
+    """
+
+    @overload
+    def __get__(self, instance: None, owner: type[Crate]) -> 'DateTimeDescriptor[T]':
+        ...
+
+    @overload
+    def __get__(self, instance: Crate, owner: type[Crate]) -> T:
+        ...
+
+    def __get__(
+        self, instance: Crate | None, owner: type[Crate] | None
+    ) -> 'DateTimeDescriptor | T':
+        if instance is None:
+            return self
+        return self.astimezone(instance, instance.milky.tzinfo)
+
+    def astimezone(self, instance: Crate, tz: datetime.tzinfo) -> T:
+        """Return the value for the object in the given timezone.
+
+        This doesn't need the timezone of the account to be known (which
+        might mean loading its settings) - such as when only comparing
+        values.
+        """
+        return instance.bottle.memo(
+            (self.attr, tz), lambda: self._convert(instance, tz)
+        )
+
+    def _convert(self, instance: Crate, tz: datetime.tzinfo) -> T:
+        value = super().__get__(instance, type(instance))
+        if isinstance(value, datetime.datetime):
+            return value.astimezone(tz)  # type: ignore[return-value]
+        return value
+
+
+class PartialDateTimeProtocol(Protocol[T]):
+    def __call__(self, attr: str | None = None) -> DateTimeDescriptor[T]:
+        ...
+
+
+def _datetime_maker(loader: Callable[[str], T]) -> PartialDateTimeProtocol[T]:
+    def _partial_property(attr: str | None = None) -> DateTimeDescriptor[T]:
+        return DateTimeDescriptor(attr, loader)
+
+    return _partial_property
+
+
+__all__ = [
+    'Str',
+    'Int',
+    'Bool',
+    'Priority',
+    'OptionalStr',
+    'OptionalInt',
+    'OptionalBool',
+    'DateTime',
+    'OptionalDateTime',
+]
 
 # The types.
 Str = _property_maker(str)
 Int = _property_maker(int)
 Bool = _property_maker(_str_to_bool)
+Priority = _property_maker(_str_to_priority)
 
 OptionalStr = _property_maker(_f_with_null(str))
 OptionalInt = _property_maker(_f_with_null(int))
 OptionalBool = _property_maker(_f_with_null(_str_to_bool))
+
+DateTime = _datetime_maker(_str_to_datetime)
+OptionalDateTime = _datetime_maker(_f_with_null(_str_to_datetime))
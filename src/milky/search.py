@@ -0,0 +1,336 @@
+"""Local evaluation of Remember The Milk search filters.
+
+This supports a subset of the RTM search grammar, which is enough to evaluate
+most smart lists against tasks which have already been loaded:
+
+    list:<name>         tasks in the named list
+    tag:<tag>           tasks with the given tag
+    priority:<1-3|none> tasks with the given priority
+    name:<text>         tasks with the text in their name
+    isCompleted:<bool>  tasks which are (or aren't) completed
+    due:<date>          tasks due on the date ("never" for no due date)
+    dueBefore:<date>    tasks due before the date
+    dueAfter:<date>     tasks due after the date
+
+Terms can be combined with "and", "or", "not" and parentheses, and adjacent
+terms are treated as if joined by "and". Dates can be given as "today",
+"tomorrow", "yesterday" or in "YYYY-MM-DD" form.
+"""
+
+from __future__ import annotations
+
+import bisect
+import datetime
+import functools
+import re
+import threading
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping, Sequence
+
+    from milky.models import Task
+
+
+_TOKENS = re.compile(
+    r'''\s*(?:
+        (?P<paren>[()])
+      | (?P<op>[A-Za-z]+):(?:"(?P<quoted>[^"]*)"|(?P<bare>[^\s()]+))
+      | (?P<word>[^\s()]+)
+    )''',
+    re.VERBOSE,
+)
+
+
+@dataclass(frozen=True)
+class Term:
+    """A single operator and value (e.g. "tag:work")."""
+
+    op: str
+    value: str
+
+
+@dataclass(frozen=True)
+class Not:
+    term: Node
+
+
+@dataclass(frozen=True)
+class And:
+    left: Node
+    right: Node
+
+
+@dataclass(frozen=True)
+class Or:
+    left: Node
+    right: Node
+
+
+Node = Term | Not | And | Or
+
+
+def _tokenize(query: str) -> list[str | Term]:
+    tokens: list[str | Term] = []
+    pos = 0
+    while (match := _TOKENS.match(query, pos)) and match.end() > pos:
+        pos = match.end()
+        if match['paren']:
+            tokens.append(match['paren'])
+        elif match['op']:
+            value = match['quoted'] if match['quoted'] is not None else match['bare']
+            tokens.append(Term(match['op'].lower(), value))
+        else:
+            tokens.append(match['word'].lower())
+    if query[pos:].strip():
+        raise ValueError(f'cannot parse query at: {query[pos:]!r}')
+    return tokens
+
+
+class _Parser:
+    def __init__(self, items: list[str | Term]) -> None:
+        self.items = items
+        self.pos = 0
+
+    def peek(self) -> str | Term | None:
+        return self.items[self.pos] if self.pos < len(self.items) else None
+
+    def take(self) -> str | Term:
+        item = self.items[self.pos]
+        self.pos += 1
+        return item
+
+    def parse_or(self) -> Node:
+        node = self.parse_and()
+        while self.peek() == 'or':
+            self.take()
+            node = Or(node, self.parse_and())
+        return node
+
+    def parse_and(self) -> Node:
+        node = self.parse_not()
+        while (item := self.peek()) is not None and item not in ('or', ')'):
+            if item == 'and':
+                self.take()
+            node = And(node, self.parse_not())
+        return node
+
+    def parse_not(self) -> Node:
+        if self.peek() == 'not':
+            self.take()
+            return Not(self.parse_not())
+        return self.parse_term()
+
+    def parse_term(self) -> Node:
+        if (item := self.peek()) is None:
+            raise ValueError('unexpected end of query')
+        self.take()
+        if item == '(':
+            node = self.parse_or()
+            if self.peek() != ')':
+                raise ValueError('missing closing parenthesis')
+            self.take()
+            return node
+        if isinstance(item, Term):
+            return item
+        raise ValueError(f'unexpected {item!r} in query')
+
+
+@functools.lru_cache(maxsize=256)
+def parse(query: str) -> Node:
+    """Parse a search filter into a tree of nodes.
+
+    Raises:
+      ValueError: if the query cannot be parsed.
+    """
+    parser = _Parser(_tokenize(query))
+    node = parser.parse_or()
+    if parser.peek() is not None:
+        raise ValueError(f'unexpected {parser.peek()!r} in query')
+    return node
+
+
+def _parse_date(value: str, today: datetime.date) -> datetime.date:
+    relative = {'today': 0, 'tomorrow': 1, 'yesterday': -1}
+    if (days := relative.get(value.lower())) is not None:
+        return today + datetime.timedelta(days=days)
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'unsupported date: {value!r}') from None
+
+
+def _parse_bool(value: str) -> bool:
+    if (result := {'true': True, 'false': False}.get(value.lower())) is None:
+        raise ValueError(f'unsupported boolean: {value!r}')
+    return result
+
+
+@dataclass(frozen=True)
+class _Keys:
+    # What a task is indexed under.
+    list_name: str
+    tags: tuple[str, ...]
+    priority: int | None
+    completed: bool
+    due: datetime.date | None
+
+
+class TaskIndex:
+    """Indexes over a collection of tasks, used to evaluate search filters.
+
+    The index holds the tasks it was created with. Tasks whose content changes
+    are reindexed when `update` is called with them.
+    """
+
+    def __init__(
+        self,
+        tasks: Sequence[Task],
+        list_names: Mapping[int, str],
+        tz: datetime.tzinfo | None = None,
+    ) -> None:
+        """Create a TaskIndex object.
+
+        Args:
+          tasks: The tasks to index.
+          list_names: The name of each list, keyed by list ID.
+          tz: The timezone used to determine which day tasks are due on,
+              otherwise UTC.
+        """
+        self.tasks = tasks
+        self.list_names = list_names
+        self.tz = tz or datetime.timezone.utc
+        self.all = frozenset(range(len(tasks)))
+        self._lock = threading.Lock()
+
+        self.by_list: dict[str, set[int]] = {}
+        self.by_tag: dict[str, set[int]] = {}
+        self.by_priority: dict[int | None, set[int]] = {}
+        self.completed: set[int] = set()
+        self.undated: set[int] = set()
+
+        # Sorted pairs of due date and position.
+        self.due: list[tuple[datetime.date, int]] = []
+
+        self._positions = {task: pos for (pos, task) in enumerate(tasks)}
+        self._keys = [self._keys_of(task) for task in tasks]
+        for pos, keys in enumerate(self._keys):
+            self._add(pos, keys)
+        self.due.sort()
+
+    def _keys_of(self, task: Task) -> _Keys:
+        due = task.due
+        return _Keys(
+            list_name=self.list_names.get(task.list_id, '').lower(),
+            tags=tuple(tag.lower() for tag in task.tags),
+            priority=task.priority,
+            completed=bool(task.completed),
+            due=due.astimezone(self.tz).date() if due else None,
+        )
+
+    def _add(self, pos: int, keys: _Keys, sort: bool = False) -> None:
+        self.by_list.setdefault(keys.list_name, set()).add(pos)
+        for tag in keys.tags:
+            self.by_tag.setdefault(tag, set()).add(pos)
+        self.by_priority.setdefault(keys.priority, set()).add(pos)
+        if keys.completed:
+            self.completed.add(pos)
+        if keys.due is None:
+            self.undated.add(pos)
+        elif sort:
+            bisect.insort(self.due, (keys.due, pos))
+        else:
+            self.due.append((keys.due, pos))
+
+    def _remove(self, pos: int, keys: _Keys) -> None:
+        self.by_list[keys.list_name].discard(pos)
+        for tag in keys.tags:
+            self.by_tag[tag].discard(pos)
+        self.by_priority[keys.priority].discard(pos)
+        self.completed.discard(pos)
+        if keys.due is None:
+            self.undated.discard(pos)
+        else:
+            del self.due[bisect.bisect_left(self.due, (keys.due, pos))]
+
+    def update(self, task: Task) -> None:
+        """Reindex a task whose content has changed, if it is in the index."""
+        if (pos := self._positions.get(task)) is None:
+            return
+        keys = self._keys_of(task)
+        with self._lock:
+            if keys != self._keys[pos]:
+                self._remove(pos, self._keys[pos])
+                self._keys[pos] = keys
+                self._add(pos, keys, sort=True)
+
+    def _due_range(
+        self, start: datetime.date | None, end: datetime.date | None
+    ) -> set[int]:
+        # Positions of tasks due from start (inclusive) to end (exclusive).
+        lo = 0 if start is None else bisect.bisect_left(self.due, (start, -1))
+        hi = len(self.due) if end is None else bisect.bisect_left(self.due, (end, -1))
+        return {pos for (_, pos) in self.due[lo:hi]}
+
+    def _evaluate_term(  # noqa: PLR0911
+        self, term: Term, today: datetime.date
+    ) -> set[int] | frozenset[int]:
+        op, value = term.op, term.value
+        if op == 'list':
+            return self.by_list.get(value.lower(), set())
+        if op == 'tag':
+            return self.by_tag.get(value.lower(), set())
+        if op == 'priority':
+            priority = None if value.lower() in ('none', 'n') else int(value)
+            return self.by_priority.get(priority, set())
+        if op == 'iscompleted':
+            return self.completed if _parse_bool(value) else self.all - self.completed
+        if op == 'name':
+            text = value.lower()
+            return {p for (p, t) in enumerate(self.tasks) if text in t.name.lower()}
+        if op == 'due':
+            if value.lower() == 'never':
+                return self.undated
+            date = _parse_date(value, today)
+            return self._due_range(date, date + datetime.timedelta(days=1))
+        if op == 'duebefore':
+            return self._due_range(None, _parse_date(value, today))
+        if op == 'dueafter':
+            date = _parse_date(value, today) + datetime.timedelta(days=1)
+            return self._due_range(date, None)
+        raise ValueError(f'unsupported search operator: {term.op!r}')
+
+    def evaluate(
+        self, node: Node, today: datetime.date
+    ) -> set[int] | frozenset[int]:
+        """Return the positions of the tasks which match the node."""
+        if isinstance(node, Term):
+            return self._evaluate_term(node, today)
+        if isinstance(node, Not):
+            return self.all - self.evaluate(node.term, today)
+        if isinstance(node, And):
+            return self.evaluate(node.left, today) & self.evaluate(node.right, today)
+        return self.evaluate(node.left, today) | self.evaluate(node.right, today)
+
+    def search(
+        self, query: str, today: datetime.date | None = None
+    ) -> list[Task]:
+        """Return the tasks which match the search filter.
+
+        Args:
+          query: The search filter to apply.
+          today: The date to treat as today, otherwise the current date
+                 in the timezone of the index.
+
+        Raises:
+          ValueError: if the query cannot be parsed, or uses an operator
+                      which isn't supported.
+        """
+        if today is None:
+            today = datetime.datetime.now(self.tz).date()
+        node = parse(query)
+        with self._lock:
+            positions = sorted(self.evaluate(node, today))
+        return [self.tasks[pos] for pos in positions]
@@ -0,0 +1,166 @@
+"""Saving and restoring the content cached by a Milky object.
+
+A snapshot file starts with a header (magic bytes, format version, a
+fingerprint of the token the content belongs to and the number of entries),
+followed by each entry: the name of the cached attribute, the kind of value
+stored and the value itself. Crates are stored as the XML of their bottles.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+
+from typing import TYPE_CHECKING
+
+from xml.etree import ElementTree as ET  # noqa: RUF100, DUO107, S405
+
+from milky import backend, models
+from milky.cache import CacheableProperty
+from milky.datatypes import Crate
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from milky.root import Milky
+
+MAGIC = b'MILKYSNP'
+VERSION = 1
+
+HEADER = struct.Struct('>8sH8sI')
+ENTRY = struct.Struct('>B H H I')
+
+# Kinds of values.
+TEXT = 1
+CRATE = 2
+
+
+class SnapshotError(ValueError):
+    """A snapshot file can't be restored."""
+
+
+def _fingerprint(milky: Milky) -> bytes:
+    return backend.fingerprint(milky.transport._token)  # noqa: SLF001
+
+
+def _cached_names(milky: Milky) -> list[str]:
+    return [
+        name
+        for name, attr in vars(type(milky)).items()
+        if isinstance(attr, CacheableProperty) and name in milky.__dict__
+    ]
+
+
+def dump(milky: Milky, path: str | os.PathLike[str]) -> list[str]:
+    """Write the content cached by a Milky object to a file.
+
+    Only content which has been loaded is written - crates which haven't
+    loaded their content are skipped.
+
+    Returns:
+      The names of the attributes which were written.
+    """
+    entries: list[tuple[str, int, str, bytes]] = []
+    for name in _cached_names(milky):
+        value = milky.__dict__[name]
+        if isinstance(value, str):
+            entries.append((name, TEXT, '', value.encode('utf-8')))
+        elif isinstance(value, Crate):
+            if (element := value._dump()) is None:  # noqa: SLF001
+                continue
+            content = ET.tostring(element, encoding='utf-8')
+            entries.append((name, CRATE, type(value).__name__, content))
+
+    with open(path, 'wb') as f:  # noqa: PTH123
+        f.write(HEADER.pack(MAGIC, VERSION, _fingerprint(milky), len(entries)))
+        for name, kind, clsname, content in entries:
+            bname, bcls = name.encode('utf-8'), clsname.encode('utf-8')
+            f.write(ENTRY.pack(kind, len(bname), len(bcls), len(content)))
+            f.write(bname + bcls + content)
+
+    return [name for (name, *_) in entries]
+
+
+def load(milky: Milky, path: str | os.PathLike[str]) -> list[str]:
+    """Restore content written by `dump` onto a Milky object.
+
+    No calls to Remember The Milk are made.
+
+    Returns:
+      The names of the attributes which were restored. Content for
+      attributes which can't be cached isn't restored.
+
+    Raises:
+      SnapshotError: if the file isn't a snapshot, is truncated, is from an
+                     incompatible version, or belongs to a different token.
+    """
+    with open(path, 'rb') as f:  # noqa: PTH123
+        # Empty files can't be mapped.
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            raise SnapshotError('not a snapshot file')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return _load(milky, data)
+
+
+def _load(milky: Milky, data: mmap.mmap) -> list[str]:
+    magic, version, fingerprint, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise SnapshotError('not a snapshot file')
+    if version != VERSION:
+        raise SnapshotError(f'unsupported snapshot version: {version}')
+    if fingerprint != _fingerprint(milky):
+        raise SnapshotError('snapshot belongs to a different token')
+
+    # Every entry is checked before anything is restored.
+    values = [
+        (name, _value(milky, kind, name, clsname, content))
+        for kind, name, clsname, content in _entries(data, count)
+    ]
+
+    names = []
+    for name, value in values:
+        setattr(milky, name, value)
+        # Values aren't stored if caching is disabled.
+        if name in milky.__dict__:
+            names.append(name)
+    return names
+
+
+def _entries(data: mmap.mmap, count: int) -> Iterator[tuple[int, str, str, bytes]]:
+    offset = HEADER.size
+    for _ in range(count):
+        if offset + ENTRY.size > len(data):
+            raise SnapshotError('snapshot file is truncated')
+        kind, nlen, clen, vlen = ENTRY.unpack_from(data, offset)
+        offset += ENTRY.size
+        if offset + nlen + clen + vlen > len(data):
+            raise SnapshotError('snapshot file is truncated')
+        name = data[offset : offset + nlen].decode('utf-8')
+        offset += nlen
+        clsname = data[offset : offset + clen].decode('utf-8')
+        offset += clen
+        content = data[offset : offset + vlen]
+        offset += vlen
+        yield kind, name, clsname, content
+
+
+def _value(milky: Milky, kind: int, name: str, clsname: str, content: bytes) -> object:
+    # Only cached attributes are restored, and only as crates we know.
+    if not isinstance(getattr(type(milky), name, None), CacheableProperty):
+        raise SnapshotError(f'not a cached attribute: {name}')
+
+    if kind == TEXT:
+        return content.decode('utf-8')
+    if kind == CRATE:
+        cls = getattr(models, clsname, None)
+        if not (isinstance(cls, type) and issubclass(cls, Crate)):
+            raise SnapshotError(f'unknown crate class: {clsname}')
+        try:
+            element = ET.fromstring(content)  # noqa: S314
+        except ET.ParseError as exc:
+            raise SnapshotError(f'invalid content for {name}') from exc
+        crate = cls(milky)
+        crate.bottle = element
+        return crate
+    raise SnapshotError(f'unknown entry kind: {kind}')
@@ -0,0 +1,167 @@
+"""Columnar tables of RTM objects, for bulk filtering and sorting.
+
+This requires numpy to be installed, which the "table" extra provides
+(`pip install milky[table]`).
+"""
+
+from __future__ import annotations
+
+import contextlib
+
+from dataclasses import dataclass
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator, Sequence
+
+    import numpy as np
+
+    from milky.datatypes import Bottle, BottleDescriptor, Crate
+
+
+def _numpy() -> Any:
+    with contextlib.suppress(ImportError):
+        import numpy as np
+
+        return np
+
+    raise RuntimeError(
+        'cannot import "numpy" to create table - install the "table" extra'
+        ' (milky[table])'
+    )
+
+
+def _timestamp(val: str | None) -> str:
+    # numpy doesn't want the timezone suffix, and RTM always uses UTC.
+    return val.removesuffix('Z') if val else 'NaT'
+
+
+@dataclass(frozen=True)
+class Column:
+    """Describes how to decode one column of a table from XML elements."""
+
+    name: str
+    attr: str
+    loader: Callable[[str], Any]
+    dtype: Any
+    missing: Any = None
+
+    @classmethod
+    def of(
+        cls,
+        name: str,
+        descriptor: BottleDescriptor[Any],
+        dtype: Any,
+        missing: Any = None,
+    ) -> Column:
+        """Create a column which decodes values the same way as a descriptor."""
+        assert descriptor.attr is not None
+        return cls(name, descriptor.attr, descriptor.loader, dtype, missing)
+
+    @classmethod
+    def timestamp(cls, name: str, descriptor: BottleDescriptor[Any]) -> Column:
+        """Create a column of timestamps from a descriptor of an optional
+        timestamp - the column is decoded from the timestamp string in UTC,
+        rather than through the descriptor."""
+        assert descriptor.attr is not None
+        return cls(name, descriptor.attr, _timestamp, 'datetime64[s]', 'NaT')
+
+    def decode(self, bottle: Bottle) -> Any:
+        try:
+            value = self.loader(bottle[self.attr])
+        except KeyError:
+            return self.missing
+        return self.missing if value is None else value
+
+
+class Row:
+    """Lightweight view of a single row of a table."""
+
+    __slots__ = ['_index', '_table']
+
+    def __init__(self, table: Table, index: int) -> None:
+        self._table = table
+        self._index = index
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self._table.columns[name][self._index]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    @property
+    def crate(self) -> Crate:
+        """The object that the row was created from."""
+        return self._table.crates[self._table.positions[self._index]]
+
+    def __repr__(self) -> str:
+        columns = self._table.columns.items()
+        values = ', '.join(f'{k}={v[self._index]!r}' for (k, v) in columns)
+        return f'Row({values})'
+
+
+class Table:
+    """Columns of values decoded from a collection of objects.
+
+    Columns are numpy arrays, so they can be used to build boolean masks for
+    `where`, and the table can be reordered with `sort`. Both return new tables
+    which still refer back to the original objects.
+    """
+
+    def __init__(
+        self,
+        columns: dict[str, np.ndarray],
+        crates: Sequence[Crate],
+        positions: np.ndarray | None = None,
+    ) -> None:
+        self.columns = columns
+        self.crates = crates
+        self.positions = (
+            _numpy().arange(len(crates)) if positions is None else positions
+        )
+
+    @classmethod
+    def build(cls, crates: Sequence[Crate], schema: Sequence[Column]) -> Table:
+        """Create a table from objects, decoding their XML in a single pass."""
+        np = _numpy()
+        values: list[list[Any]] = [[] for _ in schema]
+        for crate in crates:
+            for column, col_values in zip(schema, values, strict=True):
+                col_values.append(column.decode(crate.bottle))
+
+        columns = {
+            column.name: np.array(col_values, dtype=column.dtype)
+            for column, col_values in zip(schema, values, strict=True)
+        }
+        return cls(columns, crates)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def __iter__(self) -> Iterator[Row]:
+        return (Row(self, idx) for idx in range(len(self)))
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self.columns['id']
+
+    def _take(self, indices: np.ndarray) -> Table:
+        columns = {name: col[indices] for (name, col) in self.columns.items()}
+        return Table(columns, self.crates, self.positions[indices])
+
+    def where(self, mask: np.ndarray) -> Table:
+        """Return a table with only the rows selected by the boolean mask."""
+        return self._take(_numpy().flatnonzero(mask))
+
+    def sort(self, *names: str, descending: bool = False) -> Table:
+        """Return a table sorted by the named columns, most significant first."""
+        np = _numpy()
+        order = np.lexsort([self.columns[name] for name in reversed(names)])
+        return self._take(order[::-1] if descending else order)
+
+    def to_crates(self) -> list[Crate]:
+        """Return the objects for each row of the table."""
+        return [self.crates[pos] for pos in self.positions]
@@ -5,29 +5,38 @@ from __future__ import annotations
 import contextlib
 import enum
 import hashlib
+import threading
+import time
 import urllib.parse
 import webbrowser
 
 from dataclasses import dataclass
-from typing import Any, TypeAlias, TYPE_CHECKING
+from typing import Any, TypeAlias, TYPE_CHECKING, TypeVar
 
 from xml.etree import ElementTree as ET  # noqa: RUF100, DUO107, S405
 
 import milky
 
-from milky.cache import cache_controlled
+from milky import forking, parsing
 
 if TYPE_CHECKING:
-    from collections.abc import Sequence
+    from collections.abc import Callable, Sequence
 
     import httpx
     import requests
 
+    from milky.breaker import CircuitBreaker
+    from milky.limiter import RateLimiter
+    from milky.parsing import PoolParser
+    from milky.quota import Quota
+
     Response: TypeAlias = requests.models.Response | httpx.Response
     ResponseContent = ET.Element | dict[str, Any]
     Client: TypeAlias = requests.Session | httpx.Client
     ParamType = int | str
 
+T = TypeVar('T')
+
 
 def _client_maker() -> Client | None:
     with contextlib.suppress(ImportError):
@@ -43,6 +52,87 @@ def _client_maker() -> Client | None:
     return None
 
 
+def _default_client() -> Client:
+    if not (client := _client_maker()):
+        err = 'cannot import "httpx" or "requests" to create client'
+        raise RuntimeError(err)
+
+    hdrs = client.headers
+    our_ua = hdrs['User-Agent']
+    my_ua = f" milky/{milky.__version__}"
+
+    if isinstance(our_ua, bytes):
+        our_ua = our_ua.decode('utf-8')
+    hdrs['User-Agent'] = our_ua + my_ua
+    return client
+
+
+def accept_encoding(client: Client) -> str | None:
+    """Return the content encodings to ask for responses to be compressed
+    with, or None if the client asks for them itself.
+
+    httpx and requests ask for every encoding they can decode by default - which
+    depends on their version, as well as whether the libraries they decode them
+    with are installed. Other clients are only offered gzip and deflate.
+    """
+    headers = getattr(client, 'headers', None) or {}
+    if any(name.lower() == 'accept-encoding' for name in headers):
+        return None
+    return 'gzip, deflate'
+
+
+def _wire_size(resp: Response) -> int:
+    # The number of bytes received for the body, before it was decompressed.
+    if size := getattr(resp, 'num_bytes_downloaded', 0):
+        return size  # httpx
+    with contextlib.suppress(AttributeError, TypeError):
+        return resp.raw.tell()  # type: ignore[union-attr]  # requests
+    if length := resp.headers.get('content-length'):
+        return int(length)
+    return len(resp.content)
+
+
+class TransferStats:
+    """Totals of the response bodies received by a Transport."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+
+        #: Number of responses received.
+        self.responses = 0
+
+        #: Number of bytes received, before and after decompression.
+        self.compressed = 0
+        self.uncompressed = 0
+
+        forking.track(self)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._after_fork()
+        forking.track(self)
+
+    def record(self, compressed: int, uncompressed: int) -> None:
+        with self._lock:
+            self.responses += 1
+            self.compressed += compressed
+            self.uncompressed += uncompressed
+
+    @property
+    def ratio(self) -> float:
+        """The uncompressed size of responses, relative to their size when
+        received."""
+        return self.uncompressed / self.compressed if self.compressed else 1.0
+
+
 class ResponseError(Exception):
     """Error returned by Remember The Milk."""
 
@@ -108,12 +198,17 @@ class Transport:
     REST_URL = 'https://api.rememberthemilk.com/services/rest/'
     frob = None
 
-    def __init__(
+    def __init__(  # noqa: PLR0913
         self,
         api_key: str,
         secret: str,
         token: str | None = None,
         client: Client | None = None,
+        limiter: RateLimiter | None = None,
+        auth_validity: float | None = None,
+        parser: PoolParser | None = None,
+        breaker: CircuitBreaker | None = None,
+        quota: Quota | None = None,
     ) -> None:
         """Create a Transport object.
 
@@ -123,26 +218,78 @@ class Transport:
           token: The token to use, if one is available.
           client: A httpx.Client or [requests.Session][] object to use,
                   otherwise one will be automatically created.
+          limiter: A RateLimiter object to restrict how often calls are made,
+                   which may be shared with other Transport objects.
+          auth_validity: The number of seconds for which the result of checking
+                         authentication (see `authed`) remains valid, or None
+                         to check every time.
+          parser: A PoolParser object to decode large responses in other
+                  processes for `invoke_records`, which may be shared with
+                  other Transport objects.
+          breaker: A CircuitBreaker object to stop calls being made while
+                   RTM is failing, which may be shared with other Transport
+                   objects.
+          quota: A Quota object to count calls and enforce budgets on them,
+                 which may be shared with other Transport objects.
         """
         self.api_key = api_key
         self.secret = secret
         self._token = token
+        self._client: Client | None = client or _default_client()
+        # Clients we were given belong to the caller, even after a fork.
+        self._owns_client = client is None
+        self.limiter = limiter
+        self.auth_validity = auth_validity
+        self.parser = parser
+        self.breaker = breaker
+        self.quota = quota
+        self.transfer = TransferStats()
 
-        # Try to create a client if one isn't given.
-        if not client:
-            if not (client := _client_maker()):
-                err = 'cannot import "httpx" or "requests" to create client'
-                raise RuntimeError(err)
+        # When authentication was last determined, and who we are.
+        self._auth_checked: float | None = None
+        self._whoami: Identity | None = None
 
-            hdrs = client.headers
-            our_ua = hdrs['User-Agent']
-            my_ua = f" milky/{milky.__version__}"
+        # Held while completing authentication automatically.
+        self._auth_lock = threading.RLock()
 
-            if isinstance(our_ua, bytes):
-                our_ua = our_ua.decode('utf-8')
-            hdrs['User-Agent'] = our_ua + my_ua
+        forking.track(self)
 
-        self.client = client
+    @property
+    def client(self) -> Client:
+        """The HTTP client used to make calls.
+
+        Unless the client was given, a new one is created after the process
+        forks. A new client is always created after the object is unpickled,
+        as clients can't be shared between processes.
+        """
+        if self._client is None:
+            self._client = _default_client()
+        return self._client
+
+    @client.setter
+    def client(self, value: Client) -> None:
+        self._client = value
+        self._owns_client = False
+
+    def _after_fork(self) -> None:
+        # The parent still owns the connections, so we leave them alone.
+        if self._owns_client:
+            self._client = None
+        self._auth_lock = threading.RLock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        state['_client'] = None
+        state['_owns_client'] = True
+        del state['_auth_lock']
+        # The time authentication was checked means nothing in another process.
+        state['_auth_checked'] = None
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._auth_lock = threading.RLock()
+        forking.track(self)
 
     def invoke_request(self, method: str, **kwargs: ParamType) -> Response:
         """Invokes a RTM method and returns the HTTP response. This method is
@@ -158,6 +305,14 @@ class Transport:
             unauthenticated method call.
           * "version" defaults to "2" unless overridden.
 
+        If the transport has a quota, this will block until the call is within
+        its budgets. If the transport has a limiter, this will block until the
+        limiter permits the call to be made. If it has a circuit breaker which
+        is open, this will fail without making the call.
+
+        Responses are requested with compression, and their sizes are added
+        to `transfer`.
+
         Args:
           method: The name of the RTM method to invoke (e.g "rtm.test.echo").
           **kwargs: Parameters to send for the method.
@@ -165,6 +320,8 @@ class Transport:
         Raises:
           RuntimeError: if authentication is required, but no token is given.
           HTTPError: if an HTTP error occurs handling the response.
+          CircuitOpenError: if the circuit breaker is open.
+          QuotaExceededError: if the call would exceed a hard budget.
         """
         if kwargs.get('auth_token') is False:
             del kwargs['auth_token']
@@ -175,11 +332,29 @@ class Transport:
 
         kwargs.setdefault('v', 2)
         params = self.sign_params(method=method, **kwargs)
+        token = str(kwargs['auth_token']) if 'auth_token' in kwargs else None
 
-        resp = self.client.get(
-            self.REST_URL, params=dict(params), headers={"cache-control": "no-cache"}
-        )
-        resp.raise_for_status()
+        # Checked first, as being over budget says nothing about RTM's health.
+        reservation = self.quota.admit(method, token) if self.quota else None
+
+        sent = False
+        try:
+            with self.breaker.guard() if self.breaker else contextlib.nullcontext():
+                if self.limiter:
+                    self.limiter.acquire(token)
+
+                sent = True
+                client = self.client
+                headers = {"cache-control": "no-cache"}
+                if encoding := accept_encoding(client):
+                    headers["accept-encoding"] = encoding
+                resp = client.get(self.REST_URL, params=dict(params), headers=headers)
+                resp.raise_for_status()
+        finally:
+            # Calls stopped by the breaker or limiter don't use up the budget.
+            if self.quota and reservation and not sent:
+                self.quota.release(reservation)
+        self.transfer.record(_wire_size(resp), len(resp.content))
         return resp
 
     def invoke(self, method: str, **kwargs: ParamType) -> ET.Element:
@@ -202,14 +377,50 @@ class Transport:
             raise ValueError('invalid format given')
 
         resp = self.invoke_request(method, **kwargs)
-        result = ET.fromstring(resp.text)  # noqa: S314
+
+        # The parser works out the encoding, so there's no need to decode
+        # the whole body first.
+        result = ET.fromstring(resp.content)  # noqa: S314
         if result.get('stat') == 'fail':
             err = result.find('err')
             assert err is not None
-            raise ResponseError.from_response(result, err)
+            raise self.__response_error(result, err)
 
         return result
 
+    def invoke_records(
+        self, method: str, decoder: Callable[[ET.Element], T], **kwargs: ParamType
+    ) -> T:
+        """Invokes a RTM method, and decodes the XML response into records
+        with the given function.
+
+        If the transport has a parser, large responses are decoded in its
+        process pool, so the function must be defined at the top level of a
+        module. The behaviour of this method is otherwise the same as
+        `invoke`.
+
+        Args:
+          method: The name of the RTM method to invoke (e.g "rtm.test.echo").
+          decoder: Function which turns the response into records.
+          **kwargs: Parameters to send for the method.
+
+        Raises:
+          RuntimeError: if authentication is required, but no token is given.
+          HTTPError: if an HTTP error occurs handling the response.
+          ResponseError: if RTM reports an error in the response.
+        """
+        if kwargs.get('format') not in [None, 'xml']:
+            raise ValueError('invalid format given')
+
+        resp = self.invoke_request(method, **kwargs)
+        records, failure = (self.parser or parsing.decode)(resp.content, decoder)
+        if failure is not None:
+            err = failure.find('err')
+            assert err is not None
+            raise self.__response_error(failure, err)
+
+        return records  # type: ignore[return-value]
+
     def invoke_json(self, method: str, **kwargs: ParamType) -> dict[str, Any]:
         """Invokes a RTM method, decodes the HTTP response and returns the content
         as a JSON-decoded structure.
@@ -234,10 +445,21 @@ class Transport:
         result = resp.json()  # noqa: RUF100, S303
         if result['rsp']['stat'] == 'fail':
             err = result['rsp']['err']
-            raise ResponseError.from_response(result, err)
+            raise self.__response_error(result, err)
 
         return result
 
+    def __response_error(
+        self, response: ResponseContent, err_obj: ET.Element | dict[str, str]
+    ) -> ResponseError:
+        err = ResponseError.from_response(response, err_obj)
+
+        # Our token has been revoked or has expired, so anything we remember
+        # about authentication is no longer valid.
+        if err.code == ResponseCodes.LOGIN_FAILED_OR_BAD_TOKEN.value:
+            self._auth_checked = None
+        return err
+
     def sign_params(self, **params: str | int) -> Sequence[tuple[str, ParamType]]:
         """Sign some parameters for Remember The Milk.
 
@@ -253,9 +475,13 @@ class Transport:
         return (*param_pairs, ('api_sig', sig))
 
     def __autoauth(self) -> bool:
-        if (not self._token) and self.frob:
-            self.finish_auth()
-            return True
+        if self._token or not self.frob:
+            return False
+        with self._auth_lock:
+            # Another thread may have finished it while we waited.
+            if (not self._token) and self.frob:
+                self.finish_auth()
+                return True
         return False
 
     @property
@@ -269,8 +495,7 @@ class Transport:
         self._token = value
         with contextlib.suppress(AttributeError):
             del self.frob
-        with contextlib.suppress(AttributeError):
-            del self.whoami
+        del self.whoami
 
     def __check_token(self) -> ET.Element | None:
         if not self._token:
@@ -282,7 +507,14 @@ class Transport:
                 return None
             raise
 
-    @cache_controlled(None)
+    def __auth_known(self) -> bool:
+        if self._auth_checked is None:
+            return False
+        if self.auth_validity is None:
+            return True
+        return time.monotonic() - self._auth_checked < self.auth_validity
+
+    @property
     def whoami(self) -> Identity | None:
         """The Identity object describing the current user associated.
 
@@ -290,24 +522,43 @@ class Transport:
 
         This attribute is updated upon authentication, and whenever
         the `authed` attribute is accessed. Repeated accesses will
-        not normally result in a call to Remember The Milk being made.
+        not normally result in a call to Remember The Milk being made,
+        unless the `auth_validity` window has passed.
         """
-        # If true, evaluating self.authed will set the whoami object.
-        return self.whoami if self.authed else None
+        # Evaluating self.authed will set the whoami object.
+        if not self.__auth_known():
+            _ = self.authed
+        return self._whoami
+
+    @whoami.setter
+    def whoami(self, value: Identity | None) -> None:
+        self._whoami = value
+        self._auth_checked = time.monotonic()
+
+    @whoami.deleter
+    def whoami(self) -> None:
+        self._whoami = None
+        self._auth_checked = None
 
     @property
     def authed(self) -> bool:
         """Indicates if the transport is currently authorised.
 
-        Accessing this attribute will normally cause
-        a call to Remember The Milk to determine it each time.
+        Accessing this attribute will normally cause a call to Remember
+        The Milk to determine it each time. If `auth_validity` is set, the
+        result is reused until that many seconds have passed, or until
+        Remember The Milk rejects the token in response to any call.
         """
+        if self.auth_validity is not None and self.__auth_known():
+            return self._whoami is not None
+
         # Handle the auto-authentication workflow.
         try:
             if self.__autoauth():
                 return True
         except ResponseError as e:
             if e.code == ResponseCodes.INVALID_FROB.value:
+                self.whoami = None
                 return False
             raise
 
@@ -0,0 +1,317 @@
+"""Strategies for sending changes made to objects to Remember The Milk."""
+
+from __future__ import annotations
+
+import concurrent.futures
+import threading
+import weakref
+
+from dataclasses import dataclass, field
+from typing import Any, Protocol, TYPE_CHECKING
+
+from milky import forking
+from milky.datatypes import Action
+from milky.limiter import priority, Priority
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Hashable
+
+    from milky.datatypes import Bottle, Crate
+    from milky.transport import ParamType
+
+
+class Writer(Protocol):
+    """Object which makes changes to objects on behalf of a Milky object."""
+
+    def update(self, crate: Crate, method: str, **params: ParamType) -> Any:
+        ...
+
+
+def _apply(crate: Crate, params: dict[str, ParamType]) -> None:
+    bottle = crate.bottle
+    for name, value in params.items():
+        bottle = bottle.replace(name, _to_param(value))
+    crate.bottle = bottle
+
+
+def _to_param(value: ParamType) -> str:
+    return str(int(value)) if isinstance(value, bool) else str(value)
+
+
+@dataclass
+class _WriteState:
+    # The last content of the object confirmed by RTM.
+    confirmed: Bottle
+
+    # Number of the most recent write made to the object.
+    generation: int = 0
+
+
+class OptimisticWriter:
+    """Applies changes to objects locally straight away, and sends them to
+    Remember The Milk in the background.
+
+    Assigning to an attribute (such as `List.name`) on an object attached to a
+    Milky object using this writer doesn't wait for Remember The Milk - the
+    object shows the new value immediately, and is updated with the content
+    returned by Remember The Milk once the change has been made. If the change
+    fails, the object is rolled back to the last content confirmed by Remember
+    The Milk.
+
+    Changes are sent one at a time in the order they were made. The outcome of
+    each change is available through the future returned by `update`, or by
+    giving an error callback.
+    """
+
+    def __init__(
+        self, on_error: Callable[[Crate, BaseException], None] | None = None
+    ) -> None:
+        """Create an OptimisticWriter object.
+
+        Args:
+          on_error: Function called with the object and the exception raised
+                    when a change fails.
+        """
+        self.on_error = on_error
+        self._states: weakref.WeakKeyDictionary[Crate, _WriteState] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._start()
+
+        forking.track(self)
+
+    def _start(self) -> None:
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='milky-writer'
+        )
+        self._lock = threading.Lock()
+        self._pending: set[concurrent.futures.Future[Bottle]] = set()
+
+    def _after_fork(self) -> None:
+        # The thread sending changes wasn't copied into this process, so we
+        # need another one. Changes still pending are sent by the parent.
+        self._start()
+
+    def update(
+        self, crate: Crate, method: str, **params: ParamType
+    ) -> concurrent.futures.Future[Bottle]:
+        """Apply a change to an object, and send it in the background.
+
+        Args:
+          crate: The object to change.
+          method: The name of the RTM method which makes the change.
+          **params: The values to change, named as they are in the object's
+                    XML content and in the parameters to the method.
+
+        Returns:
+          A future which gives the content of the object returned by Remember
+          The Milk, or the error raised if the change failed.
+        """
+        with self._lock:
+            if (state := self._states.get(crate)) is None:
+                state = self._states[crate] = _WriteState(crate.bottle)
+            state.generation += 1
+            generation = state.generation
+
+            _apply(crate, params)
+
+        future = self._executor.submit(
+            self._send, crate, state, generation, method, params
+        )
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return future
+
+    def _send(
+        self,
+        crate: Crate,
+        state: _WriteState,
+        generation: int,
+        method: str,
+        params: dict[str, ParamType],
+    ) -> Bottle:
+        try:
+            with priority(Priority.INTERACTIVE):
+                result = crate.milky.invoke(
+                    method,
+                    timeline=True,
+                    unwrap=True,
+                    invalidate=False,
+                    **crate.identity,
+                    **params,
+                )
+        except BaseException as e:
+            with self._lock:
+                # Only the most recent change gets to decide what the object
+                # looks like, otherwise we would undo changes still being sent.
+                if generation == state.generation:
+                    crate.bottle = state.confirmed
+            if self.on_error:
+                self.on_error(crate, e)
+            raise
+
+        with self._lock:
+            state.confirmed = crate._wrap(result)  # noqa: SLF001
+            if generation == state.generation:
+                crate.bottle = state.confirmed
+        return state.confirmed
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Wait for all changes made so far to be sent.
+
+        Returns:
+          True if all changes were sent (successfully or not) in time.
+        """
+        _, pending = concurrent.futures.wait(set(self._pending), timeout)
+        return not pending
+
+    def shutdown(self) -> None:
+        """Wait for all changes to be sent, and stop the background thread."""
+        self._executor.shutdown()
+
+
+@dataclass
+class _Buffered:
+    crate: Crate
+
+    # The last content of the object confirmed by RTM.
+    confirmed: Bottle
+
+    # Latest values to send, grouped by the method which sets them.
+    changes: dict[str, dict[str, ParamType]] = field(default_factory=dict)
+    timer: threading.Timer | None = None
+
+
+class CoalescingWriter:
+    """Buffers changes to objects, so that repeated changes made in quick
+    succession are sent to Remember The Milk as a single call.
+
+    Changes are applied to objects locally straight away. Changes to the same
+    object are held until no further changes have been made to it for the
+    length of the window, and only the last value given for each attribute
+    is sent. Buffered changes are also sent when `flush` is called, or when
+    the writer is used as a context manager and the context is exited.
+
+    If a change fails, the object is rolled back to the last content confirmed
+    by Remember The Milk - keeping any changes to it which were sent before
+    the one that failed - and the error is passed to the error callback if
+    one was given. Otherwise, the error is raised by the next call to `flush`
+    or `close`, including errors from changes sent because the window
+    expired.
+    """
+
+    def __init__(
+        self,
+        window: float = 0.3,
+        on_error: Callable[[Crate, BaseException], None] | None = None,
+    ) -> None:
+        """Create a CoalescingWriter object.
+
+        Args:
+          window: The number of seconds to wait for further changes to an
+                  object before sending them.
+          on_error: Function called with the object and the exception raised
+                    when a change fails.
+        """
+        self.window = window
+        self.on_error = on_error
+        self._lock = threading.Lock()
+        self._buffers: dict[Hashable, _Buffered] = {}
+
+        # Errors from changes sent when the window expired, to be raised by
+        # the next flush.
+        self._errors: list[Exception] = []
+
+        forking.track(self)
+
+    def _after_fork(self) -> None:
+        # Buffered changes are sent by the parent, whose timers they are.
+        self._lock = threading.Lock()
+        self._buffers = {}
+        self._errors = []
+
+    @staticmethod
+    def _key(crate: Crate) -> Hashable:
+        return type(crate), tuple(sorted(crate.identity.items()))
+
+    def update(self, crate: Crate, method: str, **params: ParamType) -> None:
+        """Apply a change to an object, and buffer it to be sent later.
+
+        Args:
+          crate: The object to change.
+          method: The name of the RTM method which makes the change.
+          **params: The values to change, named as they are in the object's
+                    XML content and in the parameters to the method.
+        """
+        key = self._key(crate)
+        with self._lock:
+            if (buffered := self._buffers.get(key)) is None:
+                buffered = self._buffers[key] = _Buffered(crate, crate.bottle)
+            buffered.changes.setdefault(method, {}).update(params)
+            _apply(crate, params)
+
+            # Restart the window for the object.
+            if buffered.timer:
+                buffered.timer.cancel()
+            buffered.timer = threading.Timer(self.window, self._expired, [key])
+            buffered.timer.daemon = True
+            buffered.timer.start()
+
+    def _flush_key(self, key: Hashable) -> Exception | None:
+        with self._lock:
+            if (buffered := self._buffers.pop(key, None)) is None:
+                return None
+            if buffered.timer:
+                buffered.timer.cancel()
+
+        crate = buffered.crate
+        changes = list(buffered.changes.items())
+        for sent, (method, params) in enumerate(changes):
+            try:
+                with priority(Priority.INTERACTIVE):
+                    crate(method, Action.UPDATE, **params)
+            except Exception as e:  # noqa: BLE001
+                # Changes already made by RTM are kept.
+                crate.bottle = buffered.confirmed
+                if not self.on_error:
+                    return e
+                self.on_error(crate, e)
+                return None
+
+            # The content returned by RTM doesn't include the changes which
+            # are still to be sent.
+            buffered.confirmed = crate.bottle
+            for _, later in changes[sent + 1 :]:
+                _apply(crate, later)
+        return None
+
+    def _expired(self, key: Hashable) -> None:
+        if (exc := self._flush_key(key)) is not None:
+            with self._lock:
+                self._errors.append(exc)
+
+    def flush(self) -> None:
+        """Send all buffered changes now.
+
+        Raises:
+          Exception: the first error raised sending a change (including
+                     changes sent since the last flush because the window
+                     expired), if there is no error callback.
+        """
+        with self._lock:
+            keys = list(self._buffers)
+        errors = [exc for key in keys if (exc := self._flush_key(key)) is not None]
+        with self._lock:
+            errors[:0], self._errors = self._errors, []
+        if errors:
+            raise errors[0]
+
+    def close(self) -> None:
+        """Send all buffered changes, as `flush` does."""
+        self.flush()
+
+    def __enter__(self) -> CoalescingWriter:  # noqa: PYI034
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
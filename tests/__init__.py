@@ -14,3 +14,46 @@ del module, types
 
 has_httplib = has_.requests or has_.httpx
 needs_httplib = pytest.mark.skipif(not has_httplib, reason='needs http lib')
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeClient:
+    """Stands in for a HTTP client, serving canned XML content by method name."""
+
+    def __init__(self, **responses):
+        self.responses = {k.replace('_', '.'): v for (k, v) in responses.items()}
+        self.headers = {'User-Agent': 'fake'}
+        self.calls = []
+        self.sent_headers = []
+
+    def get(self, url, params, headers):  # noqa: ARG002
+        self.calls.append(params)
+        self.sent_headers.append(headers)
+        content = self.responses[params['method']]
+        if callable(content):
+            content = content(params)
+        if not content.startswith('<rsp'):
+            content = f'<rsp stat="ok">{content}</rsp>'
+        return FakeResponse(content)
+
+
+class Clock:
+    """Stands in for a clock, which only moves when it is told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
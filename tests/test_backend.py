@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+from milky import Milky, Transport
+from milky.backend import make_key, make_server, MemoryBackend, SocketBackend
+
+from . import FakeClient
+
+
+def make_milky(backend, token='TOKEN'):  # noqa: S107
+    client = FakeClient(
+        rtm_lists_add='<list id="2" name="Later"/>',
+        rtm_lists_getList='<lists><list id="1" name="Inbox"/></lists>',
+        rtm_timelines_create='<timeline>123</timeline>',
+    )
+    milky = Milky(Transport('APIKEY', 'SECRET', token, client=client))
+    milky.backend = backend
+    return milky
+
+
+@pytest.fixture
+def server():
+    server = make_server(('127.0.0.1', 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_memory_backend():
+    now = [0.0]
+    backend = MemoryBackend(clock=lambda: now[0])
+    backend.set('a', b'1', ttl=10)
+    backend.set('b', b'2')
+    assert backend.get_many(['a', 'b', 'c']) == {'a': b'1', 'b': b'2'}
+
+    now[0] = 10
+    assert backend.get('a') is None
+    assert backend.get('b') == b'2'
+
+    backend.delete('b')
+    assert backend.get('b') is None
+
+
+def test_socket_backend(server):
+    backend = SocketBackend(server.server_address)
+    backend.set('a', b'\x00\xff', ttl=60)
+    backend.set('b', b'')
+    assert backend.get_many(['a', 'b', 'c']) == {'a': b'\x00\xff', 'b': b''}
+    assert server.backend.get('a') == b'\x00\xff'
+
+    # The connection is reopened if it is lost.
+    backend.close()
+    backend.delete('a')
+    assert backend.get('a') is None
+
+
+def test_keys():
+    assert make_key('TOKEN', 'lists') != make_key('OTHER', 'lists')
+    assert 'TOKEN' not in make_key('TOKEN', 'lists')
+
+
+@pytest.mark.parametrize('shared', ['memory', 'socket'])
+def test_shared_content(shared, request):
+    if shared == 'memory':
+        backend = MemoryBackend()
+    else:
+        backend = SocketBackend(request.getfixturevalue('server').server_address)
+
+    first, second = make_milky(backend), make_milky(backend)
+    _ = first.timeline
+
+    # Lists are only shared once they have been loaded.
+    lists = first.lists
+    assert backend.get(first.backend_key('lists')) is None
+    assert [ls.name for ls in lists] == ['Inbox']
+
+    assert second.timeline == '123'
+    assert [ls.name for ls in second.lists] == ['Inbox']
+    assert second.transport.client.calls == []
+
+    # Other tokens don't see the content.
+    other = make_milky(backend, token='OTHER')  # noqa: S106
+    assert [ls.name for ls in other.lists] == ['Inbox']
+    assert len(other.transport.client.calls) == 1
+
+    # Writes remove the content for other processes too.
+    first.lists.create('Later')
+    third = make_milky(backend)
+    assert [ls.name for ls in third.lists] == ['Inbox']
+    assert [c['method'] for c in third.transport.client.calls] == [
+        'rtm.lists.getList'
+    ]
+
+
+def test_updates_unshared():
+    names = ['Inbox']
+
+    def get_list(params):  # noqa: ARG001
+        return f'<lists><list id="1" name="{names[0]}"/></lists>'
+
+    def set_name(params):
+        names[0] = params['name']
+        return f'<list id="1" name="{names[0]}"/>'
+
+    backend = MemoryBackend()
+    first, second = make_milky(backend), make_milky(backend)
+    for milky in (first, second):
+        milky.transport.client.responses.update(
+            {'rtm.lists.getList': get_list, 'rtm.lists.setName': set_name}
+        )
+    assert [ls.name for ls in first.lists] == ['Inbox']
+
+    # Changes made in place are kept here, but other processes load them again.
+    first.lists['Inbox'].name = 'Outbox'
+    assert [ls.name for ls in first.lists] == ['Outbox']
+    assert [ls.name for ls in second.lists] == ['Outbox']
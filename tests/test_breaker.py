@@ -0,0 +1,118 @@
+import pytest
+from milky import CircuitBreaker, CircuitOpenError, Milky, Transport
+from milky.breaker import State
+
+from . import Clock, FakeClient
+
+
+def fail():
+    raise ConnectionError
+
+
+def succeed():
+    pass
+
+
+def call(breaker, func):
+    with breaker.guard():
+        func()
+
+
+def test_breaker():
+    clock = Clock()
+    breaker = CircuitBreaker(threshold=2, reset_after=10, clock=clock)
+    with pytest.raises(ConnectionError):
+        call(breaker, fail)
+    call(breaker, succeed)
+
+    # Only failures in a row open the breaker.
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            call(breaker, fail)
+    assert breaker.state is State.OPEN
+    assert not breaker.allows()
+    with pytest.raises(CircuitOpenError):
+        call(breaker, succeed)
+
+    # A failed probe keeps it open.
+    clock.now += 10
+    assert breaker.state is State.HALF_OPEN
+    with pytest.raises(ConnectionError):
+        call(breaker, fail)
+    assert breaker.state is State.OPEN
+
+    # Only a limited number of probes are made at once.
+    clock.now += 10
+    with breaker.guard():
+        assert not breaker.allows()
+        with pytest.raises(CircuitOpenError):
+            call(breaker, succeed)
+    assert breaker.state is State.CLOSED
+
+
+def test_interrupted_probe():
+    clock = Clock()
+    breaker = CircuitBreaker(threshold=1, reset_after=10, clock=clock)
+    with pytest.raises(ConnectionError):
+        call(breaker, fail)
+    clock.now += 10
+
+    # An interrupted probe isn't a failure, but frees its slot.
+    with pytest.raises(KeyboardInterrupt), breaker.guard():
+        raise KeyboardInterrupt
+    assert breaker.state is State.HALF_OPEN
+    assert breaker.allows()
+    call(breaker, succeed)
+    assert breaker.state is State.CLOSED
+
+
+def test_serve_stale():
+    clock = Clock()
+    lists = ['<lists><list id="1" name="Inbox"/></lists>']
+
+    def get_list(params):  # noqa: ARG001
+        if not lists:
+            raise ConnectionError
+        return lists.pop(0)
+
+    client = FakeClient(
+        rtm_lists_getList=get_list,
+        rtm_lists_add='<list id="2" name="Later"/>',
+        rtm_timelines_create='<timeline>1</timeline>',
+    )
+    breaker = CircuitBreaker(threshold=1, reset_after=10, clock=clock)
+    transport = Transport('APIKEY', 'SECRET', 'TOKEN', client=client, breaker=breaker)
+    conn = Milky(transport)
+    conn.serve_stale = True
+
+    assert [ls.name for ls in conn.lists] == ['Inbox']
+    conn.invalidate('rtm.lists.add')
+
+    # The failure which opens the breaker is raised.
+    with pytest.raises(ConnectionError):
+        list(conn.lists)
+
+    # After that, the last known content is used.
+    assert [ls.name for ls in conn.lists] == ['Inbox']
+    assert conn.lists.stale
+    calls = len(client.calls)
+    assert [ls.name for ls in conn.lists] == ['Inbox']
+    assert len(client.calls) == calls
+
+    # Once RTM is back, the content is reloaded.
+    lists.append(
+        '<lists><list id="1" name="Inbox"/><list id="2" name="Later"/></lists>'
+    )
+    clock.now += 10
+    assert [ls.name for ls in conn.lists] == ['Inbox', 'Later']
+    assert not conn.lists.stale
+
+
+def test_no_stale_by_default():
+    client = FakeClient(rtm_lists_getList=lambda _: fail())
+    breaker = CircuitBreaker(threshold=1)
+    conn = Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client, breaker=breaker))
+    with pytest.raises(ConnectionError):
+        list(conn.lists)
+    with pytest.raises(CircuitOpenError):
+        list(conn.lists)
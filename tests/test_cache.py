@@ -1,16 +1,17 @@
+import concurrent.futures
+import threading
+
 import pytest
-from milky.cache import Cache, cache_controlled
+from milky.cache import Cache, cache_controlled, invalidate
 
 
 def make_cache():
-    c = Cache()
-    c._settings = {  # noqa: SLF001
+    return Cache({
         'aa': True,
         'aa.bb': False,
         'aa.bb.cc': True,
         'dd': False,
-    }
-    return c
+    })
 
 
 class Cacheulator:
@@ -88,6 +89,41 @@ def test_view():
     assert str(bb) == "CacheView('aa.bb')"
 
 
+def test_per_object():
+    c = Cache({'aa': True, 'aa.*': None, 'bb': True, 'bb.*': False})
+
+    # Per-object entries inherit from the wildcard, then the parent.
+    assert c['aa.1'] is True
+    assert c['bb.1'] is False
+    assert str(c) == "Cache(aa=on, bb=on, bb.*=off)"
+
+    c['aa.1'] = False
+    c.bb[2].on = True
+    assert c['aa.1'] is False
+    assert c['aa.2'] is True
+    assert c['bb.2'] is True
+    assert repr(c) == (
+        "Cache({'aa': True, 'aa.*': None, 'aa.1': False, "
+        "'bb': True, 'bb.*': False, 'bb.2': True})"
+    )
+
+    with pytest.raises(KeyError):
+        c['aa.1.x']
+
+    c['aa'] = False
+    assert c['aa.1'] is False
+    assert c['aa.2'] is False
+
+    # Resetting a prefix removes the per-object entries beneath it.
+    c.reset('bb.2')
+    assert c['bb.2'] is False
+    c.reset('aa')
+    assert c['aa.1'] is False
+    c['aa'] = True
+    assert c['aa.1'] is True
+    assert repr(c) == "Cache({'aa': True, 'aa.*': None, 'bb': True, 'bb.*': False})"
+
+
 def test_decorator():
     c = Cacheulator()
     p = Proxylator()
@@ -123,3 +159,48 @@ def test_decorator():
     # a cache key that isn't recognised.
     with pytest.raises(AttributeError):
         _ = p.the_e
+
+
+def test_invalidate():
+    c = Cacheulator()
+    always, a = c.always_cached, c.the_a
+
+    invalidate(c, 'aa')
+    assert c.always_cached is always
+    assert c.the_a is not a
+
+    # Locations beneath the one given are also invalidated.
+    c.cache['aa.bb'] = True
+    a, b = c.the_a, c.the_b
+    invalidate(c, 'aa')
+    assert c.the_a is not a
+    assert c.the_b is not b
+
+
+class Slowulator:
+    THREADS = 8
+
+    def __init__(self):
+        self.cache = make_cache()
+        self.barrier = threading.Barrier(self.THREADS)
+        self.computed = 0
+
+    @cache_controlled('aa')
+    def the_a(self):
+        self.computed += 1
+        return object()
+
+
+def test_single_flight():
+    s = Slowulator()
+
+    def read(_):
+        s.barrier.wait()
+        return s.the_a
+
+    with concurrent.futures.ThreadPoolExecutor(s.THREADS) as executor:
+        results = list(executor.map(read, range(s.THREADS)))
+
+    # Threads which arrived together all share the one computed value.
+    assert s.computed == 1
+    assert all(r is results[0] for r in results)
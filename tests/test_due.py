@@ -0,0 +1,84 @@
+import datetime
+
+from milky import Milky, Transport
+from milky.datatypes import Action
+from milky.due import DueIndex
+from milky.models import Tasks
+
+from . import FakeClient
+
+UTC = datetime.timezone.utc
+MOVED = 3
+NOW = datetime.datetime(2024, 3, 1, 9, 0, tzinfo=UTC)
+
+
+def series(task_id, due, completed=''):
+    return (
+        f'<taskseries id="{task_id}0" name="Task {task_id}"><tags/>'
+        f'<task id="{task_id}" due="{due}" completed="{completed}" priority="N"/>'
+        '</taskseries>'
+    )
+
+
+TASKS = '<tasks><list id="1">{}</list></tasks>'.format(
+    series(1, '2024-03-01T09:30:00Z')
+    + series(2, '2024-03-01T09:10:00Z')
+    + series(3, '2024-03-02T09:00:00Z')
+    + series(4, '')
+    + series(5, '2024-03-01T09:20:00Z', completed='2024-02-28T12:00:00Z')
+)
+
+
+def make_milky(**responses):
+    client = FakeClient(
+        rtm_tasks_getList=TASKS,
+        rtm_timelines_create='<timeline>1</timeline>',
+        **responses,
+    )
+    return Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client))
+
+
+def ids(tasks):
+    return [task.id for task in tasks]
+
+
+def test_queries():
+    milky = make_milky()
+    index = DueIndex(now=lambda: NOW)
+    index.watch(milky)
+    tasks = list(milky.tasks)
+
+    # Completed tasks and those without a due date are left out.
+    assert ids(index.between(None, None)) == [2, 1, 3]
+    assert ids(index.within(datetime.timedelta(minutes=30))) == [2]
+    assert ids(index.next_due(2)) == [2, 1]
+    assert ids(index.next_due(2, after=NOW + datetime.timedelta(hours=1))) == [3]
+
+    # Tasks already loaded are picked up when watching.
+    other = DueIndex()
+    other.watch(milky)
+    assert len(other) == len(index)
+
+    index.unwatch(milky)
+    assert len(index) == 0
+    assert tasks[0] not in index
+
+
+def test_incremental_updates():
+    moved = '<list id="1">{}</list>'.format(series(3, '2024-03-01T09:00:00Z'))
+    synced = '<tasks><list id="1">{}</list></tasks>'.format(
+        series(2, '2024-03-01T09:10:00Z', completed='2024-03-01T09:05:00Z')
+    )
+    milky = make_milky(rtm_tasks_setDueDate=moved)
+    index = DueIndex(now=lambda: NOW)
+    index.watch(milky)
+    third = next(t for t in milky.tasks if t.id == MOVED)
+
+    # Changes made to tasks move them within the index.
+    third('rtm.tasks.setDueDate', Action.UPDATE, due='2024-03-01T09:00:00Z')
+    assert ids(index.next_due(1)) == [3]
+
+    # Changes loaded from RTM are applied too.
+    milky.transport.client.responses['rtm.tasks.getList'] = synced
+    list(Tasks(milky, last_sync='2024-03-01T09:00:00Z'))
+    assert ids(index.between(None, None)) == [3, 1]
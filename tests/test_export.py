@@ -0,0 +1,107 @@
+import concurrent.futures
+import csv
+import json
+
+import pytest
+from milky import Milky, Transport
+from milky.__main__ import main
+from milky.export import export
+from milky.parsing import PoolParser
+
+from . import FakeClient
+
+LISTS = (
+    '<lists><list id="1" name="Inbox" smart="0"/><list id="2" name="Work" smart="0"/>'
+    '<list id="3" name="Urgent" smart="1"><filter>priority:1</filter></list></lists>'
+)
+
+
+def tasks_for(list_id):
+    return (
+        f'<tasks><list id="{list_id}">'
+        f'<taskseries id="{list_id}0" name="Task {list_id}">'
+        '<tags><tag>a</tag><tag>b</tag></tags>'
+        f'<task id="{list_id}00" due="2024-03-01T00:00:00Z" priority="N"'
+        ' completed=""/>'
+        '</taskseries></list></tasks>'
+    )
+
+
+def make_milky(fail=()):
+    def get_tasks(params):
+        if params['list_id'] in fail:
+            raise ConnectionError
+        return tasks_for(params['list_id'])
+
+    client = FakeClient(rtm_lists_getList=LISTS, rtm_tasks_getList=get_tasks)
+    return Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client))
+
+
+def read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_jsonl(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    reports = []
+    progress = export(make_milky(), path, progress=reports.append)
+
+    records = read_jsonl(path)
+    assert [(r['kind'], r['id']) for r in records[:3]] == [
+        ('list', 1),
+        ('list', 2),
+        ('list', 3),
+    ]
+    # Tasks of smart lists aren't fetched, as they are in other lists.
+    assert sorted(r['id'] for r in records[3:]) == [100, 200]
+    assert records[3]['tags'] == ['a', 'b']
+    assert records[3]['due'] == '2024-03-01T00:00:00Z'
+    assert (progress.lists, progress.total, progress.records) == (2, 2, len(records))
+
+
+def test_pool_parser(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    milky = make_milky()
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        milky.transport.parser = PoolParser(threshold=0, executor=executor)
+        export(milky, path)
+
+    reference = tmp_path / 'reference.jsonl'
+    export(make_milky(), reference)
+    assert sorted(read_jsonl(path), key=str) == sorted(read_jsonl(reference), key=str)
+
+
+def test_csv(tmp_path):
+    path = tmp_path / 'out.csv'
+    export(make_milky(), path)
+    with path.open(newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert rows[2]['filter'] == 'priority:1'
+    assert {row['tags'] for row in rows[3:]} == {'a,b'}
+
+
+def test_resume(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    checkpoint = tmp_path / 'out.checkpoint'
+    with pytest.raises(ConnectionError):
+        export(make_milky(fail={2}), path, checkpoint=checkpoint, max_workers=1)
+    assert checkpoint.exists()
+
+    # Only the lists which weren't finished are fetched again.
+    milky = make_milky()
+    export(milky, path, checkpoint=checkpoint)
+    calls = milky.transport.client.calls
+    assert [(c['method'], c.get('list_id')) for c in calls] == [
+        ('rtm.tasks.getList', 2)
+    ]
+
+    records = read_jsonl(path)
+    assert [r['id'] for r in records] == [1, 2, 3, 100, 200]
+    assert not checkpoint.exists()
+
+
+def test_command_needs_credentials(monkeypatch, tmp_path):
+    for name in ['MILKY_API_KEY', 'MILKY_SECRET', 'MILKY_TOKEN']:
+        monkeypatch.delenv(name, raising=False)
+    with pytest.raises(SystemExit):
+        main(['export', str(tmp_path / 'out.jsonl')])
@@ -0,0 +1,154 @@
+import os
+import pickle
+import threading
+
+import pytest
+from milky import CircuitBreaker, Milky, Pool, RateLimiter, Transport
+from milky.backend import make_server, SocketBackend
+from milky.parsing import PoolParser
+from milky.writes import OptimisticWriter
+
+from . import FakeClient
+
+LISTS = '<lists><list id="1" name="Inbox"/></lists>'
+
+
+def make_milky():
+    client = FakeClient(rtm_lists_getList=LISTS)
+    transport = Transport(
+        'APIKEY',
+        'SECRET',
+        'TOKEN',
+        client=client,
+        limiter=RateLimiter(rate=5),
+        breaker=CircuitBreaker(threshold=2),
+        parser=PoolParser(threshold=100),
+    )
+    return Milky(transport)
+
+
+def test_pickle():
+    conn = make_milky()
+    conn.writer = OptimisticWriter()
+    inbox = conn.lists['Inbox']
+    conn.transport.whoami = None
+
+    copy = pickle.loads(pickle.dumps(conn))  # noqa: S301
+    conn.writer.shutdown()
+
+    # Credentials and cached content are sent, but not the client.
+    transport = copy.transport
+    assert (transport.api_key, transport.secret, transport.token) == (
+        'APIKEY',
+        'SECRET',
+        'TOKEN',
+    )
+    assert transport._client is None  # noqa: SLF001
+    assert transport._auth_checked is None  # noqa: SLF001
+    assert transport.limiter.rate == conn.transport.limiter.rate
+    assert transport.breaker.threshold == conn.transport.breaker.threshold
+    assert transport.parser.threshold == conn.transport.parser.threshold
+    assert copy.writer is None
+
+    copy_inbox = copy.lists['Inbox']
+    assert (copy_inbox.id, copy_inbox.name) == (inbox.id, inbox.name)
+    assert copy_inbox.milky is copy
+
+    # Crates can be pickled on their own too.
+    alone = pickle.loads(pickle.dumps(inbox))  # noqa: S301
+    assert alone.name == 'Inbox'
+
+
+def in_child(check):
+    # Runs the check in a forked child, returning whether it passed.
+    read_fd, write_fd = os.pipe()
+    if (pid := os.fork()) == 0:  # pragma: no cover
+        ok = False
+        try:
+            ok = check()
+        finally:
+            os.write(write_fd, b'1' if ok else b'0')
+            os._exit(0)
+
+    os.close(write_fd)
+    result = os.read(read_fd, 1)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    return result == b'1'
+
+
+needs_fork = pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+
+
+@needs_fork
+def test_fork():
+    conn = make_milky()
+    transport = conn.transport
+    client = transport.client
+    limiter = transport.limiter
+    limiter._waiting['stuck'] = object()  # noqa: SLF001
+    owned = Transport('APIKEY', 'SECRET', 'TOKEN')
+
+    def check():
+        # Clients we were given are kept, ones we created are replaced.
+        return (
+            transport._client is client  # noqa: SLF001
+            and owned._client is None  # noqa: SLF001
+            and not limiter._waiting  # noqa: SLF001
+        )
+
+    assert in_child(check)
+
+    # The parent is left alone.
+    assert owned._client is not None  # noqa: SLF001
+    assert limiter._waiting  # noqa: SLF001
+
+
+@needs_fork
+def test_fork_pool():
+    pool = Pool('APIKEY', 'SECRET')
+    milky = pool.get('TOKEN')
+    client = pool.client
+
+    def check():
+        return pool.client is not client and milky.transport.client is pool.client
+
+    assert in_child(check)
+    assert milky.transport.client is client
+
+
+@needs_fork
+def test_fork_writer():
+    writer = OptimisticWriter()
+
+    def check():
+        # Another thread sends changes in the child.
+        future = writer._executor.submit(int)  # noqa: SLF001
+        return future.result(timeout=5) == 0
+
+    try:
+        assert in_child(check)
+    finally:
+        writer.shutdown()
+
+
+@needs_fork
+def test_fork_socket_backend():
+    server = make_server(('127.0.0.1', 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        backend = SocketBackend(server.server_address)
+        backend.set('key', b'parent')
+
+        def check():
+            # The child makes its own connection.
+            connected = backend._sock is not None  # noqa: SLF001
+            return not connected and backend.get('key') == b'parent'
+
+        assert in_child(check)
+        assert backend.get('key') == b'parent'
+        backend.close()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+from milky.limiter import current_priority, priority, Priority, RateLimiter
+
+from . import Clock
+
+# Real seconds to wait for other threads before giving up.
+TIMEOUT = 5
+
+
+def wait_for(predicate):
+    deadline = time.monotonic() + TIMEOUT
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out waiting for threads'
+        time.sleep(0.001)
+
+
+def queued(limiter):
+    with limiter._cond:  # noqa: SLF001
+        waiting = limiter._waiting.values()  # noqa: SLF001
+        return sum(len(queue) for queues in waiting for queue in queues.values())
+
+
+def serve(limiter, clock, threads, order):
+    # Each call is permitted in turn as the clock moves on, by enough for the
+    # bucket to refill.
+    for served in range(1, len(threads) + 1):
+        with limiter._cond:  # noqa: SLF001
+            clock.now += max(1, 1 / limiter.rate)
+            limiter._cond.notify_all()  # noqa: SLF001
+        wait_for(lambda served=served: len(order) == served)
+    for t in threads:
+        t.join()
+
+
+def test_burst_then_wait():
+    clock = Clock()
+    limiter = RateLimiter(rate=2, burst=2, clock=clock)
+    assert limiter.acquire() == 0
+    assert limiter.acquire() == 0
+
+    # Nothing is left in the bucket.
+    with pytest.raises(TimeoutError):
+        limiter.acquire(timeout=0)
+
+    clock.now += 0.5
+    assert limiter.acquire(timeout=0) == 0
+
+
+def test_timeout_leaves_no_waiter():
+    limiter = RateLimiter(rate=1, burst=1)
+    limiter.acquire()
+    with pytest.raises(TimeoutError):
+        limiter.acquire('a', timeout=0.01)
+    assert not limiter._waiting  # noqa: SLF001
+
+
+def test_fair_across_keys():
+    clock = Clock()
+    limiter = RateLimiter(rate=20, burst=1, clock=clock)
+    limiter.acquire()
+
+    order = []
+
+    def call(key):
+        limiter.acquire(key)
+        order.append(key)
+
+    # A busy key queues up lots of calls before a quiet one arrives.
+    threads = [
+        threading.Thread(target=call, args=('busy',), daemon=True) for _ in range(6)
+    ]
+    threads.append(threading.Thread(target=call, args=('quiet',), daemon=True))
+    for n, t in enumerate(threads, 1):
+        t.start()
+        wait_for(lambda n=n: queued(limiter) == n)
+    serve(limiter, clock, threads, order)
+
+    # The quiet key shouldn't have to wait for all the busy calls.
+    assert order.index('quiet') == 1
+
+
+def run_calls(limiter, clock, *levels):
+    # Each call is started after the previous one has begun waiting.
+    order = []
+
+    def call(level):
+        # Explicit priorities override the context.
+        with priority(Priority.BACKGROUND):
+            limiter.acquire(priority=level)
+        order.append(level)
+
+    threads = [
+        threading.Thread(target=call, args=(level,), daemon=True) for level in levels
+    ]
+    for n, t in enumerate(threads, 1):
+        t.start()
+        wait_for(lambda n=n: queued(limiter) == n)
+    serve(limiter, clock, threads, order)
+    return order
+
+
+def test_priority_context():
+    assert current_priority() is Priority.NORMAL
+    with priority(Priority.BACKGROUND):
+        assert current_priority() is Priority.BACKGROUND
+    assert current_priority() is Priority.NORMAL
+
+
+def test_priorities():
+    clock = Clock()
+    limiter = RateLimiter(rate=10, burst=1, clock=clock)
+    limiter.acquire()
+
+    # Interactive calls jump ahead of background ones.
+    levels = [Priority.BACKGROUND, Priority.NORMAL, Priority.INTERACTIVE]
+    assert run_calls(limiter, clock, *levels) == levels[::-1]
+
+
+def test_latency_targets():
+    clock = Clock()
+    limiter = RateLimiter(
+        rate=10, burst=1, clock=clock, targets={Priority.BACKGROUND: 0.01}
+    )
+    limiter.acquire()
+
+    # The background call has waited longer than its target.
+    order = run_calls(limiter, clock, Priority.BACKGROUND, Priority.INTERACTIVE)
+    assert order == [Priority.BACKGROUND, Priority.INTERACTIVE]
+    assert not limiter._waiting  # noqa: SLF001
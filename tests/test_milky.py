@@ -1,5 +1,62 @@
-from milky import __version__
+import asyncio
+import concurrent.futures
+import threading
+
+from milky import __version__, Milky, ResponseError, Transport
+
+from . import FakeClient
 
 
 def test_version():
     assert __version__ == '0.2.0'
+
+
+def echo(params):
+    if params['value'] == 'bad':
+        return '<rsp stat="fail"><err code="1" msg="Bad value"/></rsp>'
+    if params['value'] == 'slow':
+        threading.Event().wait(0.5)
+    return f'<value>{params["value"]}</value>'
+
+
+def make_milky():
+    client = FakeClient(rtm_test_echo=echo)
+    return Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client))
+
+
+def test_map():
+    conn = make_milky()
+    values = ['a', 'bad', 'c']
+    results = conn.map('rtm.test.echo', [{'value': v} for v in values])
+    assert results[0].text == 'a'
+    assert isinstance(results[1], ResponseError)
+    assert results[2].text == 'c'
+
+
+def test_map_timeout():
+    conn = make_milky()
+    values = ['slow', 'b']
+    results = conn.map(
+        'rtm.test.echo', [{'value': v} for v in values], max_workers=1, timeout=0.1
+    )
+    assert isinstance(results[0], TimeoutError)
+    assert isinstance(results[1], TimeoutError)
+
+
+def test_map_cancel():
+    conn = make_milky()
+    cancel = threading.Event()
+    cancel.set()
+    results = conn.map('rtm.test.echo', [{'value': 'a'}], cancel=cancel)
+    assert isinstance(results[0], concurrent.futures.CancelledError)
+
+
+def test_amap():
+    conn = make_milky()
+    values = ['a', 'bad', 'slow']
+    results = asyncio.run(
+        conn.amap('rtm.test.echo', [{'value': v} for v in values], timeout=0.2)
+    )
+    assert results[0].text == 'a'
+    assert isinstance(results[1], ResponseError)
+    assert isinstance(results[2], TimeoutError)
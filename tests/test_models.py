@@ -1,11 +1,19 @@
 from __future__ import annotations
 
+import asyncio
+import concurrent.futures
+import datetime
+import threading
+import time
+import zoneinfo
+
 from typing import Any
 
 import pytest
 from milky import Milky, ResponseError, Transport
+from milky.models import Lists
 
-from . import has_httplib
+from . import FakeClient, has_httplib
 
 if not has_httplib:
     pytest.skip("Requires HTTP library", allow_module_level=True)
@@ -131,6 +139,258 @@ class TestLists:
         barfoo = conn.lists['barfoo']
         assert barfoo.name == 'barfoo'
 
-        # Just to show that we aren't just reusing the
-        # same List object.
-        assert foobar is not barfoo
+        # Reloading the lists should reuse the same List object.
+        assert foobar is barfoo
+
+
+def test_lists_identity_map():
+    lists = [
+        '<lists><list id="1" name="Inbox"/><list id="2" name="Work"/></lists>',
+        '<lists><list id="2" name="Jobs"/><list id="3" name="Home"/></lists>',
+    ]
+    client = FakeClient(rtm_lists_getList=lambda _: lists.pop(0))
+    conn = Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client))
+    conn.cache.lists.on = False
+
+    first = list(conn.lists)
+    second = list(conn.lists)
+
+    # The list which was present in both gets reused, but updated.
+    assert first[1] is second[0]
+    assert second[0].name == 'Jobs'
+    assert second[1].name == 'Home'
+
+
+def test_selective_invalidation():
+    client = FakeClient(
+        rtm_lists_getList='<lists><list id="1" name="Inbox"/></lists>',
+        rtm_lists_add='<list id="2" name="Work"/>',
+        rtm_lists_setName='<list id="1" name="Outbox"/>',
+        rtm_settings_getList='<settings><language>en-GB</language></settings>',
+        rtm_timelines_create='<timeline>1</timeline>',
+    )
+    conn = Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client))
+    lists, settings = conn.lists, conn.settings
+
+    # Updating a list is reflected on the list itself.
+    lists['Inbox'].name = 'Outbox'
+    assert conn.lists is lists
+
+    # Creating a list adds it to the lists we have.
+    work = lists.create('Work')
+    assert conn.lists is lists
+    assert list(lists) == [lists['Outbox'], work]
+
+    # Other changes to lists make them stale, whether a timeline is used or
+    # not.
+    conn.invoke('rtm.lists.add', timeline=True, name='Work')
+    assert conn.lists is not lists
+    lists = conn.lists
+    conn.invoke('rtm.lists.add', invalidate=True, name='Work')
+    assert conn.lists is not lists
+    assert conn.settings is settings
+
+
+def test_tasks():
+    tasks = (
+        '<tasks><list id="1"><taskseries id="10" name="Buy milk">'
+        '<tags><tag>shopping</tag></tags>'
+        '<task id="100" due="" priority="N" completed=""/>'
+        '<task id="101" due="" priority="1" completed=""/>'
+        '</taskseries></list></tasks>'
+    )
+    renamed = (
+        '<list id="1"><taskseries id="10" name="Buy oat milk"><tags/>'
+        '<task id="100" due="" priority="N" completed=""/>'
+        '<task id="101" due="" priority="1" completed=""/>'
+        '</taskseries></list>'
+    )
+    client = FakeClient(
+        rtm_lists_getList=(
+            '<lists><list id="1" name="Inbox" smart="0"/>'
+            '<list id="2" name="Important" smart="1" filter="priority:1"/></lists>'
+        ),
+        rtm_tasks_getList=tasks,
+        rtm_tasks_setName=renamed,
+        rtm_settings_getList='<settings><timezone/></settings>',
+        rtm_timelines_create='<timeline>1</timeline>',
+    )
+    conn = Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client))
+
+    first, second = conn.tasks
+    assert (first.id, first.series_id, first.list_id) == (100, 10, 1)
+    assert (first.priority, second.priority) == (None, 1)
+    assert first.tags == ['shopping']
+    assert first.due is None
+
+    # Smart lists are evaluated locally.
+    conn.cache.tasks[2].on = False
+    assert conn.lists['Inbox'].tasks == [first, second]
+    assert conn.lists['Important'].tasks == [second]
+
+    # The tasks of each list are kept, unless switched off for that list.
+    assert list(conn.tasks._by_list) == [1]  # noqa: SLF001
+
+    # Updates pick out the right task from the response.
+    second.name = 'Buy oat milk'
+    assert second.name == 'Buy oat milk'
+    assert second.identity == {'list_id': 1, 'taskseries_id': 10, 'task_id': 101}
+
+
+def test_concurrent_loads():
+    threads = 8
+    barrier = threading.Barrier(threads)
+    client = FakeClient(
+        rtm_lists_getList='<lists><list id="1" name="Inbox"/></lists>',
+    )
+    conn = Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client))
+    conn.cache.lists.on = False
+    lists = conn.lists
+
+    def read(_):
+        barrier.wait()
+        return [ls.name for ls in lists]
+
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(read, range(threads)))
+
+    # Content is only requested once, however many threads want it at once.
+    assert results == [['Inbox']] * threads
+    assert len(client.calls) == 1
+
+
+def test_concurrent_create(monkeypatch):
+    pytest.importorskip('numpy')
+    attrs = 'deleted="0" locked="0" archived="0" position="0" smart="0"'
+    client = FakeClient(
+        rtm_lists_getList=f'<lists><list id="1" name="Inbox" {attrs}/></lists>',
+        rtm_lists_add=f'<list id="2" name="Work" {attrs}/>',
+        rtm_timelines_create='<timeline>1</timeline>',
+    )
+    conn = Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client))
+    lists = conn.lists
+    tables = []
+    building = threading.Event()
+    build = Lists._build  # noqa: SLF001
+
+    def slow_build(self):
+        building.set()
+        time.sleep(0.05)
+        return build(self)
+
+    monkeypatch.setattr(Lists, '_build', slow_build)
+
+    # Building the lists while another is created on cold lists mustn't
+    # deadlock.
+    table = threading.Thread(target=lambda: tables.append(lists.table()), daemon=True)
+    table.start()
+    building.wait()
+    create = threading.Thread(target=lists.create, args=('Work',), daemon=True)
+    create.start()
+    for thread in (table, create):
+        thread.join(5)
+        assert not thread.is_alive()
+    assert len(tables) == 1
+    assert [ls.name for ls in lists] == ['Inbox', 'Work']
+
+
+def test_task_dates():
+    client = FakeClient(
+        rtm_tasks_getList=(
+            '<tasks><list id="1"><taskseries id="10" name="Buy milk"><tags/>'
+            '<task id="100" due="2024-07-01T23:30:00Z" added="2024-06-01T09:00:00Z"'
+            ' completed="" priority="N"/>'
+            '</taskseries></list></tasks>'
+        ),
+        rtm_settings_getList='<settings><timezone>Europe/London</timezone></settings>',
+    )
+    conn = Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client))
+    (task,) = conn.tasks
+
+    # Timestamps are given in the timezone of the account.
+    london = zoneinfo.ZoneInfo('Europe/London')
+    assert task.due == datetime.datetime(2024, 7, 2, 0, 30, tzinfo=london)
+    assert task.due.tzinfo is london
+    assert task.added == datetime.datetime(2024, 6, 1, 9, tzinfo=datetime.timezone.utc)
+    assert task.completed is None
+
+    # They are only decoded once for the same content.
+    assert task.due is task.due
+
+    # The timezone is only looked up once, even if settings aren't cached.
+    conn = Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client))
+    conn.cache.settings.on = False
+    (task,) = conn.tasks
+    calls = len(client.calls)
+    for _ in range(5):
+        assert task.due.tzinfo is london
+    assert [c['method'] for c in client.calls[calls:]] == ['rtm.settings.getList']
+
+
+def test_task_collections():
+    tasks = (
+        '<tasks><list id="1"><taskseries id="10" name="Buy milk">'
+        '<tags><tag>shopping</tag><tag>errands</tag></tags>'
+        '<participants><contact id="5" fullname="Jo Bloggs" username="jo"/>'
+        '</participants>'
+        '<notes><note id="7" created="2024-06-01T09:00:00Z"'
+        ' modified="2024-06-01T09:00:00Z" title="Brand">Semi-skimmed</note></notes>'
+        '<task id="100" due="" priority="N" completed=""/>'
+        '</taskseries></list></tasks>'
+    )
+    renamed = (
+        '<list id="1"><taskseries id="10" name="Buy oat milk"><tags/>'
+        '<task id="100" due="" priority="N" completed=""/>'
+        '</taskseries></list>'
+    )
+    client = FakeClient(
+        rtm_tasks_getList=tasks,
+        rtm_tasks_setName=renamed,
+        rtm_timelines_create='<timeline>1</timeline>',
+    )
+    conn = Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client))
+    (task,) = conn.tasks
+
+    # Collections are kept, and their values are only created when used.
+    notes = task.notes
+    assert task.notes is notes
+    assert notes._values == {}  # noqa: SLF001
+    (note,) = notes
+    assert notes[0] is note
+    assert (note.id, note.title, note.body) == (7, 'Brand', 'Semi-skimmed')
+    assert [p.username for p in task.participants] == ['jo']
+    assert task.tags == ['shopping', 'errands']
+    assert task.tags[-1:] == ['errands']
+
+    # They are rebuilt when the task changes.
+    task.name = 'Buy oat milk'
+    assert task.tags == []
+    assert len(task.notes) == 0
+
+
+def test_async_iteration():
+    client = FakeClient(
+        rtm_lists_getList=(
+            '<lists><list id="1" name="Inbox"/><list id="2" name="Work"/></lists>'
+        ),
+        rtm_tasks_getList=(
+            '<tasks><list id="1"><taskseries id="10" name="Buy milk"><tags/>'
+            '<task id="100" due="" priority="N" completed=""/>'
+            '</taskseries></list></tasks>'
+        ),
+    )
+    conn = Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client))
+
+    async def names(crates, attr):
+        return [getattr(crate, attr) async for crate in crates]
+
+    async def both():
+        return await asyncio.gather(names(conn.lists, 'name'), names(conn.tasks, 'id'))
+
+    assert asyncio.run(both()) == [['Inbox', 'Work'], [100]]
+
+    # The objects created are kept for normal iteration.
+    assert [ls.name for ls in conn.lists] == ['Inbox', 'Work']
+    methods = sorted(c['method'] for c in client.calls)
+    assert methods == ['rtm.lists.getList', 'rtm.tasks.getList']
+    assert asyncio.run(names(conn.lists, 'name')) == ['Inbox', 'Work']
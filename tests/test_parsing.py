@@ -0,0 +1,59 @@
+import concurrent.futures
+
+import pytest
+from milky import ResponseError, Transport
+from milky.parsing import PoolParser
+
+from . import FakeClient
+
+
+class CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+    submitted = 0
+
+    def submit(self, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(*args, **kwargs)
+
+
+def list_ids(element):
+    return [int(ls.get('id')) for ls in element.iter('list')]
+
+
+def test_threshold():
+    executor = CountingExecutor()
+    parser = PoolParser(threshold=100, executor=executor)
+    client = FakeClient(rtm_test_echo=lambda params: f'<list id="{params["value"]}"/>')
+    t = Transport('APIKEY', 'SECRET', 'TOKEN', client=client, parser=parser)
+
+    assert t.invoke_records('rtm.test.echo', list_ids, value=1) == [1]
+    assert executor.submitted == 0
+
+    big = int('9' * 100)
+    assert t.invoke_records('rtm.test.echo', list_ids, value=big) == [big]
+    assert executor.submitted == 1
+
+    # We don't shut down executors we were given.
+    parser.shutdown()
+    assert t.invoke_records('rtm.test.echo', list_ids, value=big) == [big]
+
+
+def test_errors():
+    parser = PoolParser(threshold=0, executor=CountingExecutor())
+    client = FakeClient(
+        rtm_test_echo='<rsp stat="fail"><err code="112" msg="Method not found"/></rsp>'
+    )
+    t = Transport('APIKEY', 'SECRET', 'TOKEN', client=client, parser=parser)
+
+    with pytest.raises(ResponseError, match='Method not found'):
+        t.invoke_records('rtm.test.echo', list_ids)
+
+
+def test_process_pool():
+    parser = PoolParser(threshold=0, max_workers=1)
+    try:
+        records, failure = parser(
+            b'<rsp stat="ok"><lists><list id="1"/></lists></rsp>', list_ids
+        )
+    finally:
+        parser.shutdown()
+    assert (records, failure) == ([1], None)
@@ -0,0 +1,171 @@
+from xml.etree import ElementTree as ET
+
+import pytest
+from milky import Milky, Poller, ResponseError, Transport
+from milky.due import DueIndex
+from milky.models import Task, Tasks
+
+from . import FakeClient
+
+MIN_INTERVAL = 10
+MAX_INTERVAL = 40
+
+EMPTY = '<tasks/>'
+CHANGED = (
+    '<tasks><list id="1"><taskseries id="10" name="Buy milk"><tags/>'
+    '<task id="100" due="2026-01-02T00:00:00Z" added="2026-01-01T00:00:00Z"'
+    ' priority="N" completed="" deleted=""/>'
+    '</taskseries></list></tasks>'
+)
+TASK_ID = 100
+DELETED = (
+    '<tasks><list id="1"><deleted><taskseries id="10">'
+    '<task id="100" deleted="2026-01-01T00:00:05Z"/>'
+    '</taskseries></deleted></list></tasks>'
+)
+
+
+def make_milky(responses):
+    def get_list(params):
+        return responses.pop(0) if 'last_sync' in params else EMPTY
+
+    client = FakeClient(rtm_tasks_getList=get_list)
+    return Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client))
+
+
+@pytest.fixture
+def clock():
+    return [0.0]
+
+
+@pytest.fixture
+def poller(clock):
+    times = iter(f'2026-01-01T00:00:{n:02d}Z' for n in range(60))
+    return Poller(
+        min_interval=MIN_INTERVAL,
+        max_interval=MAX_INTERVAL,
+        clock=lambda: clock[0],
+        rand=lambda: 0.5,
+        now=lambda: next(times),
+    )
+
+
+def test_adaptive_interval(poller, clock):
+    conn = make_milky([EMPTY, EMPTY, EMPTY, CHANGED] + [EMPTY] * 6)
+    changes = []
+    unsubscribe = poller.subscribe(changes.append)
+    poller.add(conn)
+
+    # The first poll only records the time to look for changes from.
+    assert poller.run_pending() == []
+    assert poller.next_due() == MIN_INTERVAL
+    assert conn.transport.client.calls == []
+
+    # Idle accounts are polled less often.
+    interval = MIN_INTERVAL
+    for _ in range(3):
+        clock[0] = poller.next_due()
+        assert poller.run_pending() == []
+        interval *= 1.5
+        assert poller.interval(conn) == interval
+
+    # Changes make polls more frequent.
+    clock[0] = poller.next_due()
+    [change] = poller.run_pending()
+    interval /= 2
+    assert poller.interval(conn) == interval
+    assert changes == [change]
+    assert change.since == '2026-01-01T00:00:03Z'
+    assert [task.name for task in change.tasks] == ['Buy milk']
+    params = conn.transport.client.calls[-1]
+    assert params['last_sync'] == '2026-01-01T00:00:03Z'
+
+    unsubscribe()
+    assert poller.poll(conn) is None
+    assert poller.interval(conn) == interval * 1.5
+
+    # Intervals stay within the limits.
+    for _ in range(5):
+        poller.poll(conn)
+    assert poller.interval(conn) == MAX_INTERVAL
+
+
+def test_jitter_and_remove(clock):
+    values = iter([0.0, 1.0])
+    poller = Poller(
+        min_interval=MIN_INTERVAL,
+        jitter=0.1,
+        clock=lambda: clock[0],
+        rand=lambda: next(values),
+    )
+    first, second = make_milky([]), make_milky([])
+    poller.add(first)
+    poller.add(second)
+    poller.run_pending()
+    dues = sorted(e.due for e in poller._queue)  # noqa: SLF001
+    assert dues == [MIN_INTERVAL * 0.9, MIN_INTERVAL * 1.1]
+
+    poller.remove(first)
+    assert poller.next_due() == MIN_INTERVAL * 1.1
+    poller.remove(second)
+    assert poller.next_due() is None
+
+
+def test_failed_poll(poller, clock):
+    errors = []
+    poller.on_error = lambda milky, exc: errors.append((milky, exc))
+    failing = make_milky(['<rsp stat="fail"><err code="1" msg="Oops"/></rsp>', CHANGED])
+    other = make_milky([CHANGED])
+    poller.add(failing)
+    poller.add(other)
+    poller.run_pending()
+
+    # A failed poll is reported, without stopping other accounts being polled.
+    clock[0] = poller.next_due()
+    [change] = poller.run_pending()
+    assert change.milky is other
+    [(milky, exc)] = errors
+    assert milky is failing
+    assert isinstance(exc, ResponseError)
+
+    # It is retried from the same point.
+    clock[0] = poller.next_due()
+    [change] = poller.run_pending()
+    assert change.since == '2026-01-01T00:00:00Z'
+
+
+def test_failed_subscriber(poller, clock, caplog):
+    def fail(change):
+        raise ValueError(change)
+
+    changes = []
+    poller.subscribe(fail)
+    poller.subscribe(changes.append)
+    conn = make_milky([CHANGED])
+    poller.add(conn)
+    poller.run_pending()
+
+    # Other subscribers are still told, and the error is logged.
+    clock[0] = poller.next_due()
+    assert poller.run_pending() == changes
+    assert len(changes) == 1
+    assert 'error polling account' in caplog.text
+
+
+def test_deleted(poller, clock):
+    conn = make_milky([DELETED])
+    task = Task.load(conn, next(Tasks.split(ET.fromstring(CHANGED))))  # noqa: S314
+    index = DueIndex()
+    index.watch(conn)
+    assert task in index
+    poller.add(conn)
+    poller.run_pending()
+
+    # Deletions alone are changes, and deleted tasks are dropped.
+    clock[0] = poller.next_due()
+    [change] = poller.run_pending()
+    assert change.deleted == (TASK_ID,)
+    assert change.tasks.deleted == [TASK_ID]
+    assert task.bottle['task/deleted'] == '2026-01-01T00:00:05Z'
+    assert task not in index
+    assert (Task, str(TASK_ID)) not in conn.crates
@@ -0,0 +1,57 @@
+from milky import Pool
+
+from . import Clock, FakeClient
+
+ACCOUNTS = 2
+
+
+def make_pool(**kwargs):
+    client = FakeClient(
+        rtm_lists_getList='<lists><list id="1" name="Inbox"/></lists>',
+        rtm_settings_getList='<settings><timezone>Europe/London</timezone></settings>',
+    )
+    return Pool('APIKEY', 'SECRET', client=client, **kwargs)
+
+
+def test_shared_resources():
+    pool = make_pool()
+    a, b = pool.get('token-a'), pool['token-b']
+    assert a is pool.get('token-a')
+    assert a is not b
+    assert len(pool) == ACCOUNTS
+    assert 'token-a' in pool
+    assert list(pool) == ['token-b', 'token-a']
+
+    assert a.transport.token == 'token-a'  # noqa: S105
+    assert a.transport.client is b.transport.client is pool.client
+    assert a.transport.limiter is b.transport.limiter is pool.limiter
+
+    pool.discard('token-a')
+    assert 'token-a' not in pool
+
+
+def test_max_warm():
+    pool = make_pool(max_warm=2)
+    milkies = [pool.get(f'token-{i}') for i in range(3)]
+    for m in milkies[:2]:
+        assert m.settings.timezone == 'Europe/London'
+        assert pool.is_warm(m)
+
+    # Using a third account should evict the least recently used one.
+    pool.get('token-2')
+    assert [pool.is_warm(m) for m in milkies] == [False, True, False]
+
+
+def test_evict_idle():
+    clock = Clock()
+    pool = make_pool(clock=clock)
+    old, new = pool.get('old'), pool.get('new')
+    assert [ls.name for ls in old.lists] == ['Inbox']
+
+    clock.now = 100
+    pool.get('new')
+    assert [ls.name for ls in new.lists] == ['Inbox']
+
+    assert pool.evict_idle(60) == 1
+    assert not pool.is_warm(old)
+    assert pool.is_warm(new)
@@ -0,0 +1,139 @@
+import concurrent.futures
+import pickle
+import threading
+
+import pytest
+from milky import (
+    CircuitBreaker,
+    CircuitOpenError,
+    Milky,
+    Quota,
+    QuotaExceededError,
+    Transport,
+)
+from milky.backend import fingerprint
+from milky.limiter import priority, Priority
+from milky.quota import Budget, tag, Window
+
+from . import Clock, FakeClient
+
+SOFT = 2
+HARD = 3
+MINUTE = 60
+
+
+def make_milky(quota, token='TOKEN'):  # noqa: S107
+    client = FakeClient(
+        rtm_lists_getList='<lists><list id="1" name="Inbox"/></lists>',
+        rtm_test_echo='<echo/>',
+    )
+    return Milky(Transport('APIKEY', 'SECRET', token, client=client, quota=quota))
+
+
+def test_windows():
+    clock = Clock()
+    quota = Quota(clock=clock)
+    milky = make_milky(quota)
+    milky.invoke('rtm.test.echo')
+    with tag('sync'):
+        milky.invoke('rtm.test.echo')
+        make_milky(quota, token='OTHER').invoke('rtm.lists.getList')  # noqa: S106
+
+    assert quota.usage(Window.SECOND) == {'rtm.test.echo': 2, 'rtm.lists.getList': 1}
+    # Tokens aren't kept, only their fingerprints.
+    assert quota.usage(Window.MINUTE, by='token') == {
+        fingerprint('TOKEN').hex(): 2,
+        fingerprint('OTHER').hex(): 1,
+    }
+    assert quota.count(Window.MINUTE, token='OTHER') == 1  # noqa: S106
+    assert quota.usage(Window.DAY, by='tag') == {None: 1, 'sync': 2}
+    assert quota.count(Window.DAY, method='rtm.test.echo', tag='sync') == 1
+
+    # Calls roll out of each window in turn.
+    clock.now = 30
+    assert quota.count(Window.SECOND) == 0
+    assert quota.count(Window.MINUTE) == HARD
+    clock.now = MINUTE
+    assert quota.count(Window.MINUTE) == 0
+    assert quota.count(Window.DAY) == HARD
+
+
+def test_budgets():
+    clock = Clock()
+    quota = Quota(
+        [
+            Budget(Window.MINUTE, soft=SOFT),
+            Budget(Window.DAY, hard=HARD, per_token=True),
+        ],
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    milky = make_milky(quota)
+    with priority(Priority.BACKGROUND):
+        for _ in range(SOFT):
+            milky.invoke('rtm.test.echo')
+        assert clock.now == 0
+
+        # Going over the soft budget waits for room in the window.
+        milky.invoke('rtm.test.echo')
+        assert clock.now == MINUTE
+
+        # Going over the hard budget fails without calling RTM.
+        with pytest.raises(QuotaExceededError):
+            milky.invoke('rtm.test.echo')
+        assert len(milky.transport.client.calls) == HARD
+
+        # Other tokens have their own budget.
+        make_milky(quota, token='OTHER').invoke('rtm.test.echo')  # noqa: S106
+
+    # More important calls aren't affected.
+    milky.invoke('rtm.test.echo')
+
+
+def test_concurrent_admits():
+    quota = Quota([Budget(Window.DAY, hard=HARD)])
+    threads = HARD * 4
+    barrier = threading.Barrier(threads)
+
+    def admit():
+        barrier.wait()
+        try:
+            quota.admit('rtm.test.echo', 'TOKEN', Priority.BACKGROUND)
+        except QuotaExceededError:
+            return False
+        return True
+
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(lambda _: admit(), range(threads)))
+    assert results.count(True) == HARD
+    assert quota.count(Window.DAY) == HARD
+
+
+def test_release():
+    quota = Quota([Budget(Window.DAY, hard=1)])
+    milky = make_milky(quota)
+    breaker = milky.transport.breaker = CircuitBreaker(threshold=1)
+    with pytest.raises(ConnectionError), breaker.guard():
+        raise ConnectionError
+
+    # Calls which the breaker stops aren't counted.
+    with priority(Priority.BACKGROUND), pytest.raises(CircuitOpenError):
+        milky.invoke('rtm.test.echo')
+    assert quota.count(Window.DAY) == 0
+
+
+def test_cache_hits():
+    quota = Quota()
+    milky = make_milky(quota)
+    for _ in range(HARD):
+        assert [ls.name for ls in milky.lists] == ['Inbox']
+    assert quota.hits == {'lists': 2}
+    assert quota.count(Window.DAY) == 1
+
+
+def test_pickle():
+    quota = Quota([Budget(Window.MINUTE, soft=SOFT)])
+    make_milky(quota).invoke('rtm.test.echo')
+    copy = pickle.loads(pickle.dumps(quota))  # noqa: S301
+    assert copy.budgets == quota.budgets
+    assert copy.count(Window.DAY) == 0
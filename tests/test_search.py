@@ -0,0 +1,103 @@
+import datetime
+
+import pytest
+from milky import Milky, Transport
+from milky.search import And, Not, Or, parse, Term
+
+from . import FakeClient
+
+LISTS = '<lists><list id="1" name="Inbox"/><list id="2" name="Work"/></lists>'
+
+TASKS = '''<tasks>
+<list id="1">
+  <taskseries id="10" name="Buy milk">
+    <tags><tag>shopping</tag></tags>
+    <task id="100" due="2024-03-01T00:00:00Z" priority="1" completed=""/>
+  </taskseries>
+  <taskseries id="11" name="Call mum">
+    <tags/>
+    <task id="110" due="" priority="N" completed="2024-02-01T10:00:00Z"/>
+  </taskseries>
+</list>
+<list id="2">
+  <taskseries id="20" name="Write report">
+    <tags><tag>writing</tag><tag>urgent</tag></tags>
+    <task id="200" due="2024-03-01T23:30:00Z" priority="2" completed=""/>
+    <task id="201" due="2024-03-08T23:30:00Z" priority="2" completed=""/>
+  </taskseries>
+</list>
+</tasks>'''
+
+TODAY = datetime.date(2024, 3, 1)
+TASK_ID = 100
+
+
+def test_parse():
+    assert parse('tag:a') == Term('tag', 'a')
+    assert parse('list:"Read Later"') == Term('list', 'Read Later')
+    assert parse('tag:a OR tag:b tag:c') == Or(
+        Term('tag', 'a'), And(Term('tag', 'b'), Term('tag', 'c'))
+    )
+    assert parse('NOT (tag:a or tag:b)') == Not(Or(Term('tag', 'a'), Term('tag', 'b')))
+
+    for bad in ['tag:a or', '(tag:a', 'tag:a)', 'oops']:
+        with pytest.raises(ValueError):  # noqa: PT011
+            parse(bad)
+
+
+@pytest.fixture
+def tasks():
+    client = FakeClient(
+        rtm_lists_getList=LISTS,
+        rtm_tasks_getList=TASKS,
+        rtm_settings_getList='<settings><timezone>Europe/London</timezone></settings>',
+    )
+    return Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client)).tasks
+
+
+@pytest.mark.parametrize(
+    ('query', 'expected'),
+    [
+        ('list:inbox', [100, 110]),
+        ('tag:urgent', [200, 201]),
+        ('priority:2 and not tag:shopping', [200, 201]),
+        ('priority:none', [110]),
+        ('isCompleted:true', [110]),
+        ('due:today', [100, 200]),
+        ('due:never', [110]),
+        ('dueBefore:2024-03-05 AND NOT list:Inbox', [200]),
+        ('dueAfter:today', [201]),
+        ('name:report OR (tag:shopping isCompleted:false)', [100, 200, 201]),
+    ],
+)
+def test_search(tasks, query, expected):
+    assert [t.id for t in tasks.index.search(query, TODAY)] == expected
+
+
+def test_search_timezone():
+    client = FakeClient(
+        rtm_lists_getList=LISTS,
+        rtm_tasks_getList=TASKS,
+        rtm_settings_getList='<settings><timezone>Asia/Tokyo</timezone></settings>',
+    )
+    tasks = Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client)).tasks
+
+    # Due late on the 1st in UTC means due on the 2nd in Tokyo.
+    assert [t.id for t in tasks.index.search('due:today', TODAY)] == [100]
+
+
+def test_unsupported_operator(tasks):
+    with pytest.raises(ValueError, match='unsupported search operator'):
+        tasks.search('location:home')
+
+
+def test_index_follows_changes(tasks):
+    [task] = tasks.search('priority:1')
+    assert task.id == TASK_ID
+
+    # Changes to tasks, such as by their setters, are reflected in the index.
+    task.bottle = task.bottle.replace('task/priority', '3')
+    assert tasks.search('priority:1') == []
+    assert tasks.search('priority:3') == [task]
+    task.bottle = task.bottle.replace('task/due', '2024-03-08T12:00:00Z')
+    assert [t.id for t in tasks.index.search('due:today', TODAY)] == [200]
@@ -0,0 +1,107 @@
+import pytest
+from milky import Milky, Transport
+from milky import snapshot
+from milky.backend import fingerprint
+from milky.snapshot import SnapshotError
+
+from . import FakeClient
+
+
+def make_milky(token='TOKEN'):  # noqa: S107
+    client = FakeClient(
+        rtm_lists_getList='<lists><list id="1" name="Inbox"/></lists>',
+        rtm_lists_setName='<list id="1" name="Outbox"/>',
+        rtm_settings_getList='<settings><language>en-GB</language></settings>',
+        rtm_timelines_create='<timeline>123</timeline>',
+    )
+    return Milky(Transport('APIKEY', 'SECRET', token, client=client))
+
+
+def test_snapshot_and_restore(tmp_path):
+    path = tmp_path / 'milky.snapshot'
+    conn = make_milky()
+    conn.lists['Inbox'].name = 'Outbox'
+    _ = conn.timeline, conn.settings
+
+    # Crates which aren't loaded aren't saved.
+    assert conn.snapshot(path) == ['timeline', 'lists']
+    assert conn.settings.language == 'en-GB'
+    assert conn.snapshot(path) == ['timeline', 'settings', 'lists']
+
+    restored = make_milky()
+    assert restored.restore(path) == ['timeline', 'settings', 'lists']
+    assert restored.transport.client.calls == []
+
+    assert restored.timeline == '123'
+    assert restored.settings.language == 'en-GB'
+    assert [ls.name for ls in restored.lists] == ['Outbox']
+
+    # Revalidating will spot that the lists have changed.
+    assert restored.revalidate() == ['lists']
+    assert [ls.name for ls in restored.lists] == ['Inbox']
+
+
+def test_restore_other_token(tmp_path):
+    path = tmp_path / 'milky.snapshot'
+    make_milky().snapshot(path)
+    with pytest.raises(SnapshotError, match='different token'):
+        make_milky('OTHER').restore(path)
+
+
+def test_restore_not_snapshot(tmp_path):
+    path = tmp_path / 'milky.snapshot'
+    path.write_bytes(b'x' * 64)
+    with pytest.raises(SnapshotError, match='not a snapshot'):
+        make_milky().restore(path)
+
+
+@pytest.mark.parametrize('size', [0, 16, -1])
+def test_restore_truncated(tmp_path, size):
+    path = tmp_path / 'milky.snapshot'
+    conn = make_milky()
+    _ = conn.timeline
+    conn.snapshot(path)
+    path.write_bytes(path.read_bytes()[:size])
+    with pytest.raises(SnapshotError):
+        make_milky().restore(path)
+
+
+def test_restore_not_cached(tmp_path):
+    path = tmp_path / 'milky.snapshot'
+    conn = make_milky()
+    _ = conn.timeline, conn.settings.language
+    conn.snapshot(path)
+
+    # Only content which is cached is reported as restored.
+    restored = make_milky()
+    restored.cache['timeline'] = False
+    assert restored.restore(path) == ['settings']
+    assert restored.revalidate() == []
+
+
+@pytest.mark.parametrize(
+    ('kind', 'name', 'clsname', 'content'),
+    [
+        (snapshot.TEXT, 'transport', '', b'oops'),
+        (snapshot.CRATE, 'lists', 'Bottle', b'<lists/>'),
+        (snapshot.CRATE, 'lists', 'ET', b'<lists/>'),
+        (snapshot.CRATE, 'lists', 'Lists', b'<lists'),
+    ],
+)
+def test_restore_forged(tmp_path, kind, name, clsname, content):
+    path = tmp_path / 'milky.snapshot'
+    bname, bcls = name.encode(), clsname.encode()
+    path.write_bytes(
+        snapshot.HEADER.pack(snapshot.MAGIC, snapshot.VERSION, fingerprint('TOKEN'), 1)
+        + snapshot.ENTRY.pack(kind, len(bname), len(bcls), len(content))
+        + bname
+        + bcls
+        + content
+    )
+
+    # Only cached attributes can be restored, and only as valid crates.
+    conn = make_milky()
+    transport = conn.transport
+    with pytest.raises(SnapshotError):
+        conn.restore(path)
+    assert conn.transport is transport
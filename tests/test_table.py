@@ -0,0 +1,62 @@
+import pytest
+from milky import Milky, Transport
+
+from . import FakeClient
+
+np = pytest.importorskip('numpy')
+
+LIST_COUNT = 3
+
+LISTS = (
+    '<lists>'
+    '<list id="1" name="Inbox" deleted="0" locked="1" archived="0" position="-1"'
+    ' smart="0"/>'
+    '<list id="2" name="Work" deleted="0" locked="0" archived="1" position="0"'
+    ' smart="0"/>'
+    '<list id="3" name="Urgent" deleted="0" locked="0" archived="0" position="0"'
+    ' smart="1" filter="priority:1"/>'
+    '</lists>'
+)
+
+TASKS = (
+    '<tasks><list id="1"><taskseries id="10" name="Buy milk">'
+    '<task id="100" due="2024-03-02T00:00:00Z" added="2024-01-01T00:00:00Z"'
+    ' priority="N" completed=""/>'
+    '<task id="101" due="" added="2024-01-01T00:00:00Z" priority="1"'
+    ' completed="2024-02-01T00:00:00Z"/>'
+    '</taskseries></list><list id="2"><taskseries id="20" name="Report">'
+    '<task id="200" due="2024-03-01T00:00:00Z" added="2024-01-02T00:00:00Z"'
+    ' priority="2" completed=""/>'
+    '</taskseries></list></tasks>'
+)
+
+
+@pytest.fixture
+def conn():
+    client = FakeClient(rtm_lists_getList=LISTS, rtm_tasks_getList=TASKS)
+    return Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client))
+
+
+def test_lists_table(conn):
+    table = conn.lists.table()
+    assert len(table) == LIST_COUNT
+    assert table.ids.tolist() == [1, 2, 3]
+    assert table['archived'].tolist() == [False, True, False]
+
+    active = table.where(~table['archived'] & ~table['smart'])
+    assert [row.name for row in active] == ['Inbox']
+    assert active.to_crates() == [conn.lists['Inbox']]
+
+
+def test_tasks_table(conn):
+    table = conn.tasks.table()
+    assert table['priority'].tolist() == [4, 1, 2]
+    assert np.isnat(table['due']).tolist() == [False, True, False]
+
+    # Sort the incomplete tasks by due date.
+    todo = table.where(np.isnat(table['completed'])).sort('due')
+    assert todo.ids.tolist() == [200, 100]
+
+    rows = list(todo.sort('priority', descending=True))
+    assert [row.id for row in rows] == [100, 200]
+    assert rows[0].crate.name == 'Buy milk'
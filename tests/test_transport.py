@@ -1,7 +1,10 @@
 import pytest
-from milky.transport import ResponseCodes, ResponseError, Transport
+from milky.transport import accept_encoding, ResponseCodes, ResponseError, Transport
 
-from . import has_, needs_httplib
+from . import FakeClient, has_, needs_httplib
+
+# Number of times the token is checked in the auth validity tests.
+CHECKED_TWICE = 2
 
 
 class Settings:
@@ -272,3 +275,76 @@ class TestCassetteCredentials:
         # credential information stripped out.
         elem = Transport(**t_params).invoke('rtm.lists.getList')
         assert elem.find('lists') is not None
+
+
+class TestAuthValidity(Settings):
+    AUTH_OK = (
+        '<auth><token>TOKEN</token><perms>read</perms>'
+        '<user id="1" username="milkymark" fullname="Milky Mark"/></auth>'
+    )
+    AUTH_FAILED = (
+        '<rsp stat="fail"><err code="98" msg="Login failed / Invalid auth token"/>'
+        '</rsp>'
+    )
+
+    @pytest.fixture
+    def client(self):
+        return FakeClient(rtm_auth_checkToken=self.AUTH_OK)
+
+    def test_no_validity(self, client):
+        r = Transport(self.API_KEY, self.SECRET, self.TOKEN, client=client)
+        assert r.authed
+        assert r.authed
+        assert len(client.calls) == CHECKED_TWICE
+
+    def test_validity_window(self, client, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr('milky.transport.time.monotonic', lambda: now[0])
+
+        r = Transport(
+            self.API_KEY, self.SECRET, self.TOKEN, client=client, auth_validity=60
+        )
+        assert r.authed
+        assert r.whoami.username == 'milkymark'
+        assert r.authed
+        assert len(client.calls) == 1
+
+        # Once the window passes, we check again.
+        now[0] += 60
+        assert r.authed
+        assert len(client.calls) == CHECKED_TWICE
+
+    def test_bad_token_seen(self, client):
+        r = Transport(
+            self.API_KEY, self.SECRET, self.TOKEN, client=client, auth_validity=60
+        )
+        assert r.whoami is not None
+
+        # Any call rejecting our token should make us check again.
+        client.responses['rtm.auth.checkToken'] = self.AUTH_FAILED
+        client.responses['rtm.test.login'] = self.AUTH_FAILED
+        with pytest.raises(ResponseError):
+            r.invoke('rtm.test.login')
+        assert not r.authed
+        assert r.whoami is None
+
+
+def test_compressed_transfer():
+    body = '<rsp stat="ok"><echo/></rsp>'
+    client = FakeClient(rtm_test_echo=body)
+    r = Transport('APIKEY', 'SECRET', 'TOKEN', client=client)
+    assert r.invoke('rtm.test.echo').find('echo') is not None
+
+    # Compressed responses are asked for, and their sizes recorded.
+    assert client.sent_headers[0]['accept-encoding'] == 'gzip, deflate'
+    assert r.transfer.responses == 1
+    assert r.transfer.compressed == r.transfer.uncompressed == len(body)
+
+
+@pytest.mark.parametrize('library', ['httpx', 'requests'])
+def test_accept_encoding(library):
+    # Clients which ask for compressed responses themselves are left to it.
+    module = pytest.importorskip(library)
+    client = module.Client() if library == 'httpx' else module.Session()
+    assert accept_encoding(client) is None
+    assert 'gzip' in client.headers['accept-encoding']
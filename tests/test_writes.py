@@ -0,0 +1,167 @@
+import threading
+import time
+
+import pytest
+from milky import Milky, ResponseError, Transport
+from milky.writes import CoalescingWriter, OptimisticWriter
+
+from . import FakeClient
+
+LISTS = '<lists><list id="1" name="Inbox" position="-1"/></lists>'
+
+
+@pytest.fixture
+def release():
+    return threading.Event()
+
+
+@pytest.fixture
+def conn(release):
+    def set_name(params):
+        release.wait(5)
+        if params['name'] == 'bad':
+            return '<rsp stat="fail"><err code="1" msg="Bad name"/></rsp>'
+        # RTM may normalise the value we give it.
+        return f'<list id="1" name="{params["name"].strip()}" position="-1"/>'
+
+    client = FakeClient(
+        rtm_lists_getList=LISTS,
+        rtm_lists_setName=set_name,
+        rtm_timelines_create='<timeline>1</timeline>',
+    )
+    conn = Milky(Transport('APIKEY', 'SECRET', 'TOKEN', client=client))
+    writer = conn.writer = OptimisticWriter()
+    yield conn
+    release.set()
+    writer.shutdown()
+
+
+def test_optimistic_update(conn, release):
+    inbox = conn.lists['Inbox']
+    inbox.name = ' Outbox '
+
+    # The change is visible before RTM has confirmed it.
+    assert inbox.name == ' Outbox '
+    assert inbox.position == -1
+
+    release.set()
+    assert conn.writer.wait(5)
+    assert inbox.name == 'Outbox'
+
+
+def test_rollback(conn, release):
+    errors = []
+    conn.writer.on_error = lambda crate, exc: errors.append((crate, exc))
+
+    inbox = conn.lists['Inbox']
+    future = conn.writer.update(inbox, 'rtm.lists.setName', name='bad')
+    assert inbox.name == 'bad'
+
+    release.set()
+    with pytest.raises(ResponseError):
+        future.result(5)
+    assert inbox.name == 'Inbox'
+    assert errors == [(inbox, future.exception())]
+
+
+def test_later_change_wins(conn, release):
+    inbox = conn.lists['Inbox']
+    first = conn.writer.update(inbox, 'rtm.lists.setName', name='bad')
+    inbox.name = 'Outbox'
+
+    # The failed change doesn't roll back the one made after it.
+    release.set()
+    assert conn.writer.wait(5)
+    assert first.exception() is not None
+    assert inbox.name == 'Outbox'
+
+
+def set_name_calls(conn):
+    calls = conn.transport.client.calls
+    return [c['name'] for c in calls if c['method'] == 'rtm.lists.setName']
+
+
+def test_coalescing(conn, release):
+    release.set()
+    inbox = conn.lists['Inbox']
+    with conn.coalescing(window=60) as writer:
+        assert conn.writer is writer
+        for name in ('One', 'Two', ' Three '):
+            inbox.name = name
+        assert inbox.name == ' Three '
+        assert set_name_calls(conn) == []
+
+    # Only the last value is sent, when the context exits.
+    assert set_name_calls(conn) == [' Three ']
+    assert inbox.name == 'Three'
+    assert isinstance(conn.writer, OptimisticWriter)
+
+
+def test_coalescing_window(conn, release):
+    release.set()
+    inbox = conn.lists['Inbox']
+    conn.writer = CoalescingWriter(window=0.01)
+
+    inbox.name = 'One'
+    inbox.name = 'Two'
+    for _ in range(500):
+        if set_name_calls(conn):
+            break
+        time.sleep(0.01)
+    assert set_name_calls(conn) == ['Two']
+    assert inbox.name == 'Two'
+
+
+def test_coalescing_rollback(conn, release):
+    release.set()
+    inbox = conn.lists['Inbox']
+    writer = CoalescingWriter(window=60)
+    conn.writer = writer
+
+    inbox.name = 'Outbox'
+    inbox.name = 'bad'
+    with pytest.raises(ResponseError):
+        writer.flush()
+    assert inbox.name == 'Inbox'
+    assert set_name_calls(conn) == ['bad']
+
+    # Nothing is left to send.
+    writer.flush()
+    assert set_name_calls(conn) == ['bad']
+
+
+def test_coalescing_partial_failure(conn, release):
+    release.set()
+    conn.transport.client.responses['rtm.lists.archive'] = (
+        '<rsp stat="fail"><err code="1" msg="Cannot archive"/></rsp>'
+    )
+    inbox = conn.lists['Inbox']
+    writer = conn.writer = CoalescingWriter(window=60)
+
+    inbox.name = 'Outbox'
+    writer.update(inbox, 'rtm.lists.archive', archived=1)
+    assert inbox.bottle['archived'] == '1'
+    with pytest.raises(ResponseError):
+        writer.flush()
+
+    # Only the change which failed is rolled back.
+    assert set_name_calls(conn) == ['Outbox']
+    assert inbox.name == 'Outbox'
+    assert 'archived' not in inbox.bottle.element.attrib
+
+
+def test_coalescing_window_error(conn, release):
+    release.set()
+    inbox = conn.lists['Inbox']
+    writer = conn.writer = CoalescingWriter(window=0.01)
+
+    inbox.name = 'bad'
+    for _ in range(500):
+        if writer._errors:  # noqa: SLF001
+            break
+        time.sleep(0.01)
+
+    # Errors from changes sent by the timer are raised by the next flush.
+    with pytest.raises(ResponseError):
+        writer.close()
+    writer.close()